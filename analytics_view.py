@@ -0,0 +1,205 @@
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+from concurrent.futures import ThreadPoolExecutor
+
+from history_analytics import DIMENSIONS, WEEKDAYS, days_ago
+
+# Period -> (days, or None for the whole history; timeline bucket)
+PERIODS = {
+    "All time": (None, "month"),
+    "Last 7 days": (7, "day"),
+    "Last 30 days": (30, "day"),
+    "Last 365 days": (365, "week"),
+}
+
+# Rows in the table and bars in the chart
+TOP = 15
+
+BAR_COLOR = "#007bff"
+EMPTY_RGB = (255, 255, 255)
+FULL_RGB = (0, 86, 179)
+
+
+def _shade(fraction):
+    # White for no searches through dark blue for the busiest cell
+    return "#" + "".join(f"{round(empty + (full - empty) * fraction):02x}"
+                         for empty, full in zip(EMPTY_RGB, FULL_RGB))
+
+
+class AnalyticsPanel:
+    # View > Analytics: where the history's searches come from, by country,
+    # region, carrier or number type (a table and a bar chart), over time,
+    # and by weekday and hour (a heatmap), for all time or a recent period.
+    # Everything is read from the totals history_analytics keeps, on a
+    # thread of its own; refresh() is called by the app after each search.
+    # get_analytics() blocks until the app's HistoryAnalytics is open.
+    def __init__(self, root, dispatcher, get_analytics, on_close=None):
+        self.dispatcher = dispatcher
+        self.get_analytics = get_analytics
+        self.on_close = on_close
+        self.generation = 0
+        # Generation of the report on screen
+        self.shown = 0
+        self.cancelled = False
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics-view")
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Analytics")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        controls = ttk.Frame(self.window, padding="5")
+        controls.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        ttk.Label(controls, text="Group by:").grid(row=0, column=0, padx=5)
+        self.dimension_var = tk.StringVar(value="Country")
+        dimension_combo = ttk.Combobox(controls, textvariable=self.dimension_var, width=12, state="readonly",
+                                       values=[dimension.capitalize() for dimension in DIMENSIONS])
+        dimension_combo.grid(row=0, column=1, padx=5)
+        dimension_combo.bind("<<ComboboxSelected>>", lambda event: self.refresh())
+        ttk.Label(controls, text="Period:").grid(row=0, column=2, padx=5)
+        self.period_var = tk.StringVar(value="All time")
+        period_combo = ttk.Combobox(controls, textvariable=self.period_var, width=14, state="readonly",
+                                    values=list(PERIODS))
+        period_combo.grid(row=0, column=3, padx=5)
+        period_combo.bind("<<ComboboxSelected>>", lambda event: self.refresh())
+        ttk.Button(controls, text="Refresh", command=self.refresh).grid(row=0, column=4, padx=5)
+        self.status_label = ttk.Label(controls, text="")
+        self.status_label.grid(row=0, column=5, sticky=tk.W, padx=5)
+
+        self.tree = ttk.Treeview(self.window, columns=("key", "searches", "share"), show="headings", height=TOP)
+        for name, heading, width in (("key", "", 220), ("searches", "Searches", 90), ("share", "Share", 60)):
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width)
+        self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        self.bar_canvas = tk.Canvas(self.window, width=420, height=300, background="white")
+        self.bar_canvas.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        self.timeline_canvas = tk.Canvas(self.window, width=800, height=120, background="white")
+        self.timeline_canvas.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), padx=5, pady=5)
+        self.heatmap_canvas = tk.Canvas(self.window, width=800, height=170, background="white")
+        self.heatmap_canvas.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), padx=5, pady=5)
+        self.window.columnconfigure(1, weight=1)
+        self.window.rowconfigure(1, weight=1)
+        self.refresh()
+
+    def dimension(self):
+        return self.dimension_var.get().lower()
+
+    def refresh(self):
+        # Reports still being read are superseded
+        self.generation += 1
+        days, bucket = PERIODS[self.period_var.get()]
+        self.executor.submit(self.worker, self.generation, self.dimension(), days, bucket)
+
+    def worker(self, generation, dimension, days, bucket):
+        # Analytics view thread; must not touch any widgets. Searches not yet
+        # in the totals (made by another instance, or before there were
+        # totals) are added first.
+        if self.cancelled or generation != self.generation:
+            return
+        start = time.perf_counter()
+        try:
+            analytics = self.get_analytics()
+            pending = analytics.pending()
+            if pending:
+                self.dispatcher.post(self.show_status, generation, f"Counting {pending:,} searches...")
+                analytics.update(progress=lambda done, total: self.dispatcher.post(
+                    self.show_status, generation, f"Counting... {done:,} of {total:,} searches"))
+            report = analytics.report((dimension,), days_ago(days) if days else None, None, TOP, bucket)
+        except Exception as e:
+            self.dispatcher.post(self.show_error, generation, e)
+            return
+        self.dispatcher.post(self.show_report, generation, dimension, report, time.perf_counter() - start)
+
+    def show_status(self, generation, text):
+        if generation == self.generation and not self.cancelled:
+            self.status_label.config(text=text)
+
+    def show_error(self, generation, error):
+        if generation == self.generation and not self.cancelled:
+            self.status_label.config(text="")
+            messagebox.showerror("Analytics Error", f"Failed to read the analytics: {str(error)}",
+                                 parent=self.window)
+
+    def show_report(self, generation, dimension, report, seconds):
+        if generation != self.generation or self.cancelled:
+            return
+        self.shown = generation
+        total = report["searches"]
+        rows = report["top"][dimension]
+        self.tree.heading("key", text=dimension.capitalize())
+        self.tree.delete(*self.tree.get_children())
+        for key, searches in rows:
+            self.tree.insert("", tk.END, values=(key, f"{searches:,}", f"{searches * 100 / total:.1f}%"))
+        self.draw_bars(rows)
+        self.draw_timeline(report["timeline"])
+        self.draw_heatmap(report["heatmap"])
+        self.status_label.config(text=f"{total:,} searches, read in {seconds * 1000:.0f} ms")
+
+    @staticmethod
+    def _size(canvas):
+        # The canvas's size on screen, or as created until it is mapped
+        return (max(canvas.winfo_width(), int(canvas.cget("width"))),
+                max(canvas.winfo_height(), int(canvas.cget("height"))))
+
+    def draw_bars(self, rows):
+        canvas = self.bar_canvas
+        canvas.delete("all")
+        width, height = self._size(canvas)
+        if not rows:
+            canvas.create_text(width / 2, height / 2, text="No searches")
+            return
+        label_width = 150
+        busiest = rows[0][1] or 1
+        row_height = min(24, (height - 10) / len(rows))
+        for index, (key, searches) in enumerate(rows):
+            top = 5 + index * row_height
+            canvas.create_text(label_width - 5, top + row_height / 2, text=key[:22], anchor=tk.E)
+            right = label_width + (width - label_width - 60) * searches / busiest
+            canvas.create_rectangle(label_width, top + 2, right, top + row_height - 2, fill=BAR_COLOR, outline="")
+            canvas.create_text(right + 4, top + row_height / 2, text=f"{searches:,}", anchor=tk.W)
+
+    def draw_timeline(self, timeline):
+        canvas = self.timeline_canvas
+        canvas.delete("all")
+        width, height = self._size(canvas)
+        if not timeline:
+            return
+        busiest = max(searches for _, searches in timeline) or 1
+        column = (width - 20) / len(timeline)
+        for index, (start, searches) in enumerate(timeline):
+            left = 10 + index * column
+            top = height - 20 - (height - 30) * searches / busiest
+            canvas.create_rectangle(left + column * 0.1, top, left + column * 0.9, height - 20,
+                                    fill=BAR_COLOR, outline="")
+        canvas.create_text(10, height - 10, text=timeline[0][0], anchor=tk.W)
+        canvas.create_text(width - 10, height - 10, text=timeline[-1][0], anchor=tk.E)
+        canvas.create_text(10, 5, text=f"busiest: {busiest:,}", anchor=tk.NW)
+
+    def draw_heatmap(self, grid):
+        canvas = self.heatmap_canvas
+        canvas.delete("all")
+        width, height = self._size(canvas)
+        left, top = 40, 20
+        cell_width = (width - left - 10) / 24
+        cell_height = (height - top - 5) / len(WEEKDAYS)
+        busiest = max(max(row) for row in grid) or 1
+        for hour in range(0, 24, 3):
+            canvas.create_text(left + (hour + 0.5) * cell_width, top / 2, text=f"{hour:02d}")
+        for day, (name, row) in enumerate(zip(WEEKDAYS, grid)):
+            y = top + day * cell_height
+            canvas.create_text(left - 5, y + cell_height / 2, text=name, anchor=tk.E)
+            for hour, searches in enumerate(row):
+                x = left + hour * cell_width
+                canvas.create_rectangle(x, y, x + cell_width, y + cell_height,
+                                        fill=_shade(searches / busiest), outline="#e0e0e0")
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def close(self):
+        self.cancelled = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.window.destroy()
+        if self.on_close is not None:
+            self.on_close()
@@ -0,0 +1,92 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.datasets import synthetic_numbers, history_entries
+from history_analytics import DIMENSIONS, HistoryAnalytics, search_facts
+from history_store import HistoryStore
+from lookup_engine import LookupEngine
+
+
+def _ms(fn, rounds=5):
+    # Best of `rounds`, in milliseconds
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _avg_ms(fn, rounds=1000):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def run(searches=1000000, distinct=10000):
+    numbers = synthetic_numbers(distinct)
+    engine = LookupEngine()
+    results = {"searches": searches}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.db")
+        store = HistoryStore(path)
+        store.append_many(history_entries(searches, numbers))
+        analytics = HistoryAnalytics(path, lambda: engine)
+        try:
+            # The first report counts the whole history once
+            start = time.perf_counter()
+            analytics.update()
+            results["first_count_seconds"] = time.perf_counter() - start
+
+            # Every report after that reads the totals
+            last_day = date.fromisoformat(store.last(1)[0].timestamp[:10])
+            month = (last_day - timedelta(days=29)).isoformat()
+            year = (last_day - timedelta(days=364)).isoformat()
+            results["report_all_time_ms"] = _ms(lambda: analytics.report(tuple(DIMENSIONS), limit=15,
+                                                                         bucket="month"))
+            results["report_30_days_ms"] = _ms(lambda: analytics.report(tuple(DIMENSIONS), month, limit=15))
+            results["report_365_days_ms"] = _ms(lambda: analytics.report(tuple(DIMENSIONS), year, limit=15,
+                                                                         bucket="week"))
+            # What one table cost computed from the searches instead
+            results["recount_one_table_ms"] = _ms(lambda: analytics._conn.execute(
+                "SELECT f.country, COUNT(*) FROM history JOIN number_facts f USING (number) GROUP BY 1"
+            ).fetchall(), rounds=1)
+
+            # Searches appended and counted as Track does it, then plain
+            # appends, which are left for the next update
+            target = numbers[0]
+            facts = search_facts(engine.lookup(target))
+            results["append_counted_ms"] = _avg_ms(lambda: store.append(target, target, None, facts))
+            results["pending_after"] = analytics.pending()
+            results["append_ms"] = _avg_ms(lambda: store.append(target, target))
+        finally:
+            analytics.close()
+            store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics totals over a large history")
+    parser.add_argument("--searches", type=int, default=1000000)
+    parser.add_argument("--distinct", type=int, default=10000)
+    args = parser.parse_args()
+
+    results = run(args.searches, args.distinct)
+    print(f"history:         {results['searches']:,} searches")
+    print(f"first count:     {results['first_count_seconds']:.1f}s")
+    print(f"report:          all time {results['report_all_time_ms']:.0f} ms, last 30 days "
+          f"{results['report_30_days_ms']:.0f} ms, last 365 days {results['report_365_days_ms']:.0f} ms")
+    print(f"one table from the searches: {results['recount_one_table_ms']:.0f} ms")
+    print(f"append:          {results['append_ms']:.3f} ms, counted as made {results['append_counted_ms']:.3f} ms")
+    if results["pending_after"]:
+        print("FAIL: searches appended by Track were left out of the totals")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+import os
+import time
+
+from benchmarks.datasets import synthetic_numbers
+from bulk_enrich import enrich_stream
+
+
+def run(count=100000, workers=None, chunk_size=2000):
+    numbers = synthetic_numbers(count)
+    workers = workers or sorted({1, 2, os.cpu_count() or 1})
+    results = {"count": count, "rows_per_sec": {}}
+    for worker_count in workers:
+        start = time.perf_counter()
+        rows = sum(rows for rows, _ in enrich_stream(numbers, worker_count, chunk_size))
+        results["rows_per_sec"][worker_count] = rows / (time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk enrichment throughput by worker count")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="*", help="worker counts to try (default: 1, 2, all cores)")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = run(args.count, args.workers, args.chunk_size)
+    base = None
+    for worker_count, rate in results["rows_per_sec"].items():
+        base = base or rate
+        print(f"{worker_count:>3} workers: {rate:>10,.0f} rows/sec ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
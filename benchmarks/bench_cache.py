@@ -0,0 +1,81 @@
+import argparse
+import time
+
+from benchmarks.datasets import synthetic_numbers, zipf_workload
+from lookup_engine import LookupEngine
+from result_cache import ResultCache, cache_key
+
+
+def time_lookups(engine, workload):
+    lookup = engine.lookup
+    start = time.perf_counter()
+    for number in workload:
+        try:
+            lookup(number)
+        except Exception:
+            pass
+    return time.perf_counter() - start
+
+
+def hit_latency(cache, keys, rounds=5):
+    # Best-of-N average cost of a cache hit, in microseconds
+    get = cache.get
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for key in keys:
+            get(key)
+        elapsed = (time.perf_counter() - start) / len(keys)
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def run(population=20000, count=200000, maxsize=5000, skew=1.1):
+    numbers = synthetic_numbers(population)
+    workload = zipf_workload(numbers, count, skew=skew)
+
+    uncached = LookupEngine()
+    uncached.lookup_many(numbers[:2000])
+    uncached_time = time_lookups(uncached, workload)
+
+    cache = ResultCache(maxsize=maxsize)
+    cached = LookupEngine(cache=cache)
+    cached_time = time_lookups(cached, workload)
+    stats = cache.stats()
+
+    warm_keys = [key for key in (cache_key(number) for number in workload[:10000]) if key in cache]
+    engine_hits = [number for number in workload[:10000] if cache_key(number) in cache]
+    return {
+        "population": population,
+        "lookups": count,
+        "maxsize": maxsize,
+        "uncached_lookups_per_sec": count / uncached_time,
+        "cached_lookups_per_sec": count / cached_time,
+        "speedup": uncached_time / cached_time,
+        "cache_hit_us": hit_latency(cache, warm_keys) if warm_keys else 0.0,
+        "engine_hit_us": (time_lookups(cached, engine_hits) / len(engine_hits) * 1e6) if engine_hits else 0.0,
+        "cache": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lookup result cache on a Zipf-distributed workload")
+    parser.add_argument("--population", type=int, default=20000, help="distinct numbers in the workload")
+    parser.add_argument("--count", type=int, default=200000, help="lookups to perform")
+    parser.add_argument("--maxsize", type=int, default=5000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    args = parser.parse_args()
+
+    results = run(args.population, args.count, args.maxsize, args.skew)
+    stats = results["cache"]
+    print(f"workload:        {results['lookups']} lookups over {results['population']} numbers (zipf s={args.skew})")
+    print(f"uncached:        {results['uncached_lookups_per_sec']:,.0f} lookups/sec")
+    print(f"cached:          {results['cached_lookups_per_sec']:,.0f} lookups/sec ({results['speedup']:.1f}x)")
+    print(f"hit rate:        {stats['hit_rate']:.1%} ({stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['evictions']} evictions)")
+    print(f"cache hit:       {results['cache_hit_us']:.2f} us (ResultCache.get)")
+    print(f"engine hit:      {results['engine_hit_us']:.2f} us (LookupEngine.lookup)")
+
+
+if __name__ == "__main__":
+    main()
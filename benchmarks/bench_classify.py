@@ -0,0 +1,78 @@
+import argparse
+import time
+
+from benchmarks.datasets import synthetic_numbers
+from classify import classify_column, classify_slow, numpy
+from lookup_engine import LookupEngine
+
+
+def reference_column(numbers):
+    # The per-number path: a parsed PhoneNumber and number_type for each row
+    return [classify_slow(number) for number in numbers]
+
+
+def check_parity(numbers, columns):
+    # Rows where the columnar result disagrees with phonenumbers or with the
+    # engine's per-number lookup
+    mismatches = []
+    engine_results = LookupEngine().lookup_many(numbers)
+    for index, (number, expected, result) in enumerate(zip(numbers, reference_column(numbers), engine_results)):
+        actual = (columns.country_code[index], columns.region[index], columns.number_type[index],
+                  bool(columns.is_valid[index]))
+        if actual != (expected[0], expected[1], expected[2], bool(expected[3])):
+            mismatches.append((number, expected, actual))
+        elif result is not None and (result.country_code, result.number_type, result.is_valid) != (
+                actual[0], actual[2], actual[3]):
+            mismatches.append((number, result, actual))
+    return mismatches
+
+
+def run(rows=1000000, reference_rows=50000):
+    numbers = synthetic_numbers(rows, formatted_ratio=0.0)
+    start = time.perf_counter()
+    columns = classify_column(numbers)
+    columnar_time = time.perf_counter() - start
+
+    sample = numbers[:reference_rows] if reference_rows else numbers
+    start = time.perf_counter()
+    reference_column(sample)
+    reference_rate = len(sample) / (time.perf_counter() - start)
+
+    results = {
+        "rows": rows,
+        "columnar_rows_per_sec": rows / columnar_time,
+        "reference_rows_per_sec": reference_rate,
+        "speedup": rows / columnar_time / reference_rate,
+        "parity_rows": len(sample),
+        "mismatches": check_parity(sample, columns),
+    }
+    if numpy is not None:
+        array = numpy.array(numbers)
+        start = time.perf_counter()
+        classify_column(array)
+        results["numpy_rows_per_sec"] = rows / (time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark columnar number type and region classification")
+    parser.add_argument("--rows", type=int, default=1000000, help="E.164 numbers to classify")
+    parser.add_argument("--reference-rows", type=int, default=50000,
+                        help="rows run through the per-number path and checked for parity (0 for all)")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.reference_rows)
+    print(f"columnar:        {results['columnar_rows_per_sec']:,.0f} rows/sec over {results['rows']:,} rows")
+    if "numpy_rows_per_sec" in results:
+        print(f"numpy input:     {results['numpy_rows_per_sec']:,.0f} rows/sec")
+    print(f"per-number:      {results['reference_rows_per_sec']:,.0f} rows/sec")
+    print(f"speedup:         {results['speedup']:.1f}x")
+    print(f"parity:          {len(results['mismatches'])} mismatches in {results['parity_rows']:,} rows")
+    for number, expected, actual in results["mismatches"][:10]:
+        print(f"  {number}: expected {expected}, got {actual}")
+    if results["mismatches"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
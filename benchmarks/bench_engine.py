@@ -0,0 +1,93 @@
+import argparse
+import time
+
+import phonenumbers
+from phonenumbers import timezone, geocoder, carrier, number_type, PhoneNumberFormat, NumberParseException
+
+from benchmarks.datasets import synthetic_numbers
+from lookup_engine import LookupEngine, LookupResult
+
+
+def reference_lookup(number):
+    # The per-field library calls track_number makes, without the widgets
+    phone_number = phonenumbers.parse(number.strip())
+    return LookupResult(
+        number,
+        timezone.time_zones_for_number(phone_number),
+        geocoder.description_for_number(phone_number, "en"),
+        carrier.name_for_number(phone_number, "en"),
+        number_type(phone_number),
+        carrier._is_mobile(number_type(phone_number)),
+        phonenumbers.format_number(phone_number, PhoneNumberFormat.INTERNATIONAL),
+        phonenumbers.format_number(phone_number, PhoneNumberFormat.NATIONAL),
+        phonenumbers.format_number(phone_number, PhoneNumberFormat.E164),
+        phone_number.country_code,
+        geocoder.country_name_for_number(phone_number, "en"),
+        phonenumbers.length_of_geographical_area_code(phone_number),
+        phonenumbers.is_possible_number(phone_number),
+        phonenumbers.is_valid_number(phone_number),
+    )
+
+
+def reference_lookup_many(numbers):
+    results = []
+    for number in numbers:
+        try:
+            results.append(reference_lookup(number))
+        except NumberParseException:
+            results.append(None)
+    return results
+
+
+def check_parity(numbers, engine=None):
+    engine = engine or LookupEngine()
+    mismatches = []
+    for number, expected, actual in zip(numbers, reference_lookup_many(numbers), engine.lookup_many(numbers)):
+        if expected != actual:
+            mismatches.append((number, expected, actual))
+    return mismatches
+
+
+def measure(fn, numbers, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(numbers)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(numbers) / best
+
+
+def run(count=20000, repeat=3):
+    numbers = synthetic_numbers(count)
+    engine = LookupEngine()
+    # Warm up the lazily loaded prefix tables before timing anything
+    engine.lookup_many(numbers[:2000])
+    reference_lookup_many(numbers[:2000])
+    return {
+        "count": count,
+        "reference_lookups_per_sec": measure(reference_lookup_many, numbers, repeat),
+        "engine_lookups_per_sec": measure(engine.lookup_many, numbers, repeat),
+        "parity_mismatches": len(check_parity(numbers, engine)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LookupEngine.lookup_many against per-field lookups")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-rate", type=float, default=0, help="fail if the engine is slower than this")
+    args = parser.parse_args()
+
+    results = run(args.count, args.repeat)
+    print(f"numbers:          {results['count']}")
+    print(f"per-field calls:  {results['reference_lookups_per_sec']:,.0f} lookups/sec")
+    print(f"lookup_many:      {results['engine_lookups_per_sec']:,.0f} lookups/sec")
+    print(f"speedup:          {results['engine_lookups_per_sec'] / results['reference_lookups_per_sec']:.2f}x")
+    print(f"parity mismatches: {results['parity_mismatches']}")
+    if results["parity_mismatches"] or results["engine_lookups_per_sec"] < args.min_rate:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.datasets import synthetic_numbers, history_entries
+from history_export import export_history
+from history_store import HistoryStore
+
+
+def max_rss_mb():
+    # Peak resident memory of this process so far (ru_maxrss is in KiB)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(entries=5000000, population=20000, names=("history.csv", "history.jsonl", "history.csv.gz")):
+    numbers = synthetic_numbers(population)
+    results = {"entries": entries}
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(os.path.join(directory, "search_history.db"))
+        start = time.perf_counter()
+        store.append_many(history_entries(entries, numbers))
+        results["populate_sec"] = time.perf_counter() - start
+        for name in names:
+            path = os.path.join(directory, name)
+            rss = max_rss_mb()
+            start = time.perf_counter()
+            rows = export_history(store, path)
+            elapsed = time.perf_counter() - start
+            if rows != entries:
+                raise RuntimeError(f"{name}: exported {rows} of {entries} searches")
+            results[name] = {
+                "sec": elapsed,
+                "rows_per_sec": rows / elapsed,
+                "file_mb": os.path.getsize(path) / 1e6,
+                # Growth of the peak: what the export needed beyond the store
+                "peak_rss_growth_mb": max_rss_mb() - rss,
+            }
+            os.remove(path)
+        store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exporting the search history")
+    parser.add_argument("--entries", type=int, default=5000000, help="searches in the history")
+    parser.add_argument("--population", type=int, default=20000, help="distinct numbers searched")
+    parser.add_argument("--max-sec", type=float, default=60.0, help="fail if an export takes longer")
+    args = parser.parse_args()
+
+    results = run(args.entries, args.population)
+    print(f"entries:           {results['entries']:,}")
+    print(f"populate:          {results['populate_sec']:.1f}s")
+    failed = False
+    for name, result in results.items():
+        if not isinstance(result, dict):
+            continue
+        print(f"{name + ':':<19}{result['sec']:.1f}s ({result['rows_per_sec']:,.0f} rows/sec), "
+              f"{result['file_mb']:,.0f} MB, peak RSS +{result['peak_rss_growth_mb']:.0f} MB")
+        failed = failed or result["sec"] > args.max_sec
+    if failed:
+        print(f"FAIL: an export took over {args.max_sec:.0f}s")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.datasets import synthetic_numbers, history_entries
+from history_store import HistoryStore
+
+
+def _avg_ms(fn, rounds=200):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def run_size(size, directory, numbers, legacy_limit=100000):
+    path = os.path.join(directory, f"history-{size}.db")
+    store = HistoryStore(path)
+    start = time.perf_counter()
+    store.append_many(history_entries(size, numbers))
+    populate = time.perf_counter() - start
+    store.close()
+
+    start = time.perf_counter()
+    store = HistoryStore(path)
+    store.last(10)
+    open_ms = (time.perf_counter() - start) * 1000
+
+    target = numbers[0]
+    results = {
+        "entries": size,
+        "populate_rows_per_sec": size / populate,
+        "open_and_last10_ms": open_ms,
+        "last10_ms": _avg_ms(lambda: store.last(10)),
+        "lookups_of_ms": _avg_ms(lambda: store.lookups_of(target, 100)),
+        "page_middle_ms": _avg_ms(lambda: store.page(size // 2, 5)),
+        "page_oldest_ms": _avg_ms(lambda: store.page(size - 5, 5)),
+        "filter_prefix_ms": _avg_ms(lambda: store.ids_for_numbers(store.matching_numbers(target[:4])), rounds=5),
+        "append_unbatched_ms": _avg_ms(lambda: store.append(target, target), rounds=50),
+    }
+    store.batch_size = 64
+    store.flush_interval = 60
+    results["append_batched_ms"] = _avg_ms(lambda: store.append(target, target), rounds=640)
+    store.close()
+
+    if size <= legacy_limit:
+        # What every search cost before: rewriting the whole JSON file
+        legacy = [{"number": number, "timestamp": timestamp}
+                  for number, _, timestamp in history_entries(size, numbers)]
+        legacy_path = os.path.join(directory, f"history-{size}.json")
+
+        def rewrite():
+            legacy.append({"number": target, "timestamp": "2024-01-01 00:00:00"})
+            with open(legacy_path, "w") as f:
+                json.dump(legacy, f)
+        results["legacy_json_append_ms"] = _avg_ms(rewrite, rounds=5)
+    return results
+
+
+def run(sizes=(10000, 1000000)):
+    numbers = synthetic_numbers(5000)
+    with tempfile.TemporaryDirectory() as directory:
+        return [run_size(size, directory, numbers) for size in sizes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search history store")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10000, 1000000])
+    args = parser.parse_args()
+    for results in run(args.sizes):
+        print(f"{results['entries']:,} entries")
+        for key, value in results.items():
+            if key != "entries":
+                print(f"  {key:<24} {value:,.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import namedtuple
+
+from benchmarks.datasets import synthetic_numbers
+from lookup_engine import LookupEngine
+from result_record import LookupResult, ResultTable
+
+# The namedtuple results used to be
+TupleResult = namedtuple("TupleResult", LookupResult._fields)
+
+
+def _copy(text):
+    # A distinct string object, as distinct numbers would have
+    return (text + " ")[:-1]
+
+
+def distinct_results(population, rows):
+    # `rows` results cycling through `population`, with their per-number
+    # strings copied so nothing is shared that wouldn't be in real data
+    for index in range(rows):
+        result = population[index % len(population)]
+        yield result.replace(number=_copy(result.number), international=_copy(result.international),
+                             national=_copy(result.national), e164=_copy(result.e164))
+
+
+def measure(build, population, rows):
+    # Bytes per result held by whatever build() returns
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    holder = build(distinct_results(population, rows))
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del holder
+    return size / rows, elapsed
+
+
+def run(rows=1000000, population=20000):
+    numbers = synthetic_numbers(population, invalid_ratio=0.0)
+    results = [result for result in LookupEngine().lookup_many(numbers) if result is not None]
+    return {
+        "rows": rows,
+        "namedtuple": measure(lambda rows: [TupleResult(*result) for result in rows], results, rows),
+        "slots": measure(list, results, rows),
+        "table": measure(ResultTable, results, rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory held per lookup result by each in-memory layout")
+    parser.add_argument("--rows", type=int, default=1000000, help="results to hold")
+    parser.add_argument("--population", type=int, default=20000, help="distinct numbers looked up")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.population)
+    print(f"results:         {results['rows']:,}")
+    for name in ("namedtuple", "slots", "table"):
+        per_result, elapsed = results[name]
+        print(f"{name + ':':<16} {per_result:6.0f} bytes/result, {per_result * 10_000_000 / 1e9:5.2f} GB "
+              f"per 10M, built in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import ast
+import gc
+import inspect
+import textwrap
+import statistics
+import time
+
+import lookup_engine
+from benchmarks.datasets import synthetic_numbers
+from lookup_engine import LookupEngine
+from metrics import Metrics
+
+# Variables the engine checks against None before recording a stage
+_SWITCHES = {"metrics", "timed"}
+
+
+class _StripMetrics(ast.NodeTransformer):
+    # Removes every `if metrics is not None:` (or `self.metrics`, `timed`)
+    # block, keeping its else branch
+    def visit_If(self, node):
+        self.generic_visit(node)
+        test = node.test
+        if (isinstance(test, ast.Compare) and isinstance(test.ops[0], ast.IsNot)
+                and isinstance(test.comparators[0], ast.Constant) and test.comparators[0].value is None):
+            subject = test.left
+            name = subject.attr if isinstance(subject, ast.Attribute) else getattr(subject, "id", None)
+            if name in _SWITCHES:
+                return node.orelse or None
+        return node
+
+
+def uninstrumented_engine_class():
+    # LookupEngine as it would be without any of the metrics checks
+    methods = {}
+    for name in ("lookup", "lookup_many", "describe"):
+        tree = ast.parse(textwrap.dedent(inspect.getsource(getattr(LookupEngine, name))))
+        tree = ast.fix_missing_locations(_StripMetrics().visit(tree))
+        namespace = {}
+        exec(compile(tree, lookup_engine.__file__, "exec"), vars(lookup_engine), namespace)
+        methods[name] = namespace[name]
+    return type("UninstrumentedEngine", (LookupEngine,), methods)
+
+
+def rate(engine, numbers):
+    # CPU time with the collector off (as timeit does), so neither other
+    # processes nor a collection landing in one engine's run skew it
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.process_time()
+        engine.lookup_many(numbers)
+        return len(numbers) / (time.process_time() - start)
+    finally:
+        gc.enable()
+
+
+def run(count=500, rounds=150):
+    numbers = synthetic_numbers(count)
+    engines = {
+        "uninstrumented": uninstrumented_engine_class()(),
+        "disabled": LookupEngine(),
+        "enabled": LookupEngine(),
+    }
+    engines["enabled"].metrics = Metrics()
+    for engine in engines.values():
+        engine.lookup_many(numbers[:2000])
+    # Each round runs all three back to back, in a rotating order, and the
+    # overheads are the median of the per-round ratios: the machine's speed
+    # drifts by more than the checks cost, but rarely within one round
+    rates = {name: [] for name in engines}
+    order = list(engines)
+    for round_index in range(rounds):
+        for name in order[round_index % 3:] + order[:round_index % 3]:
+            rates[name].append(rate(engines[name], numbers))
+    base = rates["uninstrumented"]
+    return {
+        "rates": {name: statistics.median(values) for name, values in rates.items()},
+        "disabled_overhead_pct": statistics.median(
+            (b / r - 1) * 100 for b, r in zip(base, rates["disabled"])),
+        "enabled_overhead_pct": statistics.median(
+            (b / r - 1) * 100 for b, r in zip(base, rates["enabled"])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of the per-stage lookup metrics, on and off")
+    parser.add_argument("--count", type=int, default=500, help="numbers per run")
+    parser.add_argument("--rounds", type=int, default=150, help="runs per engine; the median of them counts")
+    parser.add_argument("--max-disabled-overhead", type=float, default=2.0,
+                        help="fail if disabled metrics cost more than this percentage")
+    args = parser.parse_args()
+
+    results = run(args.count, args.rounds)
+    rates = results["rates"]
+    disabled = results["disabled_overhead_pct"]
+    enabled = results["enabled_overhead_pct"]
+    print(f"uninstrumented:    {rates['uninstrumented']:,.0f} lookups/sec")
+    print(f"metrics disabled:  {rates['disabled']:,.0f} lookups/sec ({disabled:+.2f}%)")
+    print(f"metrics enabled:   {rates['enabled']:,.0f} lookups/sec ({enabled:+.2f}%)")
+    if disabled > args.max_disabled_overhead:
+        print(f"FAIL: disabled metrics cost {disabled:.2f}%, over {args.max_disabled_overhead}%")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
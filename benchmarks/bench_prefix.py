@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.datasets import synthetic_templates
+from lookup_engine import country_codes
+from prefix_index import TemplateIndex, CountryIndex
+from template_store import TemplateStore
+from tk_async import LatencyRecorder
+
+
+def sample_prefixes(book, count, seed=99):
+    # Prefixes of template names and numbers, 1 to 8 characters long
+    rng = random.Random(seed)
+    keys = [key for templates in book.values() for name, number in templates.items() for key in (name, number)]
+    return [key[:rng.randint(1, 8)] for key in rng.choices(keys, k=count)]
+
+
+def scan_complete(book, prefix, limit=10):
+    # What filtering without an index costs: a pass over every template
+    prefix = prefix.casefold()
+    matches = [(name, category) for category, templates in book.items() for name, number in templates.items()
+               if name.casefold().startswith(prefix) or number.startswith(prefix)]
+    return sorted(matches)[:limit]
+
+
+def timed(complete, prefixes):
+    latency = LatencyRecorder(size=len(prefixes))
+    for prefix in prefixes:
+        start = time.perf_counter()
+        complete(prefix)
+        latency.add((time.perf_counter() - start) * 1000)
+    return latency.summary()
+
+
+def save_times(book, directory, saves=20):
+    # Per-save cost: rewriting templates.json against writing one row
+    json_path = os.path.join(directory, "templates.json")
+    start = time.perf_counter()
+    for index in range(saves):
+        book["Category 0"][f"Saved {index}"] = "+12125551234"
+        with open(json_path, "w") as f:
+            json.dump(book, f)
+    json_ms = (time.perf_counter() - start) / saves * 1000
+
+    store = TemplateStore(os.path.join(directory, "templates.db"), defaults=book)
+    start = time.perf_counter()
+    for index in range(saves):
+        store.put("Category 0", f"Stored {index}", "+12125551234")
+    store_ms = (time.perf_counter() - start) / saves * 1000
+    store.close()
+    return json_ms, store_ms
+
+
+def run(templates=50000, queries=5000, scan_queries=50):
+    book = synthetic_templates(templates)
+    prefixes = sample_prefixes(book, queries)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = TemplateIndex(book)
+    build_time = time.perf_counter() - start
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    countries = CountryIndex(country_codes())
+    country_build = time.perf_counter() - start
+    country_prefixes = [name[:length] for name, _, _, _ in country_codes() for length in (1, 2, 4)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_save_ms, store_save_ms = save_times(book, directory)
+    return {
+        "templates": templates,
+        "index_keys": len(index),
+        "build_sec": build_time,
+        "index_mb": index_bytes / 1e6,
+        "template_complete": timed(index.complete, prefixes),
+        "scan_complete": timed(lambda prefix: scan_complete(book, prefix), prefixes[:scan_queries]),
+        "country_build_ms": country_build * 1000,
+        "country_complete": timed(countries.complete, country_prefixes),
+        "json_save_ms": json_save_ms,
+        "store_save_ms": store_save_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark template and country-code completion")
+    parser.add_argument("--templates", type=int, default=50000, help="templates in the synthetic book")
+    parser.add_argument("--queries", type=int, default=5000, help="completions to time")
+    args = parser.parse_args()
+
+    results = run(args.templates, args.queries)
+    template, scan, country = results["template_complete"], results["scan_complete"], results["country_complete"]
+    print(f"book:            {results['templates']} templates, {results['index_keys']} index keys")
+    print(f"index build:     {results['build_sec']:.2f} s, {results['index_mb']:.1f} MB")
+    print(f"completion:      p50 {template['p50_ms']:.3f} ms, p99 {template['p99_ms']:.3f} ms, "
+          f"max {template['max_ms']:.3f} ms")
+    print(f"full scan:       p50 {scan['p50_ms']:.1f} ms, p99 {scan['p99_ms']:.1f} ms")
+    print(f"countries:       build {results['country_build_ms']:.0f} ms, "
+          f"p50 {country['p50_ms']:.3f} ms, p99 {country['p99_ms']:.3f} ms")
+    print(f"template save:   {results['json_save_ms']:.1f} ms json rewrite, {results['store_save_ms']:.2f} ms sqlite row")
+
+
+if __name__ == "__main__":
+    main()
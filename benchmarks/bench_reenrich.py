@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from phonenumbers import NumberParseException
+
+from benchmarks.datasets import synthetic_numbers
+from enrichment_store import EnrichmentStore, reenrich, stored_numbers
+from history_store import HistoryStore
+from lookup_engine import LookupEngine
+
+
+def write_history(path, searches, distinct, engine):
+    # A history of mostly repeats: `searches` drawn from `distinct` numbers
+    numbers = synthetic_numbers(distinct)
+    e164s = [result.e164 if result is not None else None for result in engine.lookup_many(numbers)]
+    rng = random.Random(99)
+    store = HistoryStore(path)
+    chosen = (rng.randrange(distinct) for _ in range(searches))
+    store.append_many((numbers[index], e164s[index], "2026-01-01 00:00:00") for index in chosen)
+    return store
+
+
+def run(searches=200000, distinct=10000, chunk_size=5000):
+    engine = LookupEngine()
+    results = {"searches": searches}
+    with tempfile.TemporaryDirectory() as directory:
+        history = write_history(os.path.join(directory, "history.db"), searches, distinct, engine)
+        try:
+            start = time.perf_counter()
+            numbers, _ = stored_numbers(history)
+            results["dedup_seconds"] = time.perf_counter() - start
+            results["distinct"] = len(numbers)
+
+            # What looking every search up again would cost, one at a time
+            # since lookup_many skips repeats within a batch
+            sample = [row[1] for chunk in history.iter_rows(chunk_size=10000) for row in chunk][:20000]
+            start = time.perf_counter()
+            for number in sample:
+                try:
+                    engine.lookup(number)
+                except NumberParseException:
+                    pass
+            per_search = (time.perf_counter() - start) / len(sample)
+            results["every_search_seconds"] = per_search * searches
+        finally:
+            history.close()
+
+        store = EnrichmentStore(os.path.join(directory, "enrichment.db"))
+        try:
+            # Interrupted half way, then resumed
+            chunks = [0]
+
+            def cancelled():
+                chunks[0] += 1
+                return chunks[0] > len(numbers) // chunk_size // 2
+
+            start = time.perf_counter()
+            first, _ = reenrich(store, numbers, engine, chunk_size, cancelled=cancelled)
+            second, _ = reenrich(store, numbers, engine, chunk_size)
+            results["reenrich_seconds"] = time.perf_counter() - start
+            results["looked_up"] = first + second
+            start = time.perf_counter()
+            results["current_run"] = reenrich(store, numbers, engine, chunk_size)[0]
+            results["current_seconds"] = time.perf_counter() - start
+        finally:
+            store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark re-enriching a history of repeated searches")
+    parser.add_argument("--searches", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=10000)
+    args = parser.parse_args()
+
+    results = run(args.searches, args.distinct)
+    print(f"history:           {results['searches']:,} searches, {results['distinct']:,} distinct numbers "
+          f"(found in {results['dedup_seconds']:.2f}s)")
+    print(f"every search:      {results['every_search_seconds']:.1f}s (estimated)")
+    print(f"re-enrich:         {results['reenrich_seconds']:.1f}s for {results['looked_up']:,} lookups, "
+          f"interrupted and resumed")
+    print(f"already current:   {results['current_seconds']:.2f}s, {results['current_run']:,} lookups")
+    if results["looked_up"] != results["distinct"] or results["current_run"]:
+        print("FAIL: numbers were looked up more than once")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
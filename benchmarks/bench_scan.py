@@ -0,0 +1,102 @@
+import argparse
+import os
+import tempfile
+import time
+
+import phonenumbers
+from phonenumbers import Leniency, PhoneNumberFormat, PhoneNumberMatcher
+
+from benchmarks.datasets import log_lines, synthetic_numbers
+from text_scan import scan_file, scan_text
+
+
+def national_numbers(count):
+    # US numbers as people write them, for the region-hinted scans
+    return [phonenumbers.format_number(phonenumbers.parse(f"+1212555{index:04d}"), PhoneNumberFormat.NATIONAL)
+            for index in range(count)]
+
+
+def write_log(path, megabytes, numbers):
+    size = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for line in log_lines(10 ** 9, numbers):
+            f.write(line)
+            size += len(line)
+            if size >= megabytes * 1e6:
+                break
+    return os.path.getsize(path)
+
+
+def read_rate(path):
+    # MB/s of reading and decoding the file, the floor a scan can reach
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(8 << 20)
+            if not block:
+                break
+            block.decode("utf-8", "surrogateescape")
+    return os.path.getsize(path) / 1e6 / (time.perf_counter() - start)
+
+
+def parity(text, region):
+    # The scan finds what the matcher does run over the whole text.
+    # max_tries is lifted: by default the matcher gives up after 65535
+    # candidates, which a large log easily has.
+    expected = [(match.start, match.raw_string)
+                for match in PhoneNumberMatcher(text, region, Leniency.VALID, max_tries=10 ** 9)]
+    found = [(offset, raw) for offset, raw, _ in scan_text(text, region)]
+    return found == expected, len(expected)
+
+
+def run(megabytes=50, region_megabytes=2, workers=None, sample_kb=200):
+    # With a national region hint every digit run in a log is a candidate
+    # for the matcher, so that scan gets a smaller file
+    workers = workers or os.cpu_count() or 1
+    numbers = synthetic_numbers(2000) + national_numbers(500)
+    results = {"workers": workers}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, region, size_mb in (("any", None, megabytes), ("us", "US", region_megabytes)):
+            path = os.path.join(directory, f"{name}.log")
+            size = write_log(path, size_mb, numbers)
+            results[f"{name}_file_mb"] = size / 1e6
+            if region is None:
+                results["read_mb_per_sec"] = read_rate(path)
+            for count in sorted({1, workers}):
+                start = time.perf_counter()
+                found = sum(len(matches) for _, matches in scan_file(path, region, workers=count))
+                elapsed = time.perf_counter() - start
+                results[f"{name}_{count}w"] = {"mb_per_sec": size / 1e6 / elapsed, "matches": found}
+            if region is None:
+                with open(path, encoding="utf-8") as f:
+                    sample = f.read(sample_kb * 1000)
+    for name, region in (("any", None), ("us", "US")):
+        results[f"parity_{name}"] = parity(sample, region)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scanning text files for phone numbers")
+    parser.add_argument("--mb", type=float, default=50, help="size of the synthetic log")
+    parser.add_argument("--region-mb", type=float, default=2, help="size of the log scanned with a US region hint")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    results = run(args.mb, args.region_mb, args.workers)
+    print(f"file:              {results['any_file_mb']:,.0f} MB, {results['us_file_mb']:,.0f} MB with a region")
+    print(f"read + decode:     {results['read_mb_per_sec']:,.0f} MB/s")
+    for name, result in results.items():
+        if isinstance(result, dict):
+            print(f"{name + ':':<19}{result['mb_per_sec']:,.2f} MB/s, {result['matches']:,} matches")
+    failed = False
+    for name in ("parity_any", "parity_us"):
+        same, matches = results[name]
+        print(f"{name + ':':<19}{'same' if same else 'DIFFERENT'} as the matcher on the sample ({matches:,} matches)")
+        failed = failed or not same
+    if failed:
+        print("FAIL: the scan and the matcher disagree")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_engine import measure
+from benchmarks.datasets import synthetic_numbers
+from lookup_engine import LookupEngine
+from prefix_snapshot import PrefixSnapshot, build_snapshot, check_engine
+
+# Run in a fresh interpreter: the time to a first lookup, and the memory it
+# takes, with phonenumbers' own modules or with a snapshot
+_STARTUP = """
+import json, sys, time
+start = time.perf_counter()
+from lookup_engine import LookupEngine
+from prefix_snapshot import PrefixSnapshot
+snapshot = PrefixSnapshot(sys.argv[1]) if len(sys.argv) > 1 else None
+LookupEngine(snapshot=snapshot).lookup("+12125551234")
+seconds = time.perf_counter() - start
+# Peak resident memory; unlike ru_maxrss this one starts over at exec
+with open("/proc/self/status") as f:
+    peak = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+print(json.dumps({"seconds": seconds, "max_rss_mb": peak / 1024}))
+"""
+
+
+def startup(path=None):
+    command = [sys.executable, "-c", _STARTUP] + ([path] if path else [])
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def run(count=20000, repeat=3):
+    numbers = synthetic_numbers(count)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "snapshot.bin")
+        start = time.perf_counter()
+        build_snapshot(path)
+        results = {"count": count, "build_seconds": time.perf_counter() - start,
+                   "file_mb": os.path.getsize(path) / 1e6}
+        results["startup_library"] = startup()
+        results["startup_snapshot"] = startup(path)
+        snapshot = PrefixSnapshot(path)
+        try:
+            engines = {"library": LookupEngine(), "snapshot": LookupEngine(snapshot=snapshot)}
+            for name, engine in engines.items():
+                # Warm up the lazily loaded metadata before timing anything
+                engine.lookup_many(numbers[:2000])
+                results[f"{name}_lookups_per_sec"] = measure(engine.lookup_many, numbers, repeat)
+            results["parity_mismatches"] = len(check_engine(snapshot, numbers))
+        finally:
+            snapshot.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lookups with a prefix snapshot against phonenumbers' "
+                                                 "geocoder, carrier and time zone modules")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = run(args.count, args.repeat)
+    print(f"build:             {results['build_seconds']:.1f}s, {results['file_mb']:.1f} MB")
+    for name in ("library", "snapshot"):
+        first = results[f"startup_{name}"]
+        print(f"{name + ':':<19}first lookup after {first['seconds'] * 1000:,.0f} ms, {first['max_rss_mb']:,.0f} MB, "
+              f"then {results[f'{name}_lookups_per_sec']:,.0f} lookups/sec")
+    print(f"parity mismatches: {results['parity_mismatches']}")
+    if results["parity_mismatches"]:
+        print("FAIL: lookups with the snapshot differ")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
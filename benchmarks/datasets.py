@@ -0,0 +1,102 @@
+import random
+import time
+
+import phonenumbers
+from phonenumbers import PhoneNumberType, PhoneNumberFormat
+
+# Number types the synthetic datasets draw examples from
+SAMPLE_TYPES = [
+    PhoneNumberType.FIXED_LINE, PhoneNumberType.MOBILE, PhoneNumberType.TOLL_FREE,
+    PhoneNumberType.PREMIUM_RATE, PhoneNumberType.VOIP, PhoneNumberType.PAGER,
+    PhoneNumberType.UAN, PhoneNumberType.SHARED_COST, PhoneNumberType.PERSONAL_NUMBER,
+]
+
+_STYLES = [PhoneNumberFormat.E164, PhoneNumberFormat.INTERNATIONAL]
+
+
+def example_numbers():
+    # Every example number phonenumbers ships, across all regions and types
+    examples = []
+    for region in sorted(phonenumbers.SUPPORTED_REGIONS):
+        for ntype in SAMPLE_TYPES:
+            example = phonenumbers.example_number_for_type(region, ntype)
+            if example is not None:
+                examples.append(example)
+    for country_code in sorted(phonenumbers.COUNTRY_CODES_FOR_NON_GEO_REGIONS):
+        example = phonenumbers.example_number_for_non_geo_entity(country_code)
+        if example is not None:
+            examples.append(example)
+    return examples
+
+
+def synthetic_numbers(count, seed=1234, invalid_ratio=0.05, formatted_ratio=0.3):
+    # Deterministic mix of numbers: example numbers with randomised trailing
+    # digits, some written in international format and a few invalid inputs
+    rng = random.Random(seed)
+    examples = example_numbers()
+    numbers = []
+    for _ in range(count):
+        if rng.random() < invalid_ratio:
+            numbers.append("+" + "".join(rng.choice("0123456789") for _ in range(rng.randint(3, 16))))
+            continue
+        example = rng.choice(examples)
+        national = str(example.national_number)
+        keep = max(len(national) - 3, 1)
+        national = national[:keep] + "".join(rng.choice("0123456789") for _ in range(len(national) - keep))
+        if example.italian_leading_zero:
+            national = "0" * (example.number_of_leading_zeros or 1) + national
+        number = f"+{example.country_code}{national}"
+        if rng.random() < formatted_ratio:
+            try:
+                number = phonenumbers.format_number(phonenumbers.parse(number), rng.choice(_STYLES))
+            except phonenumbers.NumberParseException:
+                pass
+        numbers.append(number)
+    return numbers
+
+
+def zipf_workload(population, count, skew=1.1, seed=4321):
+    # Draws `count` items from `population` with a Zipf-like popularity skew
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** skew) for rank in range(1, len(population) + 1)]
+    return rng.choices(population, weights=weights, k=count)
+
+
+def synthetic_templates(count, categories=20, seed=2468):
+    # Template book shaped like a shared one: {category: {name: number}}
+    rng = random.Random(seed)
+    words = ["Office", "Sales", "Support", "Desk", "Team", "Branch", "Warehouse", "Billing",
+             "Front", "Night", "Shift", "North", "South", "East", "West", "Central", "Main"]
+    numbers = synthetic_numbers(count, seed=seed, invalid_ratio=0.0)
+    book = {f"Category {index}": {} for index in range(categories)}
+    names = list(book)
+    for index, number in enumerate(numbers):
+        name = f"{rng.choice(words)} {rng.choice(words)} {index}"
+        book[rng.choice(names)][name] = number
+    return book
+
+
+def history_entries(count, numbers, seed=99):
+    # (number, e164, timestamp) rows, one search every 30 seconds from 2024
+    rng = random.Random(seed)
+    base = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    for i in range(count):
+        number = rng.choice(numbers)
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + i * 30))
+        yield number, number, timestamp
+
+
+def log_lines(count, numbers, number_ratio=0.05, seed=777):
+    # Server-log-like lines: timestamps, IPs, ids and durations, with one of
+    # `numbers` in roughly `number_ratio` of them, national or international
+    rng = random.Random(seed)
+    base = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    paths = ["/api/v1/orders", "/api/v1/users", "/login", "/static/app.js", "/health", "/api/v1/calls"]
+    for i in range(count):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + i))
+        ip = ".".join(str(rng.randint(1, 254)) for _ in range(4))
+        line = (f"{stamp},{rng.randint(100, 999)} INFO [worker-{rng.randint(1, 32)}] {ip} "
+                f"GET {rng.choice(paths)}?id={rng.randint(1, 10 ** 6)} 200 {rng.randint(1, 5000)}ms")
+        if rng.random() < number_ratio:
+            line += f" callback={rng.choice(numbers)}"
+        yield line + "\n"
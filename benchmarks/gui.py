@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+from tkinter import messagebox, simpledialog, filedialog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nothing else is imported up front: the startup case imports the app into
+# a fresh interpreter running this module, and must pay for all of it
+
+# Dialogs answer at once, with a real display too. Template names and export
+# paths are taken from these lists.
+_names = []
+_paths = []
+messagebox.showinfo = messagebox.showwarning = messagebox.showerror = lambda *args, **kwargs: "ok"
+messagebox.askyesno = lambda *args, **kwargs: True
+simpledialog.askstring = lambda *args, **kwargs: _names.pop(0) if _names else None
+filedialog.asksaveasfilename = lambda *args, **kwargs: _paths.pop(0) if _paths else ""
+
+
+class _Key:
+    def __init__(self, keysym):
+        self.keysym = keysym
+
+
+def pump(root, done, timeout=60.0):
+    # Runs the event loop until done() is true
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("timed out waiting for the app")
+        root.update()
+        time.sleep(0.0005)
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    return {
+        "p50_ms": statistics.median(ordered),
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "mean_ms": statistics.fmean(ordered),
+    }
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def startup(directory):
+    # In a fresh interpreter (see run_startup): milestones of the app's
+    # startup timer, which starts as `new` is imported
+    from shared_storage import DATA_DIR_ENV
+
+    os.chdir(directory)
+    os.environ[DATA_DIR_ENV] = directory
+    import new
+    root = tk.Tk()
+    app = new.PhoneNumberTracker(root, prewarm=False)
+    pump(root, lambda: not app.timer.expected)
+    app.on_close()
+    return {f"{name.replace(' ', '_')}_ms": ms for name, ms in app.timer.marks.items()}
+
+
+def run_startup(directory):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.gui", "--startup", directory],
+        cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def run_track(app, root, numbers):
+    # Track button to result labels, through the lookup thread
+    latencies = []
+    for number in numbers:
+        app.phone_entry.delete(0, tk.END)
+        app.phone_entry.insert(0, number)
+        start = time.perf_counter()
+        app.track_number()
+        pump(root, lambda: app.lookup_future is None)
+        latencies.append(elapsed_ms(start))
+    results = {f"click_to_result_{key}": value for key, value in summary(latencies).items()}
+    stages = app.metrics.snapshot()["stages"]
+    for stage in ("history", "widgets"):
+        if stage in stages:
+            results[f"{stage}_mean_ms"] = stages[stage]["mean_ms"]
+    return results
+
+
+def run_typing(app, root, numbers):
+    # Each number typed a character at a time, waiting for the validation
+    # label after every keystroke. The debounce is turned off, so the label
+    # latency is the validation itself.
+    validator = app.live_validator
+    validator.debounce_ms = 0
+    handlers = []
+    for number in numbers:
+        app.phone_entry.delete(0, tk.END)
+        for char in number:
+            app.phone_entry.insert(tk.END, char)
+            shown = validator.latency.count
+            start = time.perf_counter()
+            app.on_phone_key(_Key(char))
+            handlers.append(elapsed_ms(start))
+            pump(root, lambda: validator.latency.count > shown)
+    label = validator.latency.summary()
+    completion = app.phone_completion.latency.summary()
+    return {
+        "keystrokes": len(handlers),
+        **{f"key_handler_{key}": value for key, value in summary(handlers).items()},
+        "keystroke_to_label_p50_ms": label["p50_ms"],
+        "keystroke_to_label_p99_ms": label["p99_ms"],
+        "completion_p50_ms": completion["p50_ms"],
+        "completion_p99_ms": completion["p99_ms"],
+    }
+
+
+def run_templates(app, numbers):
+    # Save Template with the number in the entry, then loading each back
+    category = next(iter(app.template_categories))
+    app.category_var.set(category)
+    saves = []
+    loads = []
+    for index, number in enumerate(numbers):
+        app.phone_entry.delete(0, tk.END)
+        app.phone_entry.insert(0, number)
+        _names.append(f"Benchmark {index}")
+        start = time.perf_counter()
+        app.save_template()
+        saves.append(elapsed_ms(start))
+    for index in range(len(numbers)):
+        app.template_var.set(f"Benchmark {index}")
+        start = time.perf_counter()
+        app.load_template()
+        loads.append(elapsed_ms(start))
+    return {
+        **{f"save_{key}": value for key, value in summary(saves).items()},
+        **{f"load_{key}": value for key, value in summary(loads).items()},
+    }
+
+
+def run_history_view(app, rounds=200):
+    # Jumps around the whole history, as dragging the scrollbar does
+    view = app.history_view
+    total = view.total()
+    latencies = []
+    for index in range(rounds):
+        start = time.perf_counter()
+        view.scroll_to((index * 7919) % max(total, 1))
+        latencies.append(elapsed_ms(start))
+    return {"entries": total, **{f"scroll_{key}": value for key, value in summary(latencies).items()}}
+
+
+def run_analytics(app, root, rounds=20):
+    # View > Analytics, from opening to the charts drawn (counting the
+    # history into the totals first), then each refresh of the report
+    start = time.perf_counter()
+    app.show_analytics()
+    panel = app.analytics_panel
+    pump(root, lambda: panel.shown == panel.generation)
+    results = {"open_ms": elapsed_ms(start)}
+    latencies = []
+    for index in range(rounds):
+        panel.period_var.set(("All time", "Last 30 days")[index % 2])
+        start = time.perf_counter()
+        panel.refresh()
+        pump(root, lambda: panel.shown == panel.generation)
+        latencies.append(elapsed_ms(start))
+    panel.close()
+    return {**results, **{f"refresh_{key}": value for key, value in summary(latencies).items()}}
+
+
+def run_export(app, root, directory, rounds=5):
+    # File > Export History to the file being written, for the whole history
+    latencies = []
+    for index in range(rounds):
+        _paths.append(os.path.join(directory, f"export-{index}.csv"))
+        start = time.perf_counter()
+        app.export_results()
+        pump(root, lambda: app.export_future is None)
+        latencies.append(elapsed_ms(start))
+    return {f"csv_{key}": value for key, value in summary(latencies).items()}
+
+
+def run(history_size=10000, lookups=200, typed_numbers=20, templates=100):
+    from benchmarks.datasets import synthetic_numbers, history_entries
+    from history_store import HistoryStore
+    from lookup_engine import validation_status
+    from shared_storage import DATA_DIR_ENV
+
+    numbers = synthetic_numbers(max(lookups, 2000))
+    valid = [number for number in numbers if validation_status(number) == "valid"]
+    directory = tempfile.mkdtemp(prefix="tracker-bench-")
+    cwd = os.getcwd()
+    os.chdir(directory)
+    # The app's stores go in the scratch directory, not the user's own
+    os.environ[DATA_DIR_ENV] = directory
+    try:
+        store = HistoryStore("search_history.db")
+        store.append_many(history_entries(history_size, numbers))
+        store.close()
+        results = {"startup": run_startup(directory)}
+
+        import new
+        root = tk.Tk()
+        app = new.PhoneNumberTracker(root, prewarm=False)
+        pump(root, lambda: not app.timer.expected)
+        # Everything after startup runs with a warm engine
+        app.engine.prewarm()
+        results["track"] = run_track(app, root, numbers[:lookups])
+        results["typing"] = run_typing(app, root, valid[:typed_numbers])
+        results["templates"] = run_templates(app, valid[:templates])
+        results["history_view"] = run_history_view(app)
+        results["export"] = run_export(app, root, directory)
+        results["analytics"] = run_analytics(app, root)
+        app.on_close()
+        return results
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GUI's hot paths (run by benchmarks.suite)")
+    parser.add_argument("--history-size", type=int, default=10000, help="searches in the history at startup")
+    parser.add_argument("--lookups", type=int, default=200, help="numbers tracked")
+    parser.add_argument("--typed-numbers", type=int, default=20, help="numbers typed key by key")
+    parser.add_argument("--templates", type=int, default=100, help="templates saved")
+    parser.add_argument("--startup", metavar="DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.startup:
+        json.dump(startup(args.startup), sys.stdout)
+        return
+    results = run(args.history_size, args.lookups, args.typed_numbers, args.templates)
+    json.dump({"tk": "stub" if getattr(tk, "STUB", False) else "real", "results": results}, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
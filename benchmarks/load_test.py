@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+from benchmarks.datasets import synthetic_numbers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(extra_args=()):
+    # `new.py serve` on a free port; returns (process, port)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "new.py"), "serve", "--port", "0", *extra_args],
+        stderr=subprocess.PIPE, text=True, cwd=ROOT,
+    )
+    line = process.stderr.readline()
+    if "listening on" not in line:
+        process.kill()
+        raise RuntimeError(f"server did not start: {line.strip()}")
+    return process, int(line.rsplit(":", 1)[1])
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    body = await reader.readexactly(length)
+    return int(status_line.split()[1]), body
+
+
+async def client(host, port, requests, deadline, latencies, statuses):
+    # One keep-alive connection sending requests back to back
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        statuses["connect_error"] = statuses.get("connect_error", 0) + 1
+        return
+    index = 0
+    try:
+        while time.perf_counter() < deadline:
+            request = requests[index % len(requests)]
+            index += 1
+            start = time.perf_counter()
+            writer.write(request)
+            status, _ = await read_response(reader)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        statuses["disconnected"] = statuses.get("disconnected", 0) + 1
+    finally:
+        writer.close()
+
+
+def build_requests(host, numbers, batch_size):
+    if batch_size <= 1:
+        return [f"GET /lookup?number={quote(number)} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode() for number in numbers]
+    requests = []
+    for start in range(0, len(numbers), batch_size):
+        body = json.dumps({"numbers": numbers[start:start + batch_size]}).encode()
+        requests.append(f"POST /batch HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    return requests
+
+
+async def fetch_metrics(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    _, body = await read_response(reader)
+    writer.close()
+    return json.loads(body)
+
+
+async def load(host, port, clients, duration, numbers, batch_size):
+    requests = build_requests(host, numbers, batch_size)
+    latencies = []
+    statuses = {}
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    # Each client starts at a different point of the request list
+    await asyncio.gather(*(
+        client(host, port, requests[index % len(requests):] + requests[:index % len(requests)],
+               deadline, latencies, statuses)
+        for index in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "requests_per_sec": len(latencies) / elapsed,
+        "numbers_per_sec": len(latencies) * max(batch_size, 1) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        "max_ms": latencies[-1] if latencies else 0.0,
+        "statuses": statuses,
+        "server": await fetch_metrics(host, port),
+    }
+
+
+def run(clients=1000, duration=10.0, population=20000, batch_size=1, host="127.0.0.1", port=None):
+    numbers = synthetic_numbers(population)
+    process = None
+    if port is None:
+        process, port = start_server()
+    try:
+        return asyncio.run(load(host, port, clients, duration, numbers, batch_size))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the lookup server with many keep-alive clients")
+    parser.add_argument("--clients", type=int, default=1000, help="concurrent connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--population", type=int, default=20000, help="distinct numbers requested")
+    parser.add_argument("--batch-size", type=int, default=1, help="numbers per request; >1 uses /batch")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="test a running server instead of starting one")
+    args = parser.parse_args()
+
+    results = run(args.clients, args.duration, args.population, args.batch_size, args.host, args.port)
+    batching = results["server"]["batching"]
+    print(f"clients:         {results['clients']}")
+    print(f"requests:        {results['requests']:,} ({results['requests_per_sec']:,.0f}/sec, "
+          f"{results['numbers_per_sec']:,.0f} numbers/sec)")
+    print(f"latency:         p50 {results['p50_ms']:.1f} ms, p99 {results['p99_ms']:.1f} ms, "
+          f"max {results['max_ms']:.1f} ms")
+    print(f"statuses:        {results['statuses']}")
+    print(f"server batching: {batching['batches']:,} engine calls, mean batch {batching['mean_batch']:.1f}, "
+          f"{batching['rejected']} rejected")
+
+
+if __name__ == "__main__":
+    main()
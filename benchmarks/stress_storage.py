@@ -0,0 +1,142 @@
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from history_store import HistoryStore
+from template_store import TemplateStore
+
+
+def writer(directory, worker, writes, template_every, start, results):
+    # One app instance: searches appended one commit each, as the GUI does,
+    # and every `template_every`th write a template saved instead. Returns
+    # {template name: time committed} and the errors it ran into.
+    while time.time() < start:
+        time.sleep(0.001)
+    committed = {}
+    errors = []
+    try:
+        history = HistoryStore(os.path.join(directory, "search_history.db"))
+        templates = TemplateStore(os.path.join(directory, "templates.db"))
+        for index in range(writes):
+            number = f"+1415{worker:03d}{index:04d}"
+            if index % template_every == 0:
+                name = f"w{worker}-{index}"
+                templates.put(f"Worker {worker}", name, number)
+                committed[name] = time.time()
+            else:
+                history.append(number, number, "2026-01-01 00:00:00")
+        history.close()
+        templates.close()
+    except Exception as e:
+        errors.append(repr(e))
+    results.put((worker, committed, errors))
+
+
+def integrity(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run(workers=8, writes=500, template_every=10, poll_ms=5):
+    with tempfile.TemporaryDirectory() as directory:
+        # The stores are created by the writers, all starting at once, as
+        # several instances opening a fresh data directory would
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        start = time.time() + 1.0 + workers * 0.1
+        processes = [context.Process(target=writer, args=(directory, worker, writes, template_every, start, results))
+                     for worker in range(workers)]
+        for process in processes:
+            process.start()
+        while time.time() < start:
+            time.sleep(0.001)
+        # Another instance watching for the writers' templates
+        watcher = TemplateStore(os.path.join(directory, "templates.db"))
+        seq = 0
+        seen = {}
+        finished = []
+        while len(finished) < workers and (not results.empty() or
+                                           any(process.is_alive() for process in processes)):
+            if watcher.changed():
+                now = time.time()
+                for seq, category, name, number in watcher.changes_since(seq):
+                    if name is not None and number is not None:
+                        seen.setdefault(name, now)
+            while not results.empty():
+                finished.append(results.get())
+            time.sleep(poll_ms / 1000)
+        elapsed = time.time() - start
+        for process in processes:
+            process.join()
+        for seq, category, name, number in watcher.changes_since(seq):
+            if name is not None and number is not None:
+                seen.setdefault(name, time.time())
+        book = watcher.load()
+        watcher.close()
+
+        committed = {}
+        errors = []
+        for worker, names, worker_errors in finished:
+            committed.update(names)
+            errors.extend(worker_errors)
+        latencies = sorted(max(0.0, seen[name] - at) * 1000 for name, at in committed.items() if name in seen)
+
+        history = HistoryStore(os.path.join(directory, "search_history.db"))
+        searches = history.count()
+        expected_numbers = {f"+1415{worker:03d}{index:04d}" for worker in range(workers) for index in range(writes)
+                            if index % template_every}
+        numbers, _ = history.distinct_numbers()
+        history.close()
+        saved = {name: number for category, names in book.items() if category.startswith("Worker ")
+                 for name, number in names.items()}
+        return {
+            "workers": workers,
+            "writes": workers * writes,
+            "seconds": elapsed,
+            "writes_per_sec": workers * writes / elapsed,
+            "errors": errors,
+            "searches": searches,
+            "searches_expected": len(expected_numbers),
+            "searches_missing": len(expected_numbers - numbers),
+            "templates": len(saved),
+            "templates_expected": len(committed),
+            "templates_unseen": len(set(committed) - set(seen)),
+            "notify_p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+            "notify_max_ms": latencies[-1] if latencies else 0.0,
+            "integrity": [integrity(os.path.join(directory, name)) for name in ("search_history.db", "templates.db")],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Several processes writing searches and templates to the shared stores at once")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=500, help="writes per worker")
+    args = parser.parse_args()
+
+    results = run(args.workers, args.writes)
+    print(f"{results['workers']} processes, {results['writes']:,} writes in {results['seconds']:.1f}s: "
+          f"{results['writes_per_sec']:,.0f} writes/s")
+    print(f"searches:     {results['searches']:,} of {results['searches_expected']:,} stored, "
+          f"{results['searches_missing']} missing")
+    print(f"templates:    {results['templates']:,} of {results['templates_expected']:,} stored, "
+          f"{results['templates_unseen']} never seen by the watcher")
+    print(f"notification: p50 {results['notify_p50_ms']:.1f} ms, max {results['notify_max_ms']:.1f} ms")
+    print(f"integrity:    {', '.join(results['integrity'])}")
+    for error in results["errors"]:
+        print(f"error: {error}")
+    if (results["errors"] or results["searches"] != results["searches_expected"] or results["searches_missing"] or
+            results["templates"] != results["templates_expected"] or results["templates_unseen"] or
+            results["integrity"] != ["ok", "ok"]):
+        print("FAIL")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
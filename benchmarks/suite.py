@@ -0,0 +1,319 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import phonenumbers
+
+from benchmarks import bench_export, bench_history
+from benchmarks.datasets import synthetic_numbers, synthetic_templates, zipf_workload
+from lookup_engine import LookupEngine, validation_status
+from prefix_index import TemplateIndex
+from result_cache import ResultCache
+from result_record import ResultTable
+from template_store import TemplateStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Dataset sizes for each scale. "quick" is for a check before committing,
+# "full" for release numbers; a baseline only compares against its own scale.
+SCALES = {
+    "quick": {"numbers": 5000, "single": 2000, "batch": 50000, "typed": 100, "history": (10000,),
+              "templates": 5000, "rows": 20000, "exported": 100000, "gui": ["--lookups", "100", "--typed-numbers", "10"]},
+    "full": {"numbers": 20000, "single": 20000, "batch": 200000, "typed": 500, "history": (10000, 1000000),
+             "templates": 50000, "rows": 200000, "exported": 1000000, "gui": []},
+}
+
+# Relative change that counts as a regression, unless the baseline file's
+# "thresholds" overrides it for a "case.metric"
+DEFAULT_THRESHOLD = 0.25
+# Changes smaller than these are timer noise whatever the percentage
+NOISE_FLOORS = {"_ms": 0.05, "_us": 2.0, "_sec": 0.00005}
+
+
+def percentiles_us(samples):
+    ordered = sorted(samples)
+    return {
+        "p50_us": statistics.median(ordered),
+        "p99_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def best_of(fn, repeat=3):
+    # Shortest of `repeat` runs, in seconds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def case_lookup_single(numbers, sizes):
+    # One lookup at a time with a warm engine and no cache, as the GUI does
+    engine = LookupEngine()
+    engine.prewarm()
+    numbers = numbers[:sizes["single"]]
+    latencies = []
+    for number in numbers:
+        start = time.perf_counter()
+        try:
+            engine.lookup(number)
+        except phonenumbers.NumberParseException:
+            pass
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return {**percentiles_us(latencies), "lookups_per_sec": len(latencies) / (sum(latencies) / 1e6)}
+
+
+def case_lookup_batch(numbers, sizes):
+    # lookup_many over a skewed workload in batches of 100, with and without
+    # the result cache
+    workload = zipf_workload(numbers, sizes["batch"])
+    batches = [workload[i:i + 100] for i in range(0, len(workload), 100)]
+    results = {}
+    for name, cache in (("uncached", None), ("cached", ResultCache(maxsize=5000))):
+        engine = LookupEngine(cache=cache)
+        engine.lookup_many(numbers[:2000])
+
+        def run():
+            for batch in batches:
+                engine.lookup_many(batch)
+        results[f"{name}_lookups_per_sec"] = len(workload) / best_of(run)
+    return results
+
+
+def case_live_validation(numbers, sizes):
+    # validation_status for every prefix of each number, as typed
+    valid = [number for number in numbers if validation_status(number) == "valid"][:sizes["typed"]]
+    latencies = []
+    for number in valid:
+        for end in range(1, len(number) + 1):
+            text = number[:end]
+            start = time.perf_counter()
+            validation_status(text)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    return {"keystrokes": len(latencies), **percentiles_us(latencies)}
+
+
+def case_history(numbers, sizes):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes["history"]:
+            for metric, value in bench_history.run_size(size, directory, numbers, legacy_limit=0).items():
+                results[f"{size}_{metric}"] = value
+    return results
+
+
+def case_templates(numbers, sizes):
+    book = synthetic_templates(sizes["templates"])
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "templates.db")
+        start = time.perf_counter()
+        store = TemplateStore(path, defaults=book)
+        results["import_ms"] = (time.perf_counter() - start) * 1000
+        results["load_ms"] = best_of(store.load) * 1000
+        saves = 200
+        start = time.perf_counter()
+        for index in range(saves):
+            store.put("Category 0", f"Saved {index}", numbers[index])
+        results["save_ms"] = (time.perf_counter() - start) / saves * 1000
+        store.close()
+    results["index_build_ms"] = best_of(lambda: TemplateIndex(book)) * 1000
+    return results
+
+
+def case_csv_export(numbers, sizes):
+    engine = LookupEngine()
+    rows = sizes["rows"]
+    table = ResultTable(engine.lookup_many(numbers * (rows // len(numbers) + 1))[:rows])
+    csv_sec = best_of(lambda: table.write_csv(csv.writer(io.StringIO())))
+    jsonl_sec = best_of(lambda: table.write_jsonl(io.StringIO()))
+    return {"rows": len(table), "csv_rows_per_sec": len(table) / csv_sec,
+            "jsonl_rows_per_sec": len(table) / jsonl_sec}
+
+
+def case_history_export(numbers, sizes):
+    # The whole history, looked up again, as CSV and as gzipped JSONL
+    results = bench_export.run(sizes["exported"], population=5000, names=("history.csv", "history.jsonl.gz"))
+    return {f"{name.split('.', 1)[1].replace('.', '_')}_{metric}": value
+            for name, metrics in results.items() if isinstance(metrics, dict)
+            for metric, value in metrics.items() if metric in ("sec", "rows_per_sec")}
+
+
+HEADLESS_CASES = {
+    "lookup_single": case_lookup_single,
+    "lookup_batch": case_lookup_batch,
+    "live_validation": case_live_validation,
+    "history": case_history,
+    "templates": case_templates,
+    "csv_export": case_csv_export,
+    "history_export": case_history_export,
+}
+
+
+def gui_command(tk_mode):
+    # How to run benchmarks.gui: against the real Tk when there is a display
+    # (or xvfb-run can provide one), otherwise against the stub widgets in
+    # benchmarks/tkstub, which measure the app's own code only
+    command = [sys.executable, "-m", "benchmarks.gui"]
+    env = dict(os.environ)
+    if tk_mode == "auto":
+        if os.environ.get("DISPLAY"):
+            tk_mode = "real"
+        elif shutil.which("xvfb-run"):
+            tk_mode = "xvfb"
+        else:
+            tk_mode = "stub"
+    if tk_mode == "xvfb":
+        command = ["xvfb-run", "-a"] + command
+    elif tk_mode == "stub":
+        paths = [os.path.join(ROOT, "benchmarks", "tkstub"), ROOT, env.get("PYTHONPATH", "")]
+        env["PYTHONPATH"] = os.pathsep.join(path for path in paths if path)
+    return command, env, tk_mode
+
+
+def run_gui(tk_mode, sizes):
+    command, env, tk_mode = gui_command(tk_mode)
+    output = subprocess.run(command + sizes["gui"], cwd=ROOT, env=env, check=True,
+                            stdout=subprocess.PIPE, text=True).stdout
+    return tk_mode, {f"gui_{name}": metrics for name, metrics in json.loads(output)["results"].items()}
+
+
+def dataset_hash(numbers):
+    # Changes when the generator or phonenumbers' example numbers do, which
+    # makes results incomparable with an older baseline
+    return hashlib.sha1("\n".join(numbers).encode("utf-8")).hexdigest()
+
+
+def run_once(numbers, sizes, cases, tk_mode):
+    results = {}
+    for name, case in HEADLESS_CASES.items():
+        if cases is None or name in cases:
+            print(f"running {name}...", file=sys.stderr, flush=True)
+            results[name] = case(numbers, sizes)
+    if cases is None or "gui" in cases:
+        print("running gui...", file=sys.stderr, flush=True)
+        tk_mode, gui_results = run_gui(tk_mode, sizes)
+        results.update(gui_results)
+    return tk_mode, results
+
+
+def run(scale="quick", cases=None, tk_mode="auto", repeat=3):
+    # Every case `repeat` times; each metric is the median of its runs
+    sizes = SCALES[scale]
+    numbers = synthetic_numbers(sizes["numbers"])
+    meta = {
+        "scale": scale,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "phonenumbers": phonenumbers.__version__,
+        "platform": platform.platform(),
+        "dataset_sha1": dataset_hash(numbers),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    runs = []
+    for _ in range(repeat):
+        tk_mode, results = run_once(numbers, sizes, cases, tk_mode)
+        runs.append(results)
+    if cases is None or "gui" in cases:
+        meta["tk"] = tk_mode
+    results = {
+        case: {metric: statistics.median(results[case][metric] for results in runs) for metric in metrics}
+        for case, metrics in runs[0].items()
+    }
+    return {"meta": meta, "results": results}
+
+
+def direction(metric):
+    # 1 when higher is better, -1 when lower is, 0 for counts and sizes
+    if metric.endswith("_per_sec"):
+        return 1
+    if metric.endswith(tuple(NOISE_FLOORS)):
+        return -1
+    return 0
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    # Lines describing each metric that got worse than the baseline by more
+    # than its threshold
+    thresholds = baseline.get("thresholds", {})
+    same_tk = report["meta"].get("tk") == baseline["meta"].get("tk")
+    regressions = []
+    for case, metrics in report["results"].items():
+        if case.startswith("gui_") and not same_tk:
+            continue
+        for metric, value in metrics.items():
+            old = baseline["results"].get(case, {}).get(metric)
+            sign = direction(metric)
+            if old is None or not sign or not old:
+                continue
+            limit = thresholds.get(f"{case}.{metric}", threshold)
+            change = (value - old) / old * sign
+            floor = next((floor for suffix, floor in NOISE_FLOORS.items() if metric.endswith(suffix)), 0)
+            if change < -limit and (sign > 0 or value - old > floor):
+                regressions.append(f"{case}.{metric}: {old:.4g} -> {value:.4g} ({change * -100:+.1f}% worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every benchmark case and compare against a baseline")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--cases", nargs="*", choices=list(HEADLESS_CASES) + ["gui"],
+                        help="cases to run (default: all)")
+    parser.add_argument("--tk", choices=["auto", "real", "xvfb", "stub"], default="auto",
+                        help="Tk for the GUI case (auto: a display, else xvfb-run, else the stub)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each case; metrics are their median")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    report = run(args.scale, args.cases, args.tk, args.repeat)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.save_baseline:
+        thresholds = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                thresholds = json.load(f).get("thresholds", {})
+        with open(args.baseline, "w") as f:
+            json.dump({**report, "thresholds": thresholds}, f, indent=2)
+            f.write("\n")
+        print(f"saved baseline:  {args.baseline}", file=sys.stderr)
+        return
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against", file=sys.stderr)
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"]["scale"] != args.scale or baseline["meta"]["dataset_sha1"] != report["meta"]["dataset_sha1"]:
+        print("baseline was taken at another scale or on another dataset; not comparing", file=sys.stderr)
+        return
+    regressions = compare(report, baseline, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION: {line}", file=sys.stderr)
+    if regressions:
+        raise SystemExit(1)
+    print("no regressions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
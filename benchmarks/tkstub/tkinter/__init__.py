@@ -0,0 +1,303 @@
+# Just enough of tkinter for the benchmarks to build and drive the app
+# without a display. Widgets remember their options and contents; after()
+# callbacks run from update() once due. Put benchmarks/tkstub first on
+# PYTHONPATH to use it.
+import heapq
+import itertools
+import time
+import traceback
+
+STUB = True
+
+END = "end"
+INSERT = "insert"
+N, S, E, W = "n", "s", "e", "w"
+NW, NE, SW, SE, CENTER = "nw", "ne", "sw", "se", "center"
+X, Y, BOTH = "x", "y", "both"
+LEFT, RIGHT, TOP, BOTTOM = "left", "right", "top", "bottom"
+HORIZONTAL, VERTICAL = "horizontal", "vertical"
+NORMAL, DISABLED = "normal", "disabled"
+WORD = "word"
+
+
+class TclError(Exception):
+    pass
+
+
+class Misc:
+    def __init__(self, master=None, **options):
+        self.master = master
+        self._options = dict(options)
+        self._bindings = {}
+        self._root = master._root if master is not None else self
+
+    def config(self, **options):
+        self._options.update(options)
+
+    configure = config
+
+    def cget(self, option):
+        return self._options.get(option, "")
+
+    def __getitem__(self, option):
+        return self._options.get(option, "")
+
+    def __setitem__(self, option, value):
+        self._options[option] = value
+
+    def bind(self, sequence, func=None, add=None):
+        self._bindings[sequence] = func
+
+    def unbind(self, sequence, funcid=None):
+        self._bindings.pop(sequence, None)
+
+    def after(self, ms, func=None, *args):
+        return self._root.after(ms, func, *args)
+
+    def after_idle(self, func, *args):
+        return self._root.after(0, func, *args)
+
+    def after_cancel(self, after_id):
+        self._root.after_cancel(after_id)
+
+    def update(self):
+        self._root.update()
+
+    def update_idletasks(self):
+        pass
+
+    def winfo_exists(self):
+        return 1
+
+    def winfo_rootx(self):
+        return 0
+
+    def winfo_rooty(self):
+        return 0
+
+    def winfo_width(self):
+        return 400
+
+    def winfo_height(self):
+        return 200
+
+    def _noop(self, *args, **kwargs):
+        pass
+
+    grid = pack = place = grid_remove = pack_forget = place_forget = _noop
+    columnconfigure = rowconfigure = grid_columnconfigure = grid_rowconfigure = _noop
+    destroy = focus_set = event_generate = protocol = title = geometry = resizable = _noop
+    transient = lift = withdraw = deiconify = overrideredirect = quit = _noop
+
+
+class Tk(Misc):
+    def __init__(self, *args, **kwargs):
+        super().__init__(None)
+        self._timers = []
+        self._ids = itertools.count()
+        self._cancelled = set()
+
+    def after(self, ms, func=None, *args):
+        timer_id = next(self._ids)
+        heapq.heappush(self._timers, (time.perf_counter() + ms / 1000, timer_id, func, args))
+        return f"after#{timer_id}"
+
+    def after_cancel(self, after_id):
+        if after_id:
+            self._cancelled.add(int(str(after_id).split("#")[1]))
+
+    def update(self):
+        # Runs every callback that is due, as one pass of the event loop
+        now = time.perf_counter()
+        while self._timers and self._timers[0][0] <= now:
+            _, timer_id, func, args = heapq.heappop(self._timers)
+            if timer_id in self._cancelled:
+                self._cancelled.discard(timer_id)
+            elif func is not None:
+                func(*args)
+
+    def report_callback_exception(self, exc, val, tb):
+        traceback.print_exception(exc, val, tb)
+
+    def mainloop(self, n=0):
+        pass
+
+
+class Toplevel(Misc):
+    pass
+
+
+class Frame(Misc):
+    pass
+
+
+class Label(Misc):
+    pass
+
+
+class Button(Misc):
+    def invoke(self):
+        return self._options["command"]()
+
+
+class Menu(Misc):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.entries = []
+
+    def add_cascade(self, **options):
+        self.entries.append(options)
+
+    add_command = add_checkbutton = add_radiobutton = add_cascade
+
+    def add_separator(self, **options):
+        pass
+
+
+class Variable:
+    _default = None
+
+    def __init__(self, master=None, value=None, name=None):
+        self._value = self._default if value is None else value
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+
+    def trace_add(self, mode, callback):
+        pass
+
+
+class StringVar(Variable):
+    _default = ""
+
+
+class IntVar(Variable):
+    _default = 0
+
+
+class DoubleVar(Variable):
+    _default = 0.0
+
+
+class BooleanVar(Variable):
+    _default = False
+
+
+class Entry(Misc):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self._text = ""
+        self._variable = options.get("textvariable")
+
+    def get(self):
+        return self._variable.get() if self._variable is not None else self._text
+
+    def set(self, text):
+        if self._variable is not None:
+            self._variable.set(text)
+        self._text = text
+
+    def insert(self, index, text):
+        current = self.get()
+        self.set(text + current if index == 0 else current + text)
+
+    def delete(self, first, last=None):
+        self.set("")
+
+    def icursor(self, index):
+        pass
+
+
+class Listbox(Misc):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.items = []
+        self._selection = ()
+
+    def insert(self, index, *items):
+        if index == END:
+            self.items.extend(items)
+        else:
+            self.items[index:index] = items
+
+    def delete(self, first, last=None):
+        if last is None:
+            del self.items[first]
+        else:
+            del self.items[first:None if last == END else last + 1]
+
+    def get(self, first, last=None):
+        return self.items[first] if last is None else tuple(self.items)
+
+    def size(self):
+        return len(self.items)
+
+    def curselection(self):
+        return self._selection
+
+    def selection_clear(self, first, last=None):
+        self._selection = ()
+
+    def selection_set(self, first, last=None):
+        self._selection = (first,)
+
+    def nearest(self, y):
+        return 0
+
+    def yview(self, *args):
+        return (0.0, 1.0)
+
+    activate = see = itemconfig = Misc._noop
+
+
+class Scrollbar(Misc):
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+class Text(Misc):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.text = ""
+
+    def insert(self, index, text, *tags):
+        self.text += text
+
+    def delete(self, first, last=None):
+        self.text = ""
+
+    def get(self, first, last=None):
+        return self.text
+
+    see = tag_configure = Misc._noop
+
+
+class Canvas(Misc):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.items = []
+
+    def _create(self, kind, args, options):
+        self.items.append((kind, args, options))
+        return len(self.items)
+
+    def create_rectangle(self, *args, **options):
+        return self._create("rectangle", args, options)
+
+    def create_line(self, *args, **options):
+        return self._create("line", args, options)
+
+    def create_text(self, *args, **options):
+        return self._create("text", args, options)
+
+    def delete(self, *items):
+        self.items = []
+
+    def winfo_width(self):
+        return int(self._options.get("width", 600))
+
+    def winfo_height(self):
+        return int(self._options.get("height", 300))
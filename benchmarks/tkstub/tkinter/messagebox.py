@@ -0,0 +1,13 @@
+# Dialogs answer at once: question boxes say yes
+def showinfo(title=None, message=None, **options):
+    return "ok"
+
+
+showwarning = showerror = showinfo
+
+
+def askyesno(title=None, message=None, **options):
+    return True
+
+
+askokcancel = askyesno
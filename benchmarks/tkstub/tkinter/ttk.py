@@ -0,0 +1,74 @@
+from tkinter import Misc, Button, Entry, Scrollbar
+
+
+class Style:
+    def __init__(self, master=None):
+        pass
+
+    def configure(self, style, **options):
+        pass
+
+    def map(self, style, **options):
+        pass
+
+    def theme_use(self, name=None):
+        return "default"
+
+
+class Frame(Misc):
+    pass
+
+
+class LabelFrame(Misc):
+    pass
+
+
+class Label(Misc):
+    pass
+
+
+class Checkbutton(Misc):
+    pass
+
+
+class Radiobutton(Misc):
+    pass
+
+
+class Combobox(Entry):
+    def current(self, index=None):
+        pass
+
+
+class Progressbar(Misc):
+    start = stop = step = Misc._noop
+
+
+class Notebook(Misc):
+    add = select = Misc._noop
+
+
+class Treeview(Misc):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.rows = {}
+
+    def insert(self, parent, index, iid=None, **options):
+        iid = iid or f"I{len(self.rows) + 1:03d}"
+        self.rows[iid] = options
+        return iid
+
+    def delete(self, *items):
+        for iid in items:
+            self.rows.pop(iid, None)
+
+    def get_children(self, item=None):
+        return tuple(self.rows)
+
+    def item(self, iid, **options):
+        return self.rows.get(iid, {})
+
+    def selection(self):
+        return ()
+
+    heading = column = Misc._noop
@@ -0,0 +1,169 @@
+import csv
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from lookup_engine import LookupEngine, FIELDS, display_values
+from metrics import Metrics
+from prefix_snapshot import open_snapshot
+from result_cache import ResultCache
+
+HEADER = ["Input"] + FIELDS
+
+# Engine owned by each worker process, created by _init_worker
+_engine = None
+
+
+def add_arguments(parser):
+    parser.add_argument("input", help="CSV file with a header row, or a text file with one number per line")
+    parser.add_argument("-o", "--output", help="output CSV file (default: stdout)")
+    parser.add_argument("-c", "--column", default="0",
+                        help="CSV column holding the numbers, by header name or index (default: 0)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="numbers sent to a worker at a time")
+    parser.add_argument("--cache-size", type=int, default=100000,
+                        help="per-worker result cache size, 0 to disable")
+    parser.add_argument("--region", help="default region for numbers without a country code, e.g. US")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="time each lookup stage and write the results here, as Prometheus text "
+                             "if FILE ends in .prom, otherwise JSON")
+
+
+def read_numbers(path, column="0"):
+    # Numbers from a CSV (first row is the header) or a plain text file,
+    # streamed. The file is opened and the column found here rather than on
+    # the first read, so a missing file (OSError) or column (ValueError) is
+    # reported before any output is written.
+    f = open(path, newline="", encoding="utf-8-sig")
+    if not path.lower().endswith(".csv"):
+        return _read_lines(f)
+    reader = csv.reader(f)
+    header = next(reader, None) or []
+    if column.isdigit() and (int(column) < len(header) or not header):
+        index = int(column)
+    elif column in header:
+        index = header.index(column)
+    else:
+        f.close()
+        raise ValueError(f"column {column!r} not found in {path}")
+    return _read_column(f, reader, index)
+
+
+def _read_lines(f):
+    with f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def _read_column(f, reader, index):
+    with f:
+        for row in reader:
+            yield row[index].strip() if index < len(row) else ""
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(region=None, cache_size=0, metrics=None):
+    global _engine
+    cache = ResultCache(maxsize=cache_size) if cache_size else None
+    # Every worker maps the same prefix snapshot, if there is one
+    _engine = LookupEngine(region=region, cache=cache, snapshot=open_snapshot())
+    _engine.metrics = metrics
+
+
+def enrich_chunk(numbers):
+    # Returns the chunk already rendered as CSV text, which is much cheaper to
+    # send back to the parent process than a list of rows
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    empty = [""] * len(FIELDS)
+    for number, result in zip(numbers, _engine.lookup_many(numbers)):
+        writer.writerow([number] + (display_values(result) if result is not None else empty))
+    return buffer.getvalue()
+
+
+def enrich_chunk_timed(numbers):
+    # enrich_chunk, plus the stage timings the worker recorded for it
+    return enrich_chunk(numbers), _engine.metrics.take()
+
+
+def enrich_stream(numbers, workers=1, chunk_size=2000, region=None, cache_size=0, metrics=None):
+    # Yields (row count, CSV text) per chunk, in input order. At most a few
+    # chunks per worker are in flight, so memory stays bounded however large
+    # the input is. Stage timings go into `metrics` if given.
+    chunks = chunked(numbers, chunk_size)
+    if workers <= 1:
+        _init_worker(region, cache_size, metrics)
+        for chunk in chunks:
+            yield len(chunk), enrich_chunk(chunk)
+        return
+
+    # Each worker records into its own Metrics, merged here chunk by chunk
+    task = enrich_chunk if metrics is None else enrich_chunk_timed
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(region, cache_size, Metrics() if metrics is not None else None)) as executor:
+        pending = deque()
+
+        def result(future):
+            if metrics is None:
+                return future.result()
+            text, worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+            return text
+
+        for chunk in chunks:
+            pending.append((len(chunk), executor.submit(task, chunk)))
+            if len(pending) >= workers * 4:
+                count, future = pending.popleft()
+                yield count, result(future)
+        while pending:
+            count, future = pending.popleft()
+            yield count, result(future)
+
+
+def run(args):
+    try:
+        numbers = read_numbers(args.input, args.column)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    metrics = Metrics() if args.metrics else None
+    start = last_report = time.perf_counter()
+    total = 0
+    try:
+        csv.writer(out).writerow(HEADER)
+        for count, text in enrich_stream(numbers, args.workers, args.chunk_size, args.region, args.cache_size,
+                                         metrics):
+            out.write(text)
+            total += count
+            now = time.perf_counter()
+            if not args.quiet and now - last_report >= 1.0:
+                last_report = now
+                print(f"enriched {total:,} rows ({total / (now - start):,.0f} rows/sec)", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f"done: {total:,} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/sec)",
+              file=sys.stderr)
+    if metrics is not None:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.prometheus() if args.metrics.endswith(".prom") else metrics.json())
+    return 0
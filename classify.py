@@ -0,0 +1,278 @@
+import csv
+import re
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+import phonenumbers
+from phonenumbers import PhoneMetadata, PhoneNumberType, NumberParseException
+from phonenumbers.phonenumberutil import COUNTRY_CODE_TO_REGION_CODE, REGION_CODE_FOR_NON_GEO_ENTITY
+
+from lookup_engine import TYPE_MAPPING
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Region column values index into this; 0 means no region
+REGION_CODES = [""] + sorted({region for regions in COUNTRY_CODE_TO_REGION_CODE.values() for region in regions})
+_REGION_INDEX = {region: index for index, region in enumerate(REGION_CODES)}
+
+UNKNOWN = PhoneNumberType.UNKNOWN
+
+# Parallel columns; country_code is 0 for rows that don't parse
+Columns = namedtuple("Columns", ["country_code", "region", "number_type", "is_valid"])
+
+# Checked in this order after the general description, as number_type does
+_SPECIAL_TYPES = [
+    ("premium_rate", PhoneNumberType.PREMIUM_RATE),
+    ("toll_free", PhoneNumberType.TOLL_FREE),
+    ("shared_cost", PhoneNumberType.SHARED_COST),
+    ("voip", PhoneNumberType.VOIP),
+    ("personal_number", PhoneNumberType.PERSONAL_NUMBER),
+    ("pager", PhoneNumberType.PAGER),
+    ("uan", PhoneNumberType.UAN),
+    ("voicemail", PhoneNumberType.VOICEMAIL),
+]
+
+_ASCII_DIGITS = frozenset("0123456789")
+
+
+def _usable(desc):
+    return desc is not None and desc.national_number_pattern
+
+
+def _allows(desc, length):
+    return not desc.possible_length or length in desc.possible_length
+
+
+class _TypeTable:
+    # phonenumbers' number type rules for one region, compiled per national
+    # number length into a single pattern. Its alternatives are the number
+    # type descriptions in the order number_type tries them, restricted to
+    # those whose possible lengths allow this length, behind a lookahead for
+    # the general description. The first alternative that matches the whole
+    # number names the type.
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self._by_length = {}
+        self.mobile = None
+        if _usable(metadata.mobile):
+            self.mobile = re.compile(metadata.mobile.national_number_pattern)
+
+    def _compile(self, length):
+        metadata = self.metadata
+        general = metadata.general_desc
+        if not _usable(general) or not _allows(general, length):
+            return None
+        alternatives = []
+        for name, ntype in _SPECIAL_TYPES:
+            desc = getattr(metadata, name)
+            if _usable(desc) and _allows(desc, length):
+                alternatives.append((f"t{int(ntype)}", desc.national_number_pattern))
+        if _usable(metadata.fixed_line) and _allows(metadata.fixed_line, length):
+            alternatives.append(("fixed", metadata.fixed_line.national_number_pattern))
+        if (not metadata.same_mobile_and_fixed_line_pattern and _usable(metadata.mobile)
+                and _allows(metadata.mobile, length)):
+            alternatives.append(("mobile", metadata.mobile.national_number_pattern))
+        if not alternatives:
+            return None
+        body = "|".join(f"(?P<{name}>{pattern})" for name, pattern in alternatives)
+        return re.compile(f"(?=(?:{general.national_number_pattern})\\Z)(?:{body})")
+
+    def classify(self, national_number):
+        length = len(national_number)
+        try:
+            pattern = self._by_length[length]
+        except KeyError:
+            pattern = self._by_length[length] = self._compile(length)
+        if pattern is None:
+            return UNKNOWN
+        match = pattern.fullmatch(national_number)
+        if match is None:
+            return UNKNOWN
+        group = match.lastgroup
+        if group == "fixed":
+            metadata = self.metadata
+            if metadata.same_mobile_and_fixed_line_pattern:
+                return PhoneNumberType.FIXED_LINE_OR_MOBILE
+            if (self.mobile is not None and _allows(metadata.mobile, length)
+                    and self.mobile.fullmatch(national_number)):
+                return PhoneNumberType.FIXED_LINE_OR_MOBILE
+            return PhoneNumberType.FIXED_LINE
+        if group == "mobile":
+            return PhoneNumberType.MOBILE
+        return int(group[1:])
+
+
+class _CallingCode:
+    # Everything needed to classify the numbers of one country calling code
+    def __init__(self, country_code, regions):
+        self.country_code = country_code
+        self.candidates = []
+        for region in regions:
+            if region == REGION_CODE_FOR_NON_GEO_ENTITY:
+                metadata = PhoneMetadata.metadata_for_nongeo_region(country_code, None)
+            else:
+                metadata = PhoneMetadata.metadata_for_region(region, None)
+            if metadata is None:
+                continue
+            leading_digits = re.compile(metadata.leading_digits) if metadata.leading_digits is not None else None
+            self.candidates.append((_REGION_INDEX[region], leading_digits, _TypeTable(metadata)))
+        self.single = len(regions) == 1
+        # parse strips a national prefix (as defined for the main region)
+        # from numbers that start with one; those rows take the slow path
+        main = self.candidates[0][2].metadata if self.candidates else None
+        prefix = main.national_prefix_for_parsing if main is not None else None
+        self.national_prefix = re.compile(prefix) if prefix else None
+
+    def classify(self, national_number):
+        # (region index, number type) as region_code_for_number and
+        # number_type would give them
+        if self.single:
+            if not self.candidates:
+                return 0, UNKNOWN
+            region, _, table = self.candidates[0]
+            return region, table.classify(national_number)
+        for region, leading_digits, table in self.candidates:
+            if leading_digits is not None:
+                if leading_digits.match(national_number):
+                    return region, table.classify(national_number)
+            else:
+                ntype = table.classify(national_number)
+                if ntype != UNKNOWN:
+                    return region, ntype
+        return 0, UNKNOWN
+
+
+_calling_codes = {}
+
+
+def _calling_code(prefix):
+    # Calling code for a 1-3 digit prefix, or None if it isn't one
+    try:
+        return _calling_codes[prefix]
+    except KeyError:
+        pass
+    country_code = int(prefix)
+    regions = COUNTRY_CODE_TO_REGION_CODE.get(country_code)
+    entry = _CallingCode(country_code, regions) if regions and prefix[0] != "0" else None
+    _calling_codes[prefix] = entry
+    return entry
+
+
+def classify_slow(number):
+    # The per-number reference: (country code, region index, type, valid)
+    try:
+        phone_number = phonenumbers.parse(number)
+    except NumberParseException:
+        return 0, 0, UNKNOWN, False
+    region = phonenumbers.region_code_for_number(phone_number)
+    ntype = phonenumbers.number_type(phone_number)
+    return phone_number.country_code, _REGION_INDEX.get(region, 0), ntype, phonenumbers.is_valid_number(phone_number)
+
+
+def classify_one(number):
+    # Strict "+<digits>" E.164 strings are classified from the compiled
+    # tables; anything else goes through phonenumbers.parse
+    if len(number) < 4 or len(number) > 21 or number[0] != "+" or not _ASCII_DIGITS.issuperset(number[1:]):
+        return classify_slow(number)
+    for length in (1, 2, 3):
+        calling_code = _calling_code(number[1:1 + length])
+        if calling_code is not None:
+            break
+    else:
+        return classify_slow(number)
+    national_number = number[1 + length:]
+    if len(national_number) < 2 or len(national_number) > 17 or (
+            calling_code.national_prefix is not None and calling_code.national_prefix.match(national_number)):
+        return classify_slow(number)
+    region, ntype = calling_code.classify(national_number)
+    return calling_code.country_code, region, ntype, ntype != UNKNOWN
+
+
+def _as_list(numbers):
+    # Plain list of str from a list, NumPy array or Arrow array/chunked array
+    if hasattr(numbers, "to_pylist"):
+        numbers = numbers.to_pylist()
+    elif hasattr(numbers, "tolist"):
+        numbers = numbers.tolist()
+    return [number.decode("ascii", "replace") if isinstance(number, bytes) else (number or "") for number in numbers]
+
+
+def classify_column(numbers):
+    # Country code, region index (into REGION_CODES), PhoneNumberType and
+    # validity for a column of E.164 strings, as parallel arrays
+    country_codes = array("H")
+    regions = array("H")
+    types = array("b")
+    valid = array("b")
+    for number in _as_list(numbers):
+        country_code, region, ntype, is_valid = classify_one(number)
+        country_codes.append(country_code)
+        regions.append(region)
+        types.append(ntype)
+        valid.append(is_valid)
+    return Columns(country_codes, regions, types, valid)
+
+
+def region_names(region_column):
+    return [REGION_CODES[index] or None for index in region_column]
+
+
+def to_numpy(columns):
+    # Zero-copy NumPy views of the columns
+    if numpy is None:
+        raise RuntimeError("numpy is not installed")
+    return Columns(
+        numpy.frombuffer(columns.country_code, dtype=numpy.uint16),
+        numpy.frombuffer(columns.region, dtype=numpy.uint16),
+        numpy.frombuffer(columns.number_type, dtype=numpy.int8),
+        numpy.frombuffer(columns.is_valid, dtype=numpy.int8).astype(bool),
+    )
+
+
+HEADER = ["Input", "Country Code", "Region", "Number Type", "Is Valid Number"]
+
+
+def add_arguments(parser):
+    parser.add_argument("input", help="CSV file with a header row, or a text file with one number per line")
+    parser.add_argument("-o", "--output", help="output CSV file (default: stdout)")
+    parser.add_argument("-c", "--column", default="0",
+                        help="CSV column holding the numbers, by header name or index (default: 0)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="numbers classified at a time")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress")
+
+
+def run(args):
+    from bulk_enrich import read_numbers, chunked
+
+    try:
+        numbers = read_numbers(args.input, args.column)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    total = 0
+    try:
+        writer = csv.writer(out)
+        writer.writerow(HEADER)
+        for chunk in chunked(numbers, args.chunk_size):
+            columns = classify_column(chunk)
+            writer.writerows(
+                (number, country_code or "", REGION_CODES[region], TYPE_MAPPING.get(ntype, "Unknown"),
+                 "Yes" if is_valid else "No")
+                for number, country_code, region, ntype, is_valid in zip(chunk, *columns)
+            )
+            total += len(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f"done: {total:,} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/sec)",
+              file=sys.stderr)
+    return 0
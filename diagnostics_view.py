@@ -0,0 +1,80 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+
+
+class DiagnosticsPanel:
+    # View > Diagnostics: the per-stage lookup timings in `metrics`, refreshed
+    # while the window is open. "Profile Next Lookup" calls `on_profile`; the
+    # app then runs its next lookup under cProfile/tracemalloc and passes the
+    # report to show_profile.
+    def __init__(self, root, metrics, on_profile, on_close=None, refresh_ms=1000):
+        self.metrics = metrics
+        self.on_profile = on_profile
+        self.on_close = on_close
+        self.refresh_ms = refresh_ms
+        self._after_id = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Diagnostics")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        buttons = ttk.Frame(self.window, padding="5")
+        buttons.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Button(buttons, text="Reset", command=self.reset).grid(row=0, column=0, padx=5)
+        ttk.Button(buttons, text="Export...", command=self.export).grid(row=0, column=1, padx=5)
+        ttk.Button(buttons, text="Profile Next Lookup", command=self.profile_next).grid(row=0, column=2, padx=5)
+        self.status_label = ttk.Label(buttons, text="")
+        self.status_label.grid(row=0, column=3, sticky=tk.W, padx=5)
+
+        self.stages_text = tk.Text(self.window, width=80, height=16, font=("Courier", 10))
+        self.stages_text.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        self.profile_text = tk.Text(self.window, width=80, height=20, font=("Courier", 9))
+        self.profile_text.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(2, weight=1)
+        self.refresh()
+
+    def refresh(self):
+        self.stages_text.delete("1.0", tk.END)
+        self.stages_text.insert(tk.END, self.metrics.table())
+        self._after_id = self.window.after(self.refresh_ms, self.refresh)
+
+    def reset(self):
+        self.metrics.reset()
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+        self.refresh()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.window, defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.metrics.prometheus() if path.endswith(".prom") else self.metrics.json())
+        except OSError as e:
+            messagebox.showerror("Export Error", f"Failed to export metrics: {str(e)}", parent=self.window)
+
+    def profile_next(self):
+        self.on_profile()
+        self.status_label.config(text="The next lookup will be profiled")
+
+    def show_profile(self, report):
+        self.status_label.config(text="")
+        self.profile_text.delete("1.0", tk.END)
+        self.profile_text.insert(tk.END, report)
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def close(self):
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+        self.window.destroy()
+        if self.on_close is not None:
+            self.on_close()
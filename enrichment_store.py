@@ -0,0 +1,254 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import phonenumbers
+from phonenumbers import NumberParseException, PhoneNumberFormat
+
+from result_record import CSV_HEADER, LookupResult
+from shared_storage import connect, data_path, write_transaction
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Carrier, location and time zone data change with each phonenumbers
+# release, so a stored result is current only for the release it was
+# looked up with
+DATA_VERSION = phonenumbers.__version__
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    e164 TEXT PRIMARY KEY,
+    data_version TEXT NOT NULL,
+    enriched_at TEXT NOT NULL,
+    result BLOB
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_version ON results(data_version);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    e164 TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    old_version TEXT NOT NULL,
+    new_version TEXT NOT NULL,
+    changed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_e164 ON changes(e164, id);
+"""
+
+# Fields compared between an old and a new result; `number` is the E.164
+# key itself
+_COMPARED = CSV_HEADER[1:]
+
+
+class EnrichmentStore:
+    # The last lookup of every distinct number in the history and the
+    # template book, tagged with the phonenumbers release it came from, plus
+    # a log of what changed when a number was looked up again. Results are
+    # stored packed (LookupResult.pack); NULL where the number didn't parse.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.executescript(_SCHEMA)
+
+    def current_numbers(self, version=DATA_VERSION):
+        # Numbers whose stored result is from `version`
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                "SELECT e164 FROM results WHERE data_version = ?", (version,))}
+
+    def get_many(self, numbers):
+        # {e164: (data version, LookupResult or None)} for the stored numbers
+        # among `numbers`
+        found = {}
+        numbers = list(numbers)
+        with self._lock:
+            for start in range(0, len(numbers), 900):
+                batch = numbers[start:start + 900]
+                placeholders = ",".join("?" * len(batch))
+                for e164, version, packed in self._conn.execute(
+                        f"SELECT e164, data_version, result FROM results WHERE e164 IN ({placeholders})", batch):
+                    found[e164] = (version, LookupResult.unpack(packed)[0] if packed is not None else None)
+        return found
+
+    def result(self, e164):
+        # (data version, LookupResult or None), or None if never looked up
+        return self.get_many([e164]).get(e164)
+
+    def store(self, results, changes, version=DATA_VERSION):
+        # results: (e164, LookupResult or None); changes: rows as changes()
+        # returns them, minus the id. One transaction, so an interrupted job
+        # leaves each chunk either done or not started.
+        now = datetime.now().strftime(TIMESTAMP_FORMAT)
+        with self._lock, write_transaction(self._conn):
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                ((e164, version, now, result.pack() if result is not None else None)
+                 for e164, result in results)
+            )
+            self._conn.executemany(
+                "INSERT INTO changes (e164, field, old_value, new_value, old_version, new_version, changed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", changes
+            )
+
+    def changes(self, e164=None, limit=100):
+        # (id, e164, field, old value, new value, old version, new version,
+        # changed at), newest first
+        with self._lock:
+            if e164 is not None:
+                return self._conn.execute(
+                    "SELECT * FROM changes WHERE e164 = ? ORDER BY id DESC LIMIT ?", (e164, limit)).fetchall()
+            return self._conn.execute("SELECT * FROM changes ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def version_counts(self):
+        # {data version: numbers stored from it}
+        with self._lock:
+            return dict(self._conn.execute("SELECT data_version, COUNT(*) FROM results GROUP BY data_version"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _e164(number, region=None):
+    try:
+        return phonenumbers.format_number(phonenumbers.parse(number.strip(), region), PhoneNumberFormat.E164)
+    except NumberParseException:
+        return None
+
+
+def stored_numbers(history=None, templates=None, region=None):
+    # (distinct E.164 numbers, entries they came from) in a HistoryStore
+    # and a TemplateStore. Searches already carry their E.164 form; only
+    # the ones imported from the old JSON history, and templates, are
+    # parsed, each distinct text once.
+    numbers = set()
+    entries = 0
+    texts = set()
+    if history is not None:
+        entries = history.count()
+        numbers, texts = history.distinct_numbers()
+    if templates is not None:
+        for book in templates.load().values():
+            texts.update(book.values())
+            entries += len(book)
+    for text in texts:
+        e164 = _e164(text, region)
+        if e164 is not None:
+            numbers.add(e164)
+    return numbers, entries
+
+
+def compare(old, new):
+    # (field, old value, new value) for each field that differs, as CSV
+    # shows them. A number that only parses on one side is one "result"
+    # change.
+    if old is None or new is None:
+        if old is new:
+            return []
+        return [("result", "found" if old is not None else "none", "found" if new is not None else "none")]
+    before = dict(zip(CSV_HEADER, old.csv_row()))
+    after = dict(zip(CSV_HEADER, new.csv_row()))
+    return [(field, str(before[field]), str(after[field])) for field in _COMPARED if before[field] != after[field]]
+
+
+def reenrich(store, numbers, engine=None, chunk_size=5000, progress=None, cancelled=None):
+    # Looks up each of `numbers` (E.164 strings) whose stored result isn't
+    # from the installed phonenumbers, stores the new result and logs how
+    # it differs from the old one. Chunks are committed as they finish, so
+    # after an interruption a second run only does what is left.
+    # progress(done, total) is called after each chunk; the job stops once
+    # cancelled() returns true. Returns (numbers looked up, numbers changed).
+    if engine is None:
+        from lookup_engine import LookupEngine
+        from prefix_snapshot import open_snapshot
+
+        engine = LookupEngine(snapshot=open_snapshot())
+    stale = sorted(set(numbers).difference(store.current_numbers()))
+    done = changed = 0
+    for start in range(0, len(stale), chunk_size):
+        if cancelled is not None and cancelled():
+            break
+        chunk = stale[start:start + chunk_size]
+        previous = store.get_many(chunk)
+        now = datetime.now().strftime(TIMESTAMP_FORMAT)
+        results = list(zip(chunk, engine.lookup_many(chunk)))
+        changes = []
+        for e164, result in results:
+            if e164 not in previous:
+                continue
+            old_version, old = previous[e164]
+            differences = compare(old, result)
+            changes.extend((e164, field, before, after, old_version, DATA_VERSION, now)
+                           for field, before, after in differences)
+            changed += bool(differences)
+        store.store(results, changes)
+        done += len(chunk)
+        if progress is not None:
+            progress(done, len(stale))
+    return done, changed
+
+
+def add_arguments(parser):
+    parser.add_argument("--results", help="stored results (default: enrichment.db in the data directory)")
+    parser.add_argument("--db", help="history database (default: search_history.db in the data directory)")
+    parser.add_argument("--templates", help="template book (default: templates.db in the data directory)")
+    parser.add_argument("--region", help="region for numbers written without a country code")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="numbers looked up per commit")
+    parser.add_argument("--changes", type=int, metavar="N",
+                        help="print the N most recent changes instead of looking anything up")
+    parser.add_argument("--number", metavar="E164", help="print the stored result and changes for one number")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress")
+
+
+def run(args):
+    from history_store import HistoryStore
+    from template_store import TemplateStore
+
+    store = EnrichmentStore(args.results or data_path("enrichment.db"))
+    try:
+        if args.number:
+            stored = store.result(args.number)
+            if stored is None:
+                print(f"{args.number} has not been looked up")
+            else:
+                version, result = stored
+                print(f"phonenumbers {version}: {result.json() if result is not None else 'does not parse'}")
+            for row in store.changes(args.number):
+                print(f"{row[7]}\t{row[2]}\t{row[3]!r} -> {row[4]!r}\t({row[5]} -> {row[6]})")
+            return 0
+        if args.changes:
+            for row in store.changes(limit=args.changes):
+                print(f"{row[7]}\t{row[1]}\t{row[2]}\t{row[3]!r} -> {row[4]!r}\t({row[5]} -> {row[6]})")
+            return 0
+
+        start = last_report = time.perf_counter()
+        history_path = args.db or data_path("search_history.db")
+        templates_path = args.templates or data_path("templates.db")
+        history = HistoryStore(history_path) if os.path.exists(history_path) else None
+        templates = TemplateStore(templates_path) if os.path.exists(templates_path) else None
+        try:
+            numbers, entries = stored_numbers(history, templates, args.region.upper() if args.region else None)
+        finally:
+            for source in (history, templates):
+                if source is not None:
+                    source.close()
+
+        def progress(done, total):
+            nonlocal last_report
+            now = time.perf_counter()
+            if not args.quiet and now - last_report >= 1.0:
+                last_report = now
+                print(f"looked up {done:,} of {total:,} numbers", file=sys.stderr)
+
+        done, changed = reenrich(store, numbers, chunk_size=args.chunk_size, progress=progress)
+        if not args.quiet:
+            print(f"{entries:,} searches and templates, {len(numbers):,} distinct numbers, "
+                  f"{len(numbers) - done:,} already current for phonenumbers {DATA_VERSION}", file=sys.stderr)
+            print(f"looked up {done:,} in {time.perf_counter() - start:.1f}s; {changed:,} changed", file=sys.stderr)
+    finally:
+        store.close()
+    return 0
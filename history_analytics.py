@@ -0,0 +1,379 @@
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from shared_storage import connect, data_path, write_transaction
+
+# Searches counted by country, region, carrier and number type, per day
+# and in total, and per hour of each day for the heatmap. The tables live
+# in the history database next to the searches and cover every search up
+# to rollup_progress.last_id; HistoryAnalytics.update() adds the ones after
+# it, so a report reads a few thousand totals however long the history is.
+# number_facts holds what each searched text is counted under. A row is
+# never changed once written, so searches deleted later are taken off the
+# same totals they were added to.
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS number_facts (
+    number TEXT PRIMARY KEY,
+    country TEXT NOT NULL,
+    region TEXT NOT NULL,
+    carrier TEXT NOT NULL,
+    number_type TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_totals (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    searches INTEGER NOT NULL,
+    PRIMARY KEY (dimension, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    dimension TEXT NOT NULL,
+    day TEXT NOT NULL,
+    key TEXT NOT NULL,
+    searches INTEGER NOT NULL,
+    PRIMARY KEY (dimension, day, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_hourly (
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    searches INTEGER NOT NULL,
+    PRIMARY KEY (day, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_progress (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    last_id INTEGER NOT NULL
+);
+"""
+
+# Dimension name -> number_facts column
+DIMENSIONS = {"country": "country", "region": "region", "carrier": "carrier", "type": "number_type"}
+
+UNKNOWN = "Unknown"
+UNKNOWN_FACTS = (UNKNOWN, UNKNOWN, UNKNOWN, UNKNOWN)
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+# Timeline bucket -> SQL for the first day of a day's bucket; weeks start
+# on Monday
+_BUCKET_STARTS = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",
+    "month": "substr(day, 1, 8) || '01'",
+}
+BUCKETS = tuple(_BUCKET_STARTS)
+
+
+def search_facts(result):
+    # (country, region, carrier, number type) a search is counted under;
+    # regions are qualified with their country, there being a Georgia in
+    # both the US and the Caucasus. Imported here, as the history store
+    # uses this module without needing phonenumbers.
+    from lookup_engine import TYPE_MAPPING
+
+    if result is None:
+        return UNKNOWN_FACTS
+    country = result.country_name or f"+{result.country_code}"
+    region = f"{result.location}, {country}" if result.location and result.location != country else country
+    return country, region, result.carrier or UNKNOWN, TYPE_MAPPING.get(result.number_type, UNKNOWN)
+
+
+def _last_id(conn):
+    row = conn.execute("SELECT last_id FROM rollup_progress").fetchone()
+    return row[0] if row is not None else 0
+
+
+def _roll(conn, where, params, sign):
+    # Adds (sign 1) or takes off (-1) the searches matching `where`. They
+    # are counted per facts, day and hour first, so each total below is one
+    # pass over that summary rather than over the searches.
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_chunk (country TEXT, region TEXT, carrier TEXT, "
+                 "number_type TEXT, day TEXT, hour INTEGER, searches INTEGER)")
+    conn.execute("DELETE FROM temp.rollup_chunk")
+    conn.execute(
+        "INSERT INTO temp.rollup_chunk SELECT f.country, f.region, f.carrier, f.number_type, "
+        "substr(h.timestamp, 1, 10), CAST(substr(h.timestamp, 12, 2) AS INTEGER), COUNT(*) "
+        f"FROM history h JOIN number_facts f USING (number) WHERE {where} GROUP BY 1, 2, 3, 4, 5, 6",
+        params
+    )
+    for dimension, column in DIMENSIONS.items():
+        conn.execute(
+            f"INSERT INTO rollup_daily SELECT ?, day, {column}, ? * SUM(searches) FROM temp.rollup_chunk "
+            "WHERE true GROUP BY 2, 3 ON CONFLICT DO UPDATE SET searches = searches + excluded.searches",
+            (dimension, sign)
+        )
+        conn.execute(
+            f"INSERT INTO rollup_totals SELECT ?, {column}, ? * SUM(searches) FROM temp.rollup_chunk "
+            "WHERE true GROUP BY 2 ON CONFLICT DO UPDATE SET searches = searches + excluded.searches",
+            (dimension, sign)
+        )
+    conn.execute(
+        "INSERT INTO rollup_hourly SELECT day, hour, ? * SUM(searches) FROM temp.rollup_chunk WHERE true "
+        "GROUP BY 1, 2 ON CONFLICT DO UPDATE SET searches = searches + excluded.searches",
+        (sign,)
+    )
+    if sign < 0:
+        for table in ("rollup_daily", "rollup_totals", "rollup_hourly"):
+            conn.execute(f"DELETE FROM {table} WHERE searches <= 0")
+
+
+def count_search(conn, record_id, number, timestamp, facts):
+    # Adds a search to the totals in the transaction that appended it, as
+    # long as every earlier search is in them; otherwise update() will.
+    # The facts already stored for the text, if any, are the ones used.
+    conn.execute("INSERT OR IGNORE INTO number_facts VALUES (?, ?, ?, ?, ?)", (number, *facts))
+    if conn.execute("SELECT 1 FROM history WHERE id > ? AND id < ? LIMIT 1",
+                    (_last_id(conn), record_id)).fetchone() is not None:
+        return
+    facts = conn.execute("SELECT country, region, carrier, number_type FROM number_facts WHERE number = ?",
+                         (number,)).fetchone()
+    day = timestamp[:10]
+    conn.executemany("INSERT INTO rollup_daily VALUES (?, ?, ?, 1) "
+                     "ON CONFLICT DO UPDATE SET searches = searches + 1",
+                     ((dimension, day, key) for dimension, key in zip(DIMENSIONS, facts)))
+    conn.executemany("INSERT INTO rollup_totals VALUES (?, ?, 1) ON CONFLICT DO UPDATE SET searches = searches + 1",
+                     zip(DIMENSIONS, facts))
+    conn.execute("INSERT INTO rollup_hourly VALUES (?, ?, 1) ON CONFLICT DO UPDATE SET searches = searches + 1",
+                 (day, int(timestamp[11:13])))
+    conn.execute("INSERT OR REPLACE INTO rollup_progress VALUES (0, ?)", (record_id,))
+
+
+def forget_searches(conn, where, params=()):
+    # Takes the searches matching `where` off the totals, before they are
+    # deleted; called inside the deleting transaction
+    _roll(conn, f"h.id <= ? AND ({where})", (_last_id(conn), *params), -1)
+
+
+def clear_rollups(conn):
+    for table in ("rollup_daily", "rollup_totals", "rollup_hourly"):
+        conn.execute(f"DELETE FROM {table}")
+
+
+def prune_facts(conn):
+    # Drops the facts of texts no longer in the history
+    conn.execute("DELETE FROM number_facts WHERE number NOT IN (SELECT number FROM numbers)")
+
+
+class HistoryAnalytics:
+    # Reports over the search history at `path`, from the rollups, on a
+    # connection of its own. get_engine() returns the LookupEngine for
+    # searches whose facts weren't recorded as they were made (by another
+    # instance, or before the rollups existed); it is only called if there
+    # are any.
+    def __init__(self, path, get_engine=None, chunk_size=50000):
+        self.path = path
+        self.get_engine = get_engine
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.executescript(ROLLUP_SCHEMA)
+
+    def pending(self):
+        # Searches not yet in the totals
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history WHERE id > ?",
+                                      (_last_id(self._conn),)).fetchone()[0]
+
+    def update(self, progress=None):
+        # Adds the searches made since the last update to the totals, a
+        # chunk per transaction, and returns how many. Searches of texts
+        # with no facts yet are looked up first, each text once.
+        # progress(done, total) is called after each chunk.
+        done = 0
+        total = None
+        while True:
+            with self._lock:
+                last_id = _last_id(self._conn)
+                high = self._conn.execute("SELECT MAX(id) FROM history").fetchone()[0]
+                if high is None or high <= last_id:
+                    return done
+                if total is None:
+                    total = self._conn.execute("SELECT COUNT(*) FROM history WHERE id > ?",
+                                               (last_id,)).fetchone()[0]
+                end = min(high, last_id + self.chunk_size)
+                missing = [row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT h.number FROM history h LEFT JOIN number_facts f USING (number) "
+                    "WHERE h.id > ? AND h.id <= ? AND f.number IS NULL", (last_id, end))]
+            if missing:
+                self._add_facts(missing)
+            with self._lock, write_transaction(self._conn):
+                # Another instance may have rolled this chunk up meanwhile
+                if _last_id(self._conn) != last_id:
+                    continue
+                _roll(self._conn, "h.id > ? AND h.id <= ?", (last_id, end), 1)
+                searches = self._conn.execute("SELECT IFNULL(SUM(searches), 0) FROM temp.rollup_chunk").fetchone()[0]
+                self._conn.execute("INSERT OR REPLACE INTO rollup_progress VALUES (0, ?)", (end,))
+            done += searches
+            if progress is not None:
+                progress(done, total)
+
+    def _add_facts(self, numbers):
+        engine = self.get_engine()
+        facts = [(number, *search_facts(result)) for number, result in zip(numbers, engine.lookup_many(numbers))]
+        with self._lock, write_transaction(self._conn):
+            self._conn.executemany("INSERT OR IGNORE INTO number_facts VALUES (?, ?, ?, ?, ?)", facts)
+
+    def rebuild(self, progress=None):
+        # Counts the whole history again from scratch, looking every text up
+        # again; after a phonenumbers upgrade has moved numbers, say
+        with self._lock, write_transaction(self._conn):
+            clear_rollups(self._conn)
+            self._conn.execute("DELETE FROM number_facts")
+            self._conn.execute("DELETE FROM rollup_progress")
+        return self.update(progress)
+
+    def total(self, since=None, until=None):
+        # Searches counted, all of them or those on days since <= day < until
+        with self._lock:
+            if since is None and until is None:
+                row = self._conn.execute(
+                    "SELECT SUM(searches) FROM rollup_totals WHERE dimension = 'country'").fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT SUM(searches) FROM rollup_hourly WHERE day >= ? AND day < ?",
+                    (since or "", until or "9999-12-31")).fetchone()
+        return row[0] or 0
+
+    def top(self, dimension, since=None, until=None, limit=None):
+        # [(key, searches)], most searched first
+        limit = -1 if limit is None else limit
+        with self._lock:
+            if since is None and until is None:
+                return self._conn.execute(
+                    "SELECT key, searches FROM rollup_totals WHERE dimension = ? "
+                    "ORDER BY searches DESC, key LIMIT ?", (dimension, limit)).fetchall()
+            return self._conn.execute(
+                "SELECT key, SUM(searches) FROM rollup_daily WHERE dimension = ? AND day >= ? AND day < ? "
+                "GROUP BY key ORDER BY 2 DESC, key LIMIT ?",
+                (dimension, since or "", until or "9999-12-31", limit)).fetchall()
+
+    def timeline(self, bucket="day", since=None, until=None):
+        # [(first day of the bucket, searches)], oldest first
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {_BUCKET_STARTS[bucket]}, SUM(searches) FROM rollup_hourly WHERE day >= ? AND day < ? "
+                "GROUP BY 1 ORDER BY 1", (since or "", until or "9999-12-31")).fetchall()
+
+    def heatmap(self, since=None, until=None):
+        # Searches by weekday (Monday first) and hour: 7 lists of 24
+        grid = [[0] * 24 for _ in WEEKDAYS]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CAST(strftime('%w', day) AS INTEGER), hour, SUM(searches) FROM rollup_hourly "
+                "WHERE day >= ? AND day < ? GROUP BY 1, 2", (since or "", until or "9999-12-31")).fetchall()
+        for weekday, hour, searches in rows:
+            # strftime counts from Sunday
+            grid[(weekday + 6) % 7][hour] = searches
+        return grid
+
+    def report(self, dimensions=tuple(DIMENSIONS), since=None, until=None, limit=10, bucket="day"):
+        # Everything the analytics view and `report` show, as one dict
+        return {
+            "since": since,
+            "until": until,
+            "searches": self.total(since, until),
+            "top": {dimension: self.top(dimension, since, until, limit) for dimension in dimensions},
+            "timeline": self.timeline(bucket, since, until),
+            "heatmap": self.heatmap(since, until),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def days_ago(days):
+    # The first day of a period of `days` days ending today
+    return (datetime.now().date() - timedelta(days=days - 1)).isoformat()
+
+
+def heatmap_text(grid):
+    # The heatmap in text, one shade per hour: blank for none, "@" for the
+    # busiest hour
+    shades = " .:-=+*#%@"
+    busiest = max(max(row) for row in grid) or 1
+    lines = ["     " + "".join(f"{hour:<3}" for hour in range(0, 24, 3)).rstrip()]
+    for name, row in zip(WEEKDAYS, grid):
+        lines.append(f"{name}  " + "".join(
+            shades[-1] if count == busiest else shades[(count * (len(shades) - 1)) // busiest] if count else " "
+            for count in row))
+    return "\n".join(lines)
+
+
+def add_arguments(parser):
+    parser.add_argument("--db", help="history database (default: search_history.db in the data directory)")
+    parser.add_argument("--by", action="append", choices=tuple(DIMENSIONS),
+                        help="group by this; repeat for several (default: all)")
+    parser.add_argument("--days", type=int, help="only the last N days, today included")
+    parser.add_argument("--since", metavar="YYYY-MM-DD", help="only searches on or after this day")
+    parser.add_argument("--until", metavar="YYYY-MM-DD", help="only searches before this day")
+    parser.add_argument("--top", type=int, default=10, help="rows per table (default: 10)")
+    parser.add_argument("--timeline", choices=BUCKETS, help="also print searches per day, week or month")
+    parser.add_argument("--heatmap", action="store_true", help="also print searches by weekday and hour")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="count the whole history again, e.g. after upgrading phonenumbers")
+    parser.add_argument("--region", help="region for searches written without a country code")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress")
+
+
+def run(args):
+    from history_store import HistoryStore
+    from lookup_engine import LookupEngine
+    from prefix_snapshot import open_snapshot
+
+    path = args.db or data_path("search_history.db")
+    # Opening the store creates the history's tables if there are none yet
+    HistoryStore(path).close()
+    engines = []
+
+    def get_engine():
+        if not engines:
+            engines.append(LookupEngine(region=args.region.upper() if args.region else None,
+                                        snapshot=open_snapshot()))
+        return engines[0]
+
+    analytics = HistoryAnalytics(path, get_engine)
+    try:
+        start = last_report = time.perf_counter()
+
+        def progress(done, total):
+            nonlocal last_report
+            now = time.perf_counter()
+            if not args.quiet and now - last_report >= 1.0:
+                last_report = now
+                print(f"counted {done:,} of {total:,} searches", file=sys.stderr)
+
+        counted = analytics.rebuild(progress) if args.rebuild else analytics.update(progress)
+        if counted and not args.quiet:
+            print(f"counted {counted:,} new searches in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        since = days_ago(args.days) if args.days else args.since
+        dimensions = args.by or tuple(DIMENSIONS)
+        report = analytics.report(dimensions, since, args.until, args.top, args.timeline or "day")
+    finally:
+        analytics.close()
+
+    if args.json:
+        if not args.timeline:
+            del report["timeline"]
+        if not args.heatmap:
+            del report["heatmap"]
+        print(json.dumps(report, indent=2))
+        return 0
+    total = report["searches"] or 1
+    print(f"{report['searches']:,} searches" + (f" since {since}" if since else "") +
+          (f" before {args.until}" if args.until else ""))
+    for dimension in dimensions:
+        print(f"\nBy {dimension}:")
+        for key, searches in report["top"][dimension]:
+            print(f"  {searches:>10,}  {searches * 100 / total:5.1f}%  {key}")
+    if args.timeline:
+        print(f"\nPer {args.timeline}:")
+        busiest = max((searches for _, searches in report["timeline"]), default=0) or 1
+        for start, searches in report["timeline"]:
+            print(f"  {start}  {searches:>10,}  {'#' * round(searches * 40 / busiest)}")
+    if args.heatmap:
+        print("\nBy weekday and hour:")
+        print(heatmap_text(report["heatmap"]))
+    return 0
@@ -0,0 +1,274 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from lookup_engine import LookupEngine
+from prefix_snapshot import open_snapshot
+from result_record import CSV_HEADER
+
+# Columns of every export: the search, then its lookup done again now
+EXPORT_HEADER = ["id", "timestamp"] + CSV_HEADER
+
+# Timestamps the app writes need no quoting or escaping; these find any
+# that do (say, from an imported legacy history). A chunk is checked as a
+# whole, and rows are only quoted one by one if something in it matches.
+_CSV_SPECIAL = re.compile(r'[",\r\n]').search
+_JSON_SPECIAL = re.compile(r'["\\\x00-\x1f]').search
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _csv_text(text):
+    return text if not _CSV_SPECIAL(text) else '"' + text.replace('"', '""') + '"'
+
+
+def _json_text(text):
+    return f'"{text}"' if not _JSON_SPECIAL(text) else json.dumps(text)
+
+
+def output_format(path):
+    # (format, compression) from the file name: "data.jsonl.gz" is
+    # ("jsonl", "gzip"). Parquet files compress internally.
+    name = path.lower()
+    compression = None
+    if name.endswith(".gz"):
+        compression, name = "gzip", name[:-3]
+    elif name.endswith(".zst"):
+        compression, name = "zstd", name[:-4]
+    if name.endswith(".parquet"):
+        return "parquet", compression
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl", compression
+    return "csv", compression
+
+
+class _CsvRows:
+    # Each distinct number's lookup is rendered once, as the end of a CSV
+    # line; a row is then its id and timestamp in front of that
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _line(self, values):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerow(values)
+        return self._buffer.getvalue()
+
+    def header(self):
+        return self._line(EXPORT_HEADER)
+
+    def suffix(self, number, result):
+        if result is None:
+            return self._line([number] + [""] * (len(CSV_HEADER) - 1))
+        return self._line(result.csv_row())
+
+    def render(self, rows, suffixes):
+        if _CSV_SPECIAL("".join([row[3] for row in rows])):
+            return "".join([f"{record_id},{_csv_text(timestamp)},{suffixes[number]}"
+                            for record_id, number, _, timestamp in rows])
+        return "".join([f"{record_id},{timestamp},{suffixes[number]}"
+                        for record_id, number, _, timestamp in rows])
+
+
+class _JsonRows:
+    # As _CsvRows, with the lookup rendered as the rest of a JSON object
+    _NULLS = ", ".join(f'"{name}": null' for name in CSV_HEADER[1:])
+
+    def header(self):
+        return None
+
+    def suffix(self, number, result):
+        if result is None:
+            return f'"number": {json.dumps(number)}, {self._NULLS}}}\n'
+        return result.json()[1:] + "\n"
+
+    def render(self, rows, suffixes):
+        if _JSON_SPECIAL("".join([row[3] for row in rows])):
+            return "".join([f'{{"id": {record_id}, "timestamp": {_json_text(timestamp)}, {suffixes[number]}'
+                            for record_id, number, _, timestamp in rows])
+        return "".join([f'{{"id": {record_id}, "timestamp": "{timestamp}", {suffixes[number]}'
+                        for record_id, number, _, timestamp in rows])
+
+
+class _ParquetRows:
+    # Each distinct number's lookup as a tuple of column values; a chunk of
+    # rows becomes one row group
+    def __init__(self):
+        if pyarrow is None:
+            raise RuntimeError("Parquet export needs pyarrow, which is not installed")
+        int8, int32, string = pyarrow.int8(), pyarrow.int32(), pyarrow.string()
+        types = {"id": pyarrow.int64(), "is_mobile": int8, "is_possible": int8, "is_valid": int8,
+                 "country_code": int32, "area_code_length": int32}
+        self.schema = pyarrow.schema([(name, types.get(name, string)) for name in EXPORT_HEADER])
+
+    def header(self):
+        return None
+
+    def suffix(self, number, result):
+        if result is None:
+            return (number,) + (None,) * (len(CSV_HEADER) - 1)
+        return tuple(result.csv_row())
+
+    def render(self, rows, suffixes):
+        values = list(zip(*[(record_id, timestamp) + suffixes[number]
+                            for record_id, number, _, timestamp in rows]))
+        return pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(values, self.schema)],
+            schema=self.schema,
+        )
+
+
+class _TextFile:
+    # Binary file, optionally compressed, taking one str per chunk. gzip
+    # defaults to its fastest level: on large exports the default level 6
+    # costs more time than rendering the rows, for files only ~20% smaller.
+    def __init__(self, path, compression=None, level=None):
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"{compression} compression is only for Parquet files")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package, which is not installed")
+        self._raw = open(path, "wb")
+        if compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb",
+                                         compresslevel=1 if level is None else level)
+        elif compression == "zstd":
+            self._stream = zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(
+                self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def write(self, text):
+        self._stream.write(text.encode("utf-8"))
+
+    def close(self):
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+
+class _ParquetFile:
+    def __init__(self, path, schema, compression=None, level=None):
+        self._writer = pyarrow.parquet.ParquetWriter(
+            path, schema, compression=compression or "snappy", compression_level=level
+        )
+
+    def write(self, table):
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+def export_history(store, path, ids=None, compression=None, level=None, chunk_size=10000, engine=None,
+                   progress=None, cancelled=None, cache_size=100000):
+    # Writes the searches in `store` (all of them oldest first, or those in
+    # `ids` in that order) to `path`, each looked up again, and returns how
+    # many were written. The format, and compression unless given, come from
+    # the file name. Rows stream through a chunk at a time, so memory stays
+    # flat however large the history: at most `cache_size` distinct
+    # numbers' rendered lookups are kept. progress(rows written) is called
+    # after each chunk; the export stops with ExportCancelled once
+    # cancelled() returns true. The file only appears once complete.
+    export_format, named_compression = output_format(path)
+    compression = compression or named_compression
+    engine = engine or LookupEngine(snapshot=open_snapshot())
+    part = path + ".part"
+    if export_format == "parquet":
+        rows = _ParquetRows()
+        out = _ParquetFile(part, rows.schema, compression, level)
+    else:
+        rows = _JsonRows() if export_format == "jsonl" else _CsvRows()
+        out = _TextFile(part, compression, level)
+    suffixes = {}
+    total = 0
+    try:
+        header = rows.header()
+        if header is not None:
+            out.write(header)
+        for chunk in store.iter_rows(ids, chunk_size):
+            if cancelled is not None and cancelled():
+                raise ExportCancelled()
+            # Each number not seen recently is looked up once per export
+            numbers = set([row[1] for row in chunk])
+            missing = list(numbers.difference(suffixes))
+            if missing:
+                if len(suffixes) + len(missing) > cache_size:
+                    # The chunk's numbers cached earlier go too
+                    suffixes.clear()
+                    missing = list(numbers)
+                for number, result in zip(missing, engine.lookup_many(missing)):
+                    suffixes[number] = rows.suffix(number, result)
+            out.write(rows.render(chunk, suffixes))
+            total += len(chunk)
+            if progress is not None:
+                progress(total)
+        out.close()
+    except BaseException:
+        out.close()
+        os.remove(part)
+        raise
+    os.replace(part, path)
+    return total
+
+
+def add_arguments(parser):
+    parser.add_argument("output", help="file to write: .csv, .jsonl or .parquet, optionally ending in .gz or .zst")
+    parser.add_argument("--db", help="history database (default: search_history.db in the data directory)")
+    parser.add_argument("--filter", metavar="TEXT", help="only searches for numbers containing TEXT")
+    parser.add_argument("--compression", choices=["gzip", "zstd", "snappy"],
+                        help="compression (default: from the file name; snappy for Parquet)")
+    parser.add_argument("--level", type=int, help="compression level")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="searches read and written at a time")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress")
+
+
+def run(args):
+    from history_store import HistoryStore
+    from shared_storage import data_path
+
+    store = HistoryStore(args.db or data_path("search_history.db"))
+    start = last_report = time.perf_counter()
+
+    def progress(rows):
+        nonlocal last_report
+        now = time.perf_counter()
+        if not args.quiet and now - last_report >= 1.0:
+            last_report = now
+            print(f"exported {rows:,} searches ({rows / (now - start):,.0f} rows/sec)", file=sys.stderr)
+
+    try:
+        ids = None
+        if args.filter:
+            # Newest first from the store; exported oldest first like the rest
+            ids = store.ids_for_numbers(store.matching_numbers(args.filter))[::-1]
+        total = export_history(store, args.output, ids, args.compression, args.level, args.chunk_size,
+                               progress=progress)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f"done: {total:,} searches in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/sec)",
+              file=sys.stderr)
+    return 0
@@ -0,0 +1,358 @@
+import json
+import os
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from history_analytics import ROLLUP_SCHEMA, clear_rollups, count_search, forget_searches, prune_facts
+from shared_storage import ChangeMonitor, connect, data_path, write_transaction
+
+HistoryRecord = namedtuple("HistoryRecord", ["id", "number", "e164", "timestamp"])
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    number TEXT NOT NULL,
+    e164 TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_e164 ON history(e164, id);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history(timestamp);
+CREATE INDEX IF NOT EXISTS history_number ON history(number, id);
+CREATE TABLE IF NOT EXISTS numbers (number TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+_COLUMNS = "id, number, e164, timestamp"
+
+
+class HistoryStore:
+    # Search history in SQLite. Every search is an appended row, so the cost
+    # of a search and of opening the store doesn't grow with the history.
+    # Appends are committed in batches: after `batch_size` appends, after
+    # `flush_interval` seconds, or on flush(). A batch holds the write lock
+    # until it commits, so stores other processes write to as well keep
+    # the default of one. changed() tells when they have. Deleting searches
+    # takes them off the analytics totals in the same transaction; see
+    # history_analytics.
+    def __init__(self, path, batch_size=1, flush_interval=1.0, legacy_json=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._count = None
+        # Separate connection for long filter queries, so they never hold up
+        # appends and page reads on the main connection
+        self._reader = None
+        self._reader_lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.executescript(_SCHEMA)
+        self._conn.executescript(ROLLUP_SCHEMA)
+        if legacy_json:
+            self._import_legacy(legacy_json)
+        self._backfill_numbers()
+        self._monitor = ChangeMonitor(self._conn, self._lock)
+
+    def _backfill_numbers(self):
+        # The distinct-number table behind filtering; filled once for
+        # histories written before it existed
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM numbers LIMIT 1").fetchone() is None:
+                with write_transaction(self._conn):
+                    self._conn.execute("INSERT OR IGNORE INTO numbers SELECT DISTINCT number FROM history")
+
+    def _import_legacy(self, legacy_json):
+        # One-off import of the old search_history.json list. Done under the
+        # write lock and renamed before committing, so two instances
+        # starting at once can't both import it.
+        if not os.path.exists(legacy_json):
+            return
+        with self._lock, write_transaction(self._conn):
+            try:
+                with open(legacy_json, "r") as f:
+                    entries = json.load(f)
+            except Exception:
+                return
+            self._conn.executemany(
+                "INSERT INTO history (number, e164, timestamp) VALUES (?, NULL, ?)",
+                ((entry["number"], entry["timestamp"]) for entry in entries
+                 if isinstance(entry, dict) and "number" in entry and "timestamp" in entry)
+            )
+            os.replace(legacy_json, legacy_json + ".migrated")
+        self._count = None
+
+    def append(self, number, e164=None, timestamp=None, facts=None):
+        # facts: history_analytics.search_facts() of the search's lookup
+        # result, to count it in the analytics totals as it is made
+        timestamp = timestamp or datetime.now().strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN IMMEDIATE")
+            cursor = self._conn.execute(
+                "INSERT INTO history (number, e164, timestamp) VALUES (?, ?, ?)", (number, e164, timestamp)
+            )
+            self._conn.execute("INSERT OR IGNORE INTO numbers VALUES (?)", (number,))
+            if facts is not None:
+                count_search(self._conn, cursor.lastrowid, number, timestamp, facts)
+            if self._count is not None:
+                self._count += 1
+            self._pending += 1
+            if self._pending >= self.batch_size or time.monotonic() - self._last_commit >= self.flush_interval:
+                self._commit()
+            return cursor.lastrowid
+
+    def append_many(self, entries):
+        # entries: iterable of (number, e164, timestamp); one commit for all
+        with self._lock:
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN IMMEDIATE")
+            last_id = self._conn.execute("SELECT IFNULL(MAX(id), 0) FROM history").fetchone()[0]
+            self._conn.executemany("INSERT INTO history (number, e164, timestamp) VALUES (?, ?, ?)", entries)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO numbers SELECT DISTINCT number FROM history WHERE id > ?", (last_id,)
+            )
+            self._count = None
+            self._commit()
+
+    def _commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def pending(self):
+        # Appends not yet committed
+        return self._pending
+
+    def changed(self):
+        # True if another connection (another instance of the app, say) has
+        # committed since the last call
+        if not self._monitor.changed():
+            return False
+        with self._lock:
+            self._count = None
+        return True
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [HistoryRecord(*row) for row in self._conn.execute(sql, params)]
+
+    def get(self, record_id):
+        records = self._query(f"SELECT {_COLUMNS} FROM history WHERE id = ?", (record_id,))
+        return records[0] if records else None
+
+    def get_many(self, record_ids):
+        # Records for the given ids, in the same order
+        if not record_ids:
+            return []
+        placeholders = ",".join("?" * len(record_ids))
+        by_id = {record.id: record for record in
+                 self._query(f"SELECT {_COLUMNS} FROM history WHERE id IN ({placeholders})", list(record_ids))}
+        return [by_id[record_id] for record_id in record_ids if record_id in by_id]
+
+    def last(self, n):
+        # Newest first
+        return self._query(f"SELECT {_COLUMNS} FROM history ORDER BY id DESC LIMIT ?", (n,))
+
+    def page(self, offset, limit):
+        # `limit` records starting `offset` rows from the newest. Ids are
+        # contiguous unless rows were deleted from the middle, so the row at
+        # an offset can usually be found by id instead of skipping rows.
+        with self._lock:
+            # Separate statements: SQLite only optimizes a lone MIN() or MAX()
+            low = self._conn.execute("SELECT MIN(id) FROM history").fetchone()[0]
+            high = self._conn.execute("SELECT MAX(id) FROM history").fetchone()[0]
+            if high is not None and high - low + 1 == self.count():
+                return self._query(
+                    f"SELECT {_COLUMNS} FROM history WHERE id <= ? ORDER BY id DESC LIMIT ?",
+                    (high - offset, limit)
+                )
+            return self._query(
+                f"SELECT {_COLUMNS} FROM history ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)
+            )
+
+    def _read_connection(self):
+        if self._reader is None:
+            self._reader = connect(self.path)
+            self._reader.execute("CREATE TEMP TABLE filter_numbers (number TEXT PRIMARY KEY)")
+        return self._reader
+
+    def matching_numbers(self, query):
+        # Distinct searched numbers containing `query`. Numbers that parsed
+        # without a region start with "+", so such queries are prefix range
+        # scans of the numbers index; anything else is a substring scan of
+        # the distinct numbers rather than of every search. Only sees
+        # committed searches.
+        with self._reader_lock:
+            conn = self._read_connection()
+            if query.startswith("+"):
+                rows = conn.execute(
+                    "SELECT number FROM numbers WHERE number >= ? AND number < ?", (query, query + "\U0010ffff")
+                )
+            else:
+                rows = conn.execute("SELECT number FROM numbers WHERE instr(number, ?) > 0", (query,))
+            return [row[0] for row in rows]
+
+    def ids_for_numbers(self, numbers):
+        # Ids of every committed search for any of `numbers`, newest first
+        with self._reader_lock:
+            conn = self._read_connection()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM temp.filter_numbers")
+                conn.executemany("INSERT OR IGNORE INTO temp.filter_numbers VALUES (?)",
+                                 ((number,) for number in numbers))
+                ids = array("q", (row[0] for row in conn.execute(
+                    "SELECT id FROM history WHERE number IN (SELECT number FROM temp.filter_numbers) "
+                    "ORDER BY id DESC"
+                )))
+            finally:
+                conn.execute("COMMIT")
+            return ids
+
+    def iter_rows(self, ids=None, chunk_size=10000):
+        # Lists of up to chunk_size (id, number, e164, timestamp) tuples:
+        # every committed search oldest first, or the searches in `ids` in
+        # that order. Each chunk is a separate query on the filter
+        # connection, so exporting a huge history neither holds it all in
+        # memory nor blocks searches for long.
+        if ids is not None:
+            # Few enough ids per query for any SQLite's variable limit
+            for start in range(0, len(ids), 900):
+                batch = list(ids[start:start + 900])
+                placeholders = ",".join("?" * len(batch))
+                with self._reader_lock:
+                    rows = self._read_connection().execute(
+                        f"SELECT {_COLUMNS} FROM history WHERE id IN ({placeholders})", batch
+                    ).fetchall()
+                by_id = {row[0]: row for row in rows}
+                yield [by_id[record_id] for record_id in batch if record_id in by_id]
+            return
+        last_id = 0
+        while True:
+            with self._reader_lock:
+                rows = self._read_connection().execute(
+                    f"SELECT {_COLUMNS} FROM history WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def distinct_numbers(self):
+        # (distinct E.164 numbers searched, distinct texts of the committed
+        # searches stored without one, i.e. imported from the old JSON)
+        with self._reader_lock:
+            conn = self._read_connection()
+            numbers = {row[0] for row in conn.execute("SELECT DISTINCT e164 FROM history WHERE e164 IS NOT NULL")}
+            texts = {row[0] for row in conn.execute("SELECT DISTINCT number FROM history WHERE e164 IS NULL")}
+        return numbers, texts
+
+    def lookups_of(self, e164, limit=-1):
+        # Every search for one number, newest first
+        return self._query(
+            f"SELECT {_COLUMNS} FROM history WHERE e164 = ? ORDER BY id DESC LIMIT ?",
+            (e164, limit)
+        )
+
+    def between(self, start=None, end=None, limit=-1):
+        # Searches with start <= timestamp < end, oldest first
+        start = start or ""
+        end = end or "9999-12-31 23:59:59"
+        return self._query(
+            f"SELECT {_COLUMNS} FROM history WHERE timestamp >= ? AND timestamp < ? "
+            "ORDER BY timestamp LIMIT ?",
+            (start, end, limit)
+        )
+
+    def count(self):
+        with self._lock:
+            if self._count is None:
+                self._count = self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+            return self._count
+
+    def clear(self):
+        with self._lock:
+            self._commit()
+            with write_transaction(self._conn):
+                self._conn.execute("DELETE FROM history")
+                self._conn.execute("DELETE FROM numbers")
+                clear_rollups(self._conn)
+            self._count = 0
+
+    def apply_retention(self, max_entries=None, max_age_days=None):
+        # Drops the oldest searches beyond either limit; returns rows removed
+        removed = 0
+        with self._lock:
+            self._commit()
+            with write_transaction(self._conn):
+                if max_age_days is not None:
+                    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime(TIMESTAMP_FORMAT)
+                    forget_searches(self._conn, "h.timestamp < ?", (cutoff,))
+                    removed += self._conn.execute("DELETE FROM history WHERE timestamp < ?", (cutoff,)).rowcount
+                if max_entries is not None:
+                    row = self._conn.execute(
+                        "SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?", (max_entries,)
+                    ).fetchone()
+                    if row is not None:
+                        forget_searches(self._conn, "h.id <= ?", (row[0],))
+                        removed += self._conn.execute("DELETE FROM history WHERE id <= ?", (row[0],)).rowcount
+            self._count = None
+        return removed
+
+    def compact(self):
+        # Returns the space freed by deletions to the file system
+        with self._lock:
+            self._commit()
+            with write_transaction(self._conn):
+                self._conn.execute("DELETE FROM numbers WHERE number NOT IN (SELECT number FROM history)")
+                prune_facts(self._conn)
+            self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._reader_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--db", help="history database (default: search_history.db in the data directory)")
+    parser.add_argument("--last", type=int, metavar="N", help="print the N most recent searches")
+    parser.add_argument("--number", metavar="E164", help="print every search for this E.164 number")
+    parser.add_argument("--max-entries", type=int, help="drop the oldest searches beyond this many")
+    parser.add_argument("--max-age-days", type=float, help="drop searches older than this")
+    parser.add_argument("--compact", action="store_true", help="reclaim space after deletions")
+
+
+def run(args):
+    store = HistoryStore(args.db or data_path("search_history.db"))
+    try:
+        if args.max_entries is not None or args.max_age_days is not None:
+            removed = store.apply_retention(args.max_entries, args.max_age_days)
+            print(f"removed {removed} searches")
+        if args.compact:
+            store.compact()
+        records = []
+        if args.last:
+            records = store.last(args.last)
+        elif args.number:
+            records = store.lookups_of(args.number)
+        for record in records:
+            print(f"{record.id}\t{record.timestamp}\t{record.number}")
+    finally:
+        store.close()
+    return 0
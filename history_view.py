@@ -0,0 +1,195 @@
+import tkinter as tk
+from tkinter import ttk
+from concurrent.futures import ThreadPoolExecutor
+
+
+class VirtualHistoryList:
+    # Scrolls through the whole search history while the listbox only ever
+    # holds the visible rows. The scrollbar is driven from the total row
+    # count, and each row keeps the id of the history record behind it.
+    # `store` may be None while the history is still being opened; see
+    # set_store.
+    def __init__(self, parent, store, dispatcher, on_open, rows=5, filter_delay_ms=150):
+        self.store = store
+        self.dispatcher = dispatcher
+        self.on_open = on_open
+        self.rows = rows
+        self.filter_delay_ms = filter_delay_ms
+        self.top = 0
+        self.row_ids = []
+        # Row count the list was last drawn with
+        self.shown_total = 0
+        # Active filter: the query, its matching numbers and the matching
+        # record ids (newest first), or None when showing everything
+        self.filter_query = ""
+        self.filter_numbers = None
+        self.filter_ids = None
+        self._filter_generation = 0
+        self._filter_after_id = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-filter")
+
+        self.frame = ttk.Frame(parent)
+        ttk.Label(self.frame, text="Filter:").grid(row=0, column=0, sticky=tk.W, padx=5)
+        self.filter_entry = ttk.Entry(self.frame, width=30)
+        self.filter_entry.grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
+        self.filter_entry.bind('<KeyRelease>', self.on_filter_key)
+        self.count_label = ttk.Label(self.frame, text="")
+        self.count_label.grid(row=0, column=2, sticky=tk.W, padx=5)
+
+        self.listbox = tk.Listbox(self.frame, height=rows, width=60)
+        self.listbox.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), padx=5, pady=5)
+        self.listbox.bind('<Double-Button-1>', self.on_open)
+        self.listbox.bind('<MouseWheel>', self.on_mousewheel)
+        self.listbox.bind('<Button-4>', lambda event: self.scroll_by(-1))
+        self.listbox.bind('<Button-5>', lambda event: self.scroll_by(1))
+
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.grid(row=1, column=3, sticky=(tk.N, tk.S))
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def set_store(self, store):
+        self.store = store
+        if self.filter_entry.get().strip():
+            self.apply_filter()
+        else:
+            self.refresh()
+
+    def total(self):
+        if self.store is None:
+            return 0
+        return len(self.filter_ids) if self.filter_ids is not None else self.store.count()
+
+    def refresh(self):
+        if self.store is None:
+            self.count_label.config(text="Loading history...")
+            return
+        total = self.total()
+        self.shown_total = total
+        self.top = max(0, min(self.top, total - self.rows))
+        if self.filter_ids is not None:
+            records = self.store.get_many(self.filter_ids[self.top:self.top + self.rows])
+        else:
+            records = self.store.page(self.top, self.rows)
+
+        self.listbox.delete(0, tk.END)
+        for record in records:
+            self.listbox.insert(tk.END, f"{record.number} - {record.timestamp}")
+        self.row_ids = [record.id for record in records]
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_label.config(text=f"{total:,} searches" if self.filter_ids is None else f"{total:,} matches")
+
+    def scroll_to(self, top):
+        top = max(0, min(int(top), self.total() - self.rows))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.top + rows)
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.total())
+        elif unit == "pages":
+            self.scroll_by(int(amount) * self.rows)
+        else:
+            self.scroll_by(int(amount))
+
+    def on_mousewheel(self, event):
+        return self.scroll_by(-1 if event.delta > 0 else 1)
+
+    def selected_record(self):
+        selection = self.listbox.curselection()
+        if not selection or selection[0] >= len(self.row_ids):
+            return None
+        return self.store.get(self.row_ids[selection[0]])
+
+    def record_added(self, record_id, number):
+        # Keeps the view on the same rows when a search is appended
+        if self.filter_ids is not None:
+            if self.filter_query not in number:
+                return
+            self.filter_ids.insert(0, record_id)
+            if self.filter_numbers is not None and number not in self.filter_numbers:
+                self.filter_numbers.append(number)
+        if self.top:
+            self.top += 1
+        self.refresh()
+
+    def store_changed(self):
+        # Another instance added or removed searches. A filter is run again
+        # to pick up new matches; otherwise the view stays on the same rows.
+        if self.store is None:
+            return
+        if self.filter_ids is not None:
+            self._filter_generation += 1
+            self._executor.submit(self._filter_worker, self._filter_generation, self.filter_query, None)
+            return
+        added = self.store.count() - self.shown_total
+        if self.top and added > 0:
+            self.top += added
+        self.refresh()
+
+    def reset(self):
+        # Drops the filter and returns to the newest searches
+        self._filter_generation += 1
+        self.filter_entry.delete(0, tk.END)
+        self.filter_query, self.filter_numbers, self.filter_ids = "", None, None
+        self.top = 0
+        self.refresh()
+
+    def on_filter_key(self, event=None):
+        if self._filter_after_id is not None:
+            self.frame.after_cancel(self._filter_after_id)
+        self._filter_after_id = self.frame.after(self.filter_delay_ms, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_after_id = None
+        if self.store is None:
+            # Applied by set_store
+            return
+        query = self.filter_entry.get().strip()
+        if query == self.filter_query and (query or self.filter_ids is None):
+            return
+        self._filter_generation += 1
+        if not query:
+            self.filter_query, self.filter_numbers, self.filter_ids = "", None, None
+            self.top = 0
+            self.refresh()
+            return
+        # Typing more characters only narrows the previous matches, so those
+        # are filtered in memory instead of searching the store again
+        candidates = None
+        if self.filter_query and self.filter_query in query and self.filter_numbers is not None:
+            candidates = self.filter_numbers
+        # The filter reads committed searches only
+        self.store.flush()
+        self.count_label.config(text="Filtering...")
+        self._executor.submit(self._filter_worker, self._filter_generation, query, candidates)
+
+    def _filter_worker(self, generation, query, candidates):
+        if generation != self._filter_generation:
+            return
+        if candidates is None:
+            numbers = self.store.matching_numbers(query)
+        else:
+            numbers = [number for number in candidates if query in number]
+        ids = self.store.ids_for_numbers(numbers)
+        self.dispatcher.post(self._filter_done, generation, query, numbers, ids)
+
+    def _filter_done(self, generation, query, numbers, ids):
+        if generation != self._filter_generation:
+            return
+        self.filter_query, self.filter_numbers, self.filter_ids = query, numbers, ids
+        self.top = 0
+        self.refresh()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
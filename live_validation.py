@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from lookup_engine import validation_status
+from tk_async import LatencyRecorder, elapsed_ms
+
+
+class LiveValidator:
+    # Validates the phone entry as the user types. Keystrokes are debounced,
+    # parsing runs on a worker thread and results for text that has since
+    # changed are dropped. `show` is called on the main loop with the status.
+    def __init__(self, root, dispatcher, get_text, show, debounce_ms=120, memo_size=256, region=None):
+        self.root = root
+        self.dispatcher = dispatcher
+        self.get_text = get_text
+        self.show = show
+        self.debounce_ms = debounce_ms
+        self.memo_size = memo_size
+        self.region = region
+        self._memo = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="validate")
+        self._after_id = None
+        self._generation = 0
+        self._keystroke_at = None
+        self._shown_text = None
+        self.stale_results = 0
+        self.memo_hits = 0
+        # Keystroke to label update, and time spent in each main-thread handler
+        self.latency = LatencyRecorder()
+        self.handler_time = LatencyRecorder()
+
+    def on_key(self, event=None):
+        start = time.perf_counter()
+        self._keystroke_at = start
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._after_id = self.root.after(self.debounce_ms, self._submit)
+        self.handler_time.add(elapsed_ms(start))
+
+    def _submit(self):
+        start = time.perf_counter()
+        self._after_id = None
+        text = self.get_text().strip()
+        self._generation += 1
+        generation = self._generation
+        if not text:
+            self._apply(generation, text, "")
+        elif text in self._memo:
+            self.memo_hits += 1
+            self._memo.move_to_end(text)
+            self._apply(generation, text, self._memo[text])
+        else:
+            self._executor.submit(self._validate, generation, text)
+        self.handler_time.add(elapsed_ms(start))
+
+    def _validate(self, generation, text):
+        # Worker thread: skip the parse if newer input already superseded this
+        if generation != self._generation:
+            self.dispatcher.post(self._discard)
+            return
+        status = validation_status(text, self.region)
+        self.dispatcher.post(self._finish, generation, text, status)
+
+    def _discard(self):
+        self.stale_results += 1
+
+    def _finish(self, generation, text, status):
+        start = time.perf_counter()
+        self._memo[text] = status
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        self._apply(generation, text, status)
+        self.handler_time.add(elapsed_ms(start))
+
+    def _apply(self, generation, text, status):
+        if generation != self._generation:
+            self.stale_results += 1
+            return
+        if text != self._shown_text:
+            self.show(status)
+            self._shown_text = text
+        if self._keystroke_at is not None:
+            self.latency.add(elapsed_ms(self._keystroke_at))
+            self._keystroke_at = None
+
+    def report(self):
+        return {
+            "keystroke_to_label": self.latency.summary(),
+            "ui_handler": self.handler_time.summary(),
+            "stale_results": self.stale_results,
+            "memo_hits": self.memo_hits,
+        }
+
+    def shutdown(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,381 @@
+import phonenumbers
+from phonenumbers import number_type, PhoneNumberType, PhoneNumberFormat, NumberParseException
+from phonenumbers.phonenumberutil import (
+    PhoneMetadata, SUPPORTED_REGIONS, COUNTRY_CODES_FOR_NON_GEO_REGIONS, is_number_type_geographical, region_code_for_number, region_codes_for_country_code,
+    country_mobile_token, is_valid_number_for_region, national_significant_number, region_code_for_country_code,
+    _COUNTRIES_WITHOUT_NATIONAL_PREFIX_WITH_AREA_CODES,
+    _GEO_MOBILE_COUNTRIES_WITHOUT_MOBILE_AREA_CODES
+)
+import re
+import time
+
+from prefix_snapshot import UNKNOWN_TIME_ZONES
+from result_cache import cache_key
+from result_record import LookupResult
+
+# Result fields, in the order they are shown in the GUI
+FIELDS = [
+    "Time Zone(s)", "General Location", "Service Provider", "Number Type",
+    "Network Code", "International Format", "National Format", "E.164 Format",
+    "Country Code", "Country Name", "Possible Lengths", "Is Possible Number",
+    "Is Valid Number"
+]
+
+TYPE_MAPPING = {
+    PhoneNumberType.MOBILE: "Mobile",
+    PhoneNumberType.FIXED_LINE: "Fixed-line",
+    PhoneNumberType.FIXED_LINE_OR_MOBILE: "Fixed-line or Mobile",
+    PhoneNumberType.TOLL_FREE: "Toll-Free",
+    PhoneNumberType.PREMIUM_RATE: "Premium Rate",
+    PhoneNumberType.VOIP: "VoIP",
+    PhoneNumberType.PAGER: "Pager",
+    PhoneNumberType.UAN: "UAN (Universal Access Number)",
+    PhoneNumberType.UNKNOWN: "Unknown",
+}
+
+# Types carrier names are looked up for, as in phonenumbers.carrier
+_MOBILE_TYPES = frozenset((PhoneNumberType.MOBILE, PhoneNumberType.FIXED_LINE_OR_MOBILE, PhoneNumberType.PAGER))
+
+_NON_DIGITS = re.compile(r"\D+")
+
+# phonenumbers compiles its metadata patterns through the re module cache.
+# Workloads spanning many regions overflow the default 512 entries and end
+# up recompiling patterns on almost every call.
+REGEX_CACHE_SIZE = 8192
+
+
+# phonenumbers' geocoder, carrier and timezone modules hold the prefix data
+# and take around half a second to import, most of it the geocoder. They are
+# imported by load_metadata(), which LookupEngine calls, so programs that
+# never look anything up (or do it off the main thread) don't wait for them.
+# An engine given a prefix_snapshot.PrefixSnapshot never imports them.
+geocoder = carrier = timezone = None
+
+
+def load_metadata():
+    global geocoder, carrier, timezone
+    if geocoder is None:
+        from phonenumbers import timezone as _timezone, carrier as _carrier, geocoder as _geocoder
+        timezone, carrier = _timezone, _carrier
+        # Assigned last, since it is what marks the others as loaded
+        geocoder = _geocoder
+
+
+def _widen_regex_cache():
+    if getattr(re, "_MAXCACHE", REGEX_CACHE_SIZE) < REGEX_CACHE_SIZE:
+        re._MAXCACHE = REGEX_CACHE_SIZE
+
+
+# Listed first in country completions; the countries the old quick lookup had
+COMMON_REGIONS = ("US", "GB", "IN", "CN", "JP", "DE", "FR", "AU", "CA", "BR")
+
+
+def country_codes(language="en", snapshot=None):
+    # (name, region, calling code, rank) for every region phonenumbers knows,
+    # plus the non-geographic codes such as +800. Common regions rank 0.
+    # Names come from `snapshot` if given, else from the geocoder.
+    if snapshot is None:
+        load_metadata()
+        region_name = geocoder._region_display_name
+    else:
+        region_name = lambda region, language: snapshot.region_name(region)
+    entries = []
+    for region in sorted(SUPPORTED_REGIONS):
+        name = region_name(region, language) or region
+        rank = 0 if region in COMMON_REGIONS else 1
+        entries.append((name, region, phonenumbers.country_code_for_region(region), rank))
+    for code in sorted(COUNTRY_CODES_FOR_NON_GEO_REGIONS):
+        entries.append(("Non-geographic", None, code, 1))
+    return entries
+
+
+def display_values(result):
+    # Text for each entry of FIELDS, as the result labels show it
+    return [
+        str(result.time_zones),
+        result.location,
+        result.carrier,
+        TYPE_MAPPING.get(result.number_type, "Unknown"),
+        str(result.is_mobile),
+        result.international,
+        result.national,
+        result.e164,
+        f"+{result.country_code}",
+        result.country_name,
+        str(result.area_code_length),
+        "Yes" if result.is_possible else "No",
+        "Yes" if result.is_valid else "No",
+    ]
+
+
+def validation_status(number, region=None):
+    # "valid", "possible", "invalid", or "format" when the text doesn't parse
+    try:
+        phone_number = phonenumbers.parse(number, region)
+    except NumberParseException:
+        return "format"
+    if phonenumbers.is_valid_number(phone_number):
+        return "valid"
+    if phonenumbers.is_possible_number(phone_number):
+        return "possible"
+    return "invalid"
+
+
+class LookupEngine:
+    def __init__(self, language="en", region=None, cache=None, snapshot=None):
+        self.language = language
+        self.region = region
+        # Optional ResultCache of full results, keyed by cache_key() or E.164
+        self.cache = cache
+        # Optional prefix_snapshot.PrefixSnapshot answering the location,
+        # carrier and time zone lookups in place of phonenumbers' modules
+        if snapshot is not None and snapshot.language != language:
+            raise ValueError(f"the snapshot is for language {snapshot.language}, not {language}")
+        self.snapshot = snapshot
+        # Country names for calling codes that belong to a single region
+        self._country_names = {}
+        # Optional metrics.Metrics that records how long each stage takes
+        self.metrics = None
+        _widen_regex_cache()
+        if snapshot is None:
+            load_metadata()
+
+    def lookup(self, number):
+        # Raises NumberParseException like phonenumbers.parse
+        if self.metrics is not None:
+            return self._timed_lookup(number)
+        if self.cache is not None:
+            return self._cached_lookup(number)
+        phone_number = phonenumbers.parse(number.strip(), self.region)
+        return self.describe(number, phone_number)
+
+    def lookup_many(self, numbers):
+        # One result per input, None where the input can't be parsed.
+        # Repeated inputs within a batch are only looked up once.
+        results = []
+        append = results.append
+        seen = {}
+        parse = phonenumbers.parse
+        describe = self.describe if self.cache is None else None
+        timed = self._timed_lookup if self.metrics is not None else None
+        region = self.region
+        for number in numbers:
+            if number in seen:
+                append(seen[number])
+                continue
+            try:
+                if timed is not None:
+                    result = timed(number)
+                elif describe is None:
+                    result = self._cached_lookup(number)
+                else:
+                    result = describe(number, parse(number.strip(), region))
+            except NumberParseException:
+                result = None
+            seen[number] = result
+            append(result)
+        return results
+
+    def describe(self, number, phone_number, metrics=None):
+        # Everything below reuses the parsed number and its type; the
+        # phonenumbers helpers would otherwise re-derive both on every call.
+        # With `metrics`, the time each stage takes is recorded into it.
+        if metrics is not None:
+            start = time.perf_counter()
+        language = self.language
+        snapshot = self.snapshot
+        country_code = phone_number.country_code
+        ntype = number_type(phone_number)
+        is_valid = ntype != PhoneNumberType.UNKNOWN
+        is_mobile = ntype in _MOBILE_TYPES
+        is_possible = phonenumbers.is_possible_number(phone_number)
+        geographical = is_valid and is_number_type_geographical(ntype, country_code)
+        if metrics is not None:
+            start = metrics.lap("validity", start)
+
+        international = phonenumbers.format_number(phone_number, PhoneNumberFormat.INTERNATIONAL)
+        national = phonenumbers.format_number(phone_number, PhoneNumberFormat.NATIONAL)
+        e164 = phonenumbers.format_number(phone_number, PhoneNumberFormat.E164)
+        if metrics is not None:
+            start = metrics.lap("format", start)
+
+        country_name = self._country_name(phone_number)
+        if snapshot is not None and is_valid:
+            # One probe answers the location, time zone and carrier lookups
+            found_location, found_carrier, found_time_zones = snapshot.probe(e164[1:])
+        if geographical:
+            if snapshot is None:
+                location = geocoder.description_for_valid_number(phone_number, language)
+            else:
+                location = self._snapshot_location(phone_number, found_location) or country_name
+            area_code_length = self._area_code_length(phone_number, ntype, international)
+        else:
+            location = country_name if is_valid else ""
+            area_code_length = 0
+        if metrics is not None:
+            start = metrics.lap("geocoder", start)
+
+        if not is_valid:
+            time_zones = UNKNOWN_TIME_ZONES
+        elif snapshot is not None:
+            time_zones = found_time_zones if geographical else snapshot.country_time_zones(country_code)
+        elif geographical:
+            time_zones = timezone.time_zones_for_geographical_number(phone_number)
+        else:
+            time_zones = timezone._country_level_time_zones_for_number(phone_number)
+        if metrics is not None:
+            start = metrics.lap("timezone", start)
+
+        if not is_mobile:
+            carrier_name = ""
+        elif snapshot is not None:
+            carrier_name = found_carrier
+        else:
+            carrier_name = carrier.name_for_valid_number(phone_number, language)
+        if metrics is not None:
+            metrics.lap("carrier", start)
+
+        return LookupResult(
+            number,
+            time_zones,
+            location,
+            carrier_name,
+            ntype,
+            is_mobile,
+            international,
+            national,
+            e164,
+            country_code,
+            country_name,
+            area_code_length,
+            is_possible,
+            is_valid,
+        )
+
+    def prewarm(self):
+        # Loads every region's metadata and compiles the patterns the lookups
+        # use by describing each region's example numbers, so the first real
+        # lookup doesn't pay for it. Results bypass the cache.
+        for region in sorted(SUPPORTED_REGIONS):
+            for ntype in (PhoneNumberType.FIXED_LINE, PhoneNumberType.MOBILE, PhoneNumberType.TOLL_FREE):
+                example = phonenumbers.example_number_for_type(region, ntype)
+                if example is not None:
+                    self.describe("", example)
+
+    def _cached_lookup(self, number):
+        cache = self.cache
+        key = cache_key(number)
+        if key is not None:
+            result = cache.get(key)
+            if result is not None:
+                return result if result.number == number else result.replace(number=number)
+        phone_number = phonenumbers.parse(number.strip(), self.region)
+        if key is None:
+            # Inputs without a leading "+" need parsing to find their E.164 form
+            key = phonenumbers.format_number(phone_number, PhoneNumberFormat.E164)
+            result = cache.get(key)
+            if result is not None:
+                return result.replace(number=number)
+        result = self.describe(number, phone_number)
+        cache.put(key, result)
+        return result
+
+    def _timed_lookup(self, number):
+        # lookup() with every stage recorded into self.metrics
+        metrics = self.metrics
+        cache = self.cache
+        key = None
+        start = time.perf_counter()
+        if cache is not None:
+            key = cache_key(number)
+            result = cache.get(key) if key is not None else None
+            start = metrics.lap("cache", start)
+            if result is not None:
+                metrics.count("cache_hits")
+                return result if result.number == number else result.replace(number=number)
+        try:
+            phone_number = phonenumbers.parse(number.strip(), self.region)
+        except NumberParseException:
+            metrics.count("parse_errors")
+            raise
+        start = metrics.lap("parse", start)
+        if cache is not None and key is None:
+            key = phonenumbers.format_number(phone_number, PhoneNumberFormat.E164)
+            result = cache.get(key)
+            metrics.lap("cache", start)
+            if result is not None:
+                metrics.count("cache_hits")
+                return result.replace(number=number)
+        result = self.describe(number, phone_number, metrics)
+        if cache is not None:
+            start = time.perf_counter()
+            cache.put(key, result)
+            metrics.lap("cache", start)
+            metrics.count("cache_misses")
+        return result
+
+    def _country_name(self, phone_number):
+        country_code = phone_number.country_code
+        name = self._country_names.get(country_code)
+        if name is not None:
+            return name
+        regions = region_codes_for_country_code(country_code)
+        if self.snapshot is None:
+            name = geocoder.country_name_for_number(phone_number, self.language)
+        else:
+            name = self._snapshot_country_name(phone_number, regions)
+        # Shared calling codes (e.g. +1) depend on the number itself
+        if len(regions) == 1:
+            self._country_names[country_code] = name
+        return name
+
+    def _snapshot_country_name(self, phone_number, regions):
+        # geocoder.country_name_for_number: a shared calling code is named
+        # for the one region the number is valid in, if there is just one
+        region = regions[0]
+        if len(regions) > 1:
+            region = "ZZ"
+            for candidate in regions:
+                if is_valid_number_for_region(phone_number, candidate):
+                    if region != "ZZ":
+                        return ""
+                    region = candidate
+        return self.snapshot.region_name(region)
+
+    def _snapshot_location(self, phone_number, found):
+        # geocoder.description_for_valid_number, given the probe of the
+        # number: a mobile number dialled with its country's mobile token
+        # (Argentina's 9) is looked up without it
+        country_code = phone_number.country_code
+        token = country_mobile_token(country_code)
+        if token:
+            national_number = national_significant_number(phone_number)
+            if national_number.startswith(token):
+                try:
+                    phone_number = phonenumbers.parse(national_number[len(token):],
+                                                      region_code_for_country_code(country_code))
+                except NumberParseException:
+                    pass
+                found = self.snapshot.probe(phonenumbers.format_number(phone_number, PhoneNumberFormat.E164)[1:])[0]
+        return found
+
+    def _area_code_length(self, phone_number, ntype, international):
+        # Same rules as phonenumbers.length_of_geographical_area_code, minus
+        # the second type check and international format it would compute
+        if phone_number.extension is not None:
+            return phonenumbers.length_of_geographical_area_code(phone_number)
+        country_code = phone_number.country_code
+        metadata = PhoneMetadata.metadata_for_region(region_code_for_number(phone_number), None)
+        if metadata is None:
+            return 0
+        if (metadata.national_prefix is None and not phone_number.italian_leading_zero and
+                country_code not in _COUNTRIES_WITHOUT_NATIONAL_PREFIX_WITH_AREA_CODES):
+            return 0
+        if ntype == PhoneNumberType.MOBILE and country_code in _GEO_MOBILE_COUNTRIES_WITHOUT_MOBILE_AREA_CODES:
+            return 0
+        number_groups = _NON_DIGITS.split(international)
+        if len(number_groups) <= 3:
+            return 0
+        if ntype == PhoneNumberType.MOBILE and country_mobile_token(country_code):
+            return len(number_groups[2]) + len(number_groups[3])
+        return len(number_groups[2])
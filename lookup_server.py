@@ -0,0 +1,347 @@
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from lookup_engine import LookupEngine
+from metrics import LatencyHistogram, Metrics, prometheus_histograms, prometheus_value
+from prefix_snapshot import open_snapshot
+from result_cache import ResultCache
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+
+class Overloaded(Exception):
+    pass
+
+
+class _Text(str):
+    # A response payload that isn't JSON
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MicroBatcher:
+    # Coalesces single-number requests into one LookupEngine.lookup_many call.
+    # While a batch runs on the engine thread, new requests queue up and go
+    # out together in the next one; when idle, a batch waits up to
+    # `max_delay` for company. Beyond `max_pending` queued numbers, new
+    # requests are refused rather than queued.
+    def __init__(self, engine, max_batch=256, max_delay=0.001, max_pending=10000):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.pending = 0
+        self.batches = 0
+        self.batched_numbers = 0
+        self.rejected = 0
+        self._queue = deque()
+        self._wakeup = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lookup")
+        self._task = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def admit(self, count):
+        if self.pending + count > self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+
+    async def lookup(self, number):
+        self.admit(1)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((number, future))
+        self.pending += 1
+        self._wakeup.set()
+        return await future
+
+    async def lookup_many(self, numbers):
+        # A batch request goes to the engine as it is, in turn with the rest
+        self.admit(len(numbers))
+        self.pending += len(numbers)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.engine.lookup_many, numbers)
+        finally:
+            self.pending -= len(numbers)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            await self._wakeup.wait()
+            if len(queue) < self.max_batch and self.max_delay:
+                await asyncio.sleep(self.max_delay)
+            batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch))]
+            if not queue:
+                self._wakeup.clear()
+            if not batch:
+                continue
+            numbers = [number for number, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.engine.lookup_many, numbers)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    # The client may have gone away in the meantime
+                    if not future.done():
+                        future.set_result(result)
+            self.pending -= len(batch)
+            self.batches += 1
+            self.batched_numbers += len(batch)
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "batches": self.batches,
+            "mean_batch": self.batched_numbers / self.batches if self.batches else 0.0,
+            "rejected": self.rejected,
+        }
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LookupServer:
+    # Minimal HTTP/1.1 server on asyncio streams; persistent connections by
+    # default, closed after `idle_timeout` seconds without a request.
+    #
+    #   GET  /lookup?number=+12125551234   one result as a JSON object
+    #   POST /lookup   {"number": "..."}
+    #   POST /batch    {"numbers": [...]}  a JSON list, null where unparseable
+    #   GET  /health
+    #   GET  /metrics  latency histograms per endpoint, batching, cache and
+    #                  lookup stages; ?format=prometheus for Prometheus text
+    def __init__(self, engine, host="127.0.0.1", port=8080, max_batch=256, max_delay=0.001,
+                 max_pending=10000, max_batch_request=10000, idle_timeout=30.0):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.max_batch_request = max_batch_request
+        self.idle_timeout = idle_timeout
+        self.batcher = MicroBatcher(engine, max_batch, max_delay, max_pending)
+        self.latency = {}
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        self.batcher.start()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, backlog=4096, limit=MAX_HEADER_BYTES
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        # After start()
+        await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        loop = asyncio.get_running_loop()
+        transport = writer.transport
+        # One timer per connection rather than a wait_for task per request;
+        # closing the transport ends the pending read
+        idle_timer = loop.call_later(self.idle_timeout, transport.close)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return
+                idle_timer.cancel()
+                start = time.perf_counter()
+                keep_alive, path = await self._handle_request(head, reader, writer)
+                if transport.get_write_buffer_size() > 64 * 1024:
+                    await writer.drain()
+                histogram = self.latency.get(path)
+                if histogram is None:
+                    histogram = self.latency[path] = LatencyHistogram()
+                histogram.add((time.perf_counter() - start) * 1000)
+                self.requests += 1
+                if not keep_alive:
+                    return
+                idle_timer = loop.call_later(self.idle_timeout, transport.close)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            idle_timer.cancel()
+            self.connections -= 1
+            writer.close()
+
+    async def _handle_request(self, head, reader, writer):
+        # Returns (keep the connection open, path for the latency histograms)
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = request_line.split()
+        except ValueError:
+            self._respond(writer, 400, '{"error": "malformed request line"}', False)
+            return False, "invalid"
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        # Digits only: no sign, so no negative length
+        length = headers.get("content-length") or "0"
+        if not (length.isascii() and length.isdigit()):
+            self._respond(writer, 400, '{"error": "malformed Content-Length"}', False)
+            return False, "invalid"
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            self._respond(writer, 413, '{"error": "request body too large"}', False)
+            return False, "invalid"
+        body = await reader.readexactly(length) if length else b""
+
+        url = urlsplit(target)
+        path = url.path
+        try:
+            status, payload = await self._route(method, path, url.query, body)
+        except Overloaded:
+            status, payload = 503, '{"error": "overloaded, retry later"}'
+        except (ValueError, KeyError, TypeError) as e:
+            status, payload = 400, json.dumps({"error": str(e) or type(e).__name__})
+        except Exception as e:
+            status, payload = 500, json.dumps({"error": f"{type(e).__name__}: {e}"})
+        if status == 404:
+            path = "unknown"
+        self._respond(writer, status, payload, keep_alive)
+        return keep_alive, path
+
+    async def _route(self, method, path, query, body):
+        if path == "/lookup":
+            if method == "GET":
+                number = parse_qs(query).get("number", [""])[0]
+            elif method == "POST":
+                number = json.loads(body)["number"]
+            else:
+                return 405, '{"error": "use GET or POST"}'
+            if not isinstance(number, str) or not number:
+                raise ValueError("number must be a non-empty string")
+            result = await self.batcher.lookup(number)
+            if result is None:
+                return 400, json.dumps({"error": "not a phone number", "number": number})
+            return 200, result.json()
+        if path == "/batch":
+            if method != "POST":
+                return 405, '{"error": "use POST"}'
+            numbers = json.loads(body)["numbers"]
+            if not isinstance(numbers, list) or not all(isinstance(number, str) for number in numbers):
+                raise ValueError("numbers must be a list of strings")
+            if len(numbers) > self.max_batch_request:
+                return 413, json.dumps({"error": f"at most {self.max_batch_request} numbers per batch"})
+            results = await self.batcher.lookup_many(numbers)
+            return 200, "[" + ", ".join(result.json() if result is not None else "null" for result in results) + "]"
+        if path == "/health":
+            return 200, '{"status": "ok"}'
+        if path == "/metrics":
+            if parse_qs(query).get("format", [""])[0] == "prometheus":
+                return 200, _Text(self.prometheus())
+            return 200, json.dumps(self.metrics())
+        return 404, '{"error": "not found"}'
+
+    def _respond(self, writer, status, payload, keep_alive):
+        body = payload.encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {getattr(payload, 'content_type', 'application/json')}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+    def metrics(self):
+        return {
+            "connections": self.connections,
+            "requests": self.requests,
+            "endpoints": {path: histogram.summary() for path, histogram in self.latency.items()},
+            "batching": self.batcher.stats(),
+            "cache": self.engine.cache.stats() if self.engine.cache is not None else None,
+            "stages": self.engine.metrics.snapshot() if self.engine.metrics is not None else None,
+        }
+
+    def prometheus(self, prefix="location_tracker"):
+        lines = prometheus_histograms(
+            f"{prefix}_request_duration_seconds", "Time to handle a request, by path.", "path",
+            sorted(self.latency.items()),
+        )
+        lines += prometheus_value(f"{prefix}_connections", "Open connections.", "gauge", self.connections)
+        lines += prometheus_value(f"{prefix}_requests_total", "Requests handled.", "counter", self.requests)
+        batching = self.batcher.stats()
+        lines += prometheus_value(f"{prefix}_pending_numbers", "Numbers waiting for the engine.", "gauge",
+                                  batching["pending"])
+        lines += prometheus_value(f"{prefix}_engine_batches_total", "Engine calls made.", "counter",
+                                  batching["batches"])
+        lines += prometheus_value(f"{prefix}_rejected_requests_total", "Requests refused with 503.", "counter",
+                                  batching["rejected"])
+        text = "\n".join(lines) + "\n"
+        if self.engine.metrics is not None:
+            text += self.engine.metrics.prometheus(prefix)
+        return text
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on, 0 for any (default: 8080)")
+    parser.add_argument("--max-batch", type=int, default=256, help="most single lookups coalesced per engine call")
+    parser.add_argument("--batch-delay-ms", type=float, default=1.0,
+                        help="how long an idle batcher waits for more requests")
+    parser.add_argument("--max-pending", type=int, default=10000,
+                        help="queued numbers beyond which requests get 503")
+    parser.add_argument("--cache-size", type=int, default=100000, help="result cache size, 0 to disable")
+    parser.add_argument("--region", help="default region for numbers without a country code, e.g. US")
+    parser.add_argument("--stage-metrics", action="store_true",
+                        help="time each lookup stage (parse, geocoder, ...) for /metrics")
+
+
+def run(args):
+    cache = ResultCache(maxsize=args.cache_size) if args.cache_size else None
+    engine = LookupEngine(region=args.region, cache=cache, snapshot=open_snapshot())
+    engine.prewarm()
+    if args.stage_metrics:
+        engine.metrics = Metrics()
+    server = LookupServer(engine, args.host, args.port, args.max_batch, args.batch_delay_ms / 1000,
+                          args.max_pending)
+
+    async def serve():
+        await server.start()
+        print(f"listening on http://{server.host}:{server.port}", file=sys.stderr, flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
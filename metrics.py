@@ -0,0 +1,255 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+
+# Stages in the order a lookup goes through them: the engine's, then the
+# GUI's. Reports list any others after these.
+STAGES = ("cache", "parse", "validity", "format", "geocoder", "timezone", "carrier",
+          "history", "widgets", "total")
+
+
+class LatencyHistogram:
+    # Fixed log-spaced buckets (0.05 ms doubling up to ~1.7 min), so
+    # recording is O(log buckets) and memory doesn't grow with traffic
+    BOUNDS_MS = [0.05 * 2 ** i for i in range(22)]
+    LABELS = [f"{bound:g}" for bound in BOUNDS_MS] + ["+Inf"]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding that fraction of samples, or the
+        # largest sample if that is lower
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.BOUNDS_MS[index], self.max_ms) if index < len(self.BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {label: count for label, count in zip(self.LABELS, self.counts) if count},
+        }
+
+
+class StageHistogram(LatencyHistogram):
+    # Single stages take microseconds, so these start at 1 µs (up to ~67 s)
+    BOUNDS_MS = [0.001 * 2 ** i for i in range(27)]
+    LABELS = [f"{bound:g}" for bound in BOUNDS_MS] + ["+Inf"]
+
+
+class Metrics:
+    # Latency histograms per stage and plain counters. Code that records into
+    # one holds it in a `metrics` variable that is None when disabled, and
+    # checks that before taking any timestamps, so a disabled stage costs a
+    # single comparison.
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sent back from worker processes by bulk enrichment
+        return self.stages, self.counters
+
+    def __setstate__(self, state):
+        self.stages, self.counters = state
+        self._lock = threading.Lock()
+
+    def observe(self, stage, ms):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = StageHistogram()
+            histogram.add(ms)
+
+    def lap(self, stage, start):
+        # Records the time since `start` (a perf_counter() value) against
+        # `stage` and returns now, for timing the next stage from
+        now = time.perf_counter()
+        self.observe(stage, (now - start) * 1000)
+        return now
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other):
+        with self._lock:
+            for stage, histogram in other.stages.items():
+                mine = self.stages.get(stage)
+                if mine is None:
+                    mine = self.stages[stage] = StageHistogram()
+                mine.merge(histogram)
+            for name, amount in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def take(self):
+        # Everything recorded so far as a new Metrics, leaving this one empty
+        taken = Metrics()
+        with self._lock:
+            taken.stages, self.stages = self.stages, {}
+            taken.counters, self.counters = self.counters, {}
+        return taken
+
+    def reset(self):
+        self.take()
+
+    def _ordered_stages(self):
+        with self._lock:
+            stages = dict(self.stages)
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        return sorted(stages.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "stages": {stage: histogram.summary() for stage, histogram in self._ordered_stages()},
+            "counters": counters,
+        }
+
+    def json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def prometheus(self, prefix="location_tracker"):
+        # Prometheus text exposition format
+        with self._lock:
+            counters = dict(self.counters)
+        lines = prometheus_histograms(
+            f"{prefix}_stage_duration_seconds", "Time spent in each lookup stage.", "stage",
+            self._ordered_stages(),
+        )
+        for name, value in sorted(counters.items()):
+            lines += prometheus_value(f"{prefix}_{name}_total", f"Count of {name.replace('_', ' ')}.",
+                                      "counter", value)
+        return "\n".join(lines) + "\n"
+
+    def table(self):
+        # Plain text table for the diagnostics panel and the terminal
+        lines = [f"{'stage':<14}{'count':>9}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage, histogram in self._ordered_stages():
+            mean = histogram.total_ms / histogram.count if histogram.count else 0.0
+            lines.append(f"{stage:<14}{histogram.count:>9,}{mean:>10.3f}{histogram.percentile(0.5):>10.3f}"
+                         f"{histogram.percentile(0.99):>10.3f}{histogram.max_ms:>10.3f}")
+        with self._lock:
+            counters = dict(self.counters)
+        if counters:
+            lines.append("")
+            lines += [f"{name:<23}{value:>9,}" for name, value in sorted(counters.items())]
+        return "\n".join(lines)
+
+
+def prometheus_histograms(name, help_text, label, histograms):
+    # Lines for one histogram family; `histograms` is (label value,
+    # LatencyHistogram) pairs in milliseconds, written out in seconds
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for value, histogram in histograms:
+        cumulative = 0
+        for bound, count in zip(histogram.BOUNDS_MS, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}="{value}",le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{label}="{value}"}} {histogram.total_ms / 1000:.9g}')
+        lines.append(f'{name}_count{{{label}="{value}"}} {histogram.count}')
+    return lines
+
+
+def prometheus_value(name, help_text, kind, value):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+def profile_call(function, *args, limit=25):
+    # Runs function(*args) once under cProfile and tracemalloc. Returns
+    # (its result or None, the exception it raised or None, a text report).
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    result = error = None
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = function(*args)
+    except Exception as e:
+        error = e
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+
+    out = io.StringIO()
+    out.write(f"Wall time {elapsed_ms:.2f} ms (under the profiler), peak traced memory {peak / 1024:.1f} KiB\n")
+    if error is not None:
+        out.write(f"Raised {type(error).__name__}: {error}\n")
+    out.write("\nLargest allocations still held, by line:\n")
+    for stat in after.compare_to(before, "lineno")[:10]:
+        out.write(f"  {stat}\n")
+    out.write("\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    return result, error, out.getvalue()
+
+
+def add_arguments(parser):
+    parser.add_argument("number", help="phone number to look up, e.g. +12125551234")
+    parser.add_argument("--region", help="default region for numbers without a country code, e.g. US")
+    parser.add_argument("--warm", action="store_true",
+                        help="load the lookup data before profiling, so only the lookup itself is measured")
+    parser.add_argument("--limit", type=int, default=25, help="functions listed in the profile")
+
+
+def run(args):
+    from lookup_engine import LookupEngine, load_metadata
+
+    if args.warm:
+        load_metadata()
+    metrics = Metrics()
+
+    def lookup():
+        engine = LookupEngine(region=args.region)
+        engine.metrics = metrics
+        return engine.lookup(args.number)
+
+    result, error, report = profile_call(lookup, limit=args.limit)
+    print(report)
+    print(metrics.table())
+    if result is not None:
+        print()
+        print(result.json())
+    return 1 if error is not None else 0
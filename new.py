@@ -1,15 +1,68 @@
+import time
+# Taken before the other imports, so the startup timing includes them
+STARTED = time.perf_counter()
 import phonenumbers
-from phonenumbers import timezone, geocoder, carrier, number_type, PhoneNumberType, NumberParseException
+from phonenumbers import NumberParseException
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 import json
 import os
 from datetime import datetime
-import csv
+import argparse
+import importlib
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from lookup_engine import LookupEngine, FIELDS, display_values, country_codes
+from prefix_snapshot import open_snapshot
+from result_cache import ResultCache
+from shared_storage import data_path
+from live_validation import LiveValidator
+from tk_async import MainThreadQueue, FRAME_BUDGET_MS
+from history_store import HistoryStore
+from history_analytics import HistoryAnalytics, search_facts
+from history_view import VirtualHistoryList
+from template_store import TemplateStore
+from prefix_index import TemplateIndex, CountryIndex
+from typeahead import CompletionPopup, ComboboxFilter
+from startup_timing import StartupTimer
+from metrics import Metrics, profile_call
+from diagnostics_view import DiagnosticsPanel
+from scan_view import ScanPanel
+from analytics_view import AnalyticsPanel
+
+# Live validation label text and colour for each validation_status
+VALIDATION_DISPLAY = {
+    "valid": ("✓ Valid", "green"),
+    "possible": ("⚠ Possible", "orange"),
+    "invalid": ("✗ Invalid", "red"),
+    "format": ("✗ Invalid Format", "red"),
+}
+
+# Reached once the window is up and everything loaded in the background is in
+STARTUP_MILESTONES = ("first paint", "history shown", "templates shown", "lookups ready", "completions ready")
+
+# Headless modes: command -> (module with add_arguments/run, help). Only the
+# module of the command being run is imported.
+COMMANDS = {
+    "enrich": ("bulk_enrich", "enrich a CSV or text file of numbers"),
+    "classify": ("classify", "country code, region, type and validity only, fast"),
+    "serve": ("lookup_server", "serve lookups over HTTP/JSON"),
+    "history": ("history_store", "query and maintain the search history"),
+    "export": ("history_export", "export the search history, looked up again, as CSV, JSONL or Parquet"),
+    "scan": ("text_scan", "find and look up the phone numbers in a text file"),
+    "profile": ("metrics", "profile one lookup with cProfile and tracemalloc"),
+    "reenrich": ("enrichment_store", "look the stored history and template numbers up again where their "
+                                     "phonenumbers data is out of date, recording what changed"),
+    "snapshot": ("prefix_snapshot", "build or check the prefix snapshot that speeds up location, carrier "
+                                    "and time zone lookups"),
+    "report": ("history_analytics", "searches by country, region, carrier, number type and time, from "
+                                    "totals kept up to date as searches are made"),
+}
 
 class PhoneNumberTracker:
-    def __init__(self, root):
+    def __init__(self, root, prewarm=True, timer=None):
         self.root = root
+        self.timer = timer or StartupTimer(STARTED, STARTUP_MILESTONES)
         self.root.title("Phone Number Location Tracker")
         self.root.geometry("1000x900")
         self.root.resizable(True, True)
@@ -46,8 +99,8 @@ class PhoneNumberTracker:
             }
         }
         
-        # Initialize template categories first
-        self.template_categories = {
+        # Categories a new template book starts with
+        self.default_template_categories = {
             "Business": {
                 "Corporate Office": "+1-212-555-1234",
                 "Customer Support": "+44-20-7123-4567",
@@ -65,10 +118,52 @@ class PhoneNumberTracker:
             }
         }
         
-        # Initialize data
-        self.templates = self.load_templates()
-        self.search_history = self.load_search_history()
+        # The window comes up first; the history and template stores are
+        # opened in the background and their panels filled in when ready.
+        # template_categories mirrors the template store once it is open.
+        self.template_store = None
+        self.template_categories = {}
+        self.search_history = None
+        self.pending_history = []
         self.current_theme = "light"
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Results from worker threads are handed back to the Tk loop here
+        self.dispatcher = MainThreadQueue(self.root)
+        
+        # Lookups run in the background so the window never freezes. The
+        # engine and the phonenumbers data behind it are loaded there too;
+        # lookups started before then wait for it.
+        self.result_cache = None
+        self.engine = None
+        # Time spent in each stage of a lookup, from parsing to the widget
+        # updates; see View > Diagnostics
+        self.metrics = Metrics()
+        self.diagnostics = None
+        self.scan_panel = None
+        self.analytics_panel = None
+        self.profile_next_lookup = False
+        self.lookup_started = None
+        self.lookup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lookup")
+        self.engine_future = self.lookup_executor.submit(self.load_engine, prewarm)
+        self.lookup_future = None
+        self.lookup_generation = 0
+        # File > Export History runs here, one export at a time
+        self.export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        self.export_future = None
+        # Reports over the history for View > Analytics, once it is open
+        self.analytics_future = Future()
+        self.closing = False
+        
+        # Stores, then completion indexes, are loaded in the background;
+        # template changes made before the index is ready are replayed onto it
+        self.template_index = None
+        self.country_index = None
+        self.pending_template_changes = []
+        # Latest template_log entry the book and index reflect
+        self.template_seq = 0
+        self.index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index")
+        self.index_executor.submit(self.load_data)
         
         # Create main frame
         self.main_frame = ttk.Frame(root, padding="10")
@@ -82,6 +177,14 @@ class PhoneNumberTracker:
         
         # Apply initial theme
         self.apply_theme()
+        self.watch_shared_stores()
+        self.timer.mark("widgets built")
+        self.root.after_idle(self.first_paint)
+        
+    def first_paint(self):
+        # Idle callbacks queued now run after Tk's own for mapping and
+        # drawing the window
+        self.timer.mark("first paint")
         
     def create_ui_elements(self):
         # Template management frame
@@ -99,6 +202,8 @@ class PhoneNumberTracker:
         self.template_var = tk.StringVar()
         self.template_combo = ttk.Combobox(template_frame, textvariable=self.template_var, width=25)
         self.template_combo.grid(row=0, column=1, padx=5, pady=5)
+        self.template_combo.bind('<<ComboboxSelected>>', self.load_template)
+        self.template_filter = ComboboxFilter(self.template_combo, self.template_names)
         
         # Template buttons with icons
         self.save_template_btn = ttk.Button(template_frame, text="Save Template", command=self.save_template)
@@ -117,9 +222,8 @@ class PhoneNumberTracker:
         self.country_var = tk.StringVar()
         self.country_combo = ttk.Combobox(country_frame, textvariable=self.country_var, width=30)
         self.country_combo.grid(row=0, column=0, padx=5, pady=5)
-        self.country_codes = self.get_country_codes()
-        self.country_combo['values'] = [f"{country} (+{code})" for country, code in self.country_codes.items()]
         self.country_combo.bind('<<ComboboxSelected>>', self.insert_country_code)
+        self.country_filter = ComboboxFilter(self.country_combo, self.country_names)
         
         # Phone number input frame
         input_frame = ttk.LabelFrame(self.main_frame, text="Phone Number Input", padding="5")
@@ -128,27 +232,36 @@ class PhoneNumberTracker:
         ttk.Label(input_frame, text="Enter phone number with country code:").grid(row=0, column=0, sticky=tk.W, pady=5)
         self.phone_entry = ttk.Entry(input_frame, width=30)
         self.phone_entry.grid(row=0, column=1, sticky=tk.W, pady=5, padx=5)
-        self.phone_entry.bind('<KeyRelease>', self.validate_number_live)
+        self.phone_entry.bind('<KeyRelease>', self.on_phone_key)
+        self.phone_completion = CompletionPopup(self.phone_entry, self.complete_phone_entry, self.choose_completion)
         
         # Live validation label
         self.validation_label = ttk.Label(input_frame, text="")
         self.validation_label.grid(row=0, column=2, sticky=tk.W, pady=5, padx=5)
+        self.live_validator = LiveValidator(
+            self.root, self.dispatcher, self.phone_entry.get, self.show_validation_status
+        )
         
-        # Track button
-        self.track_btn = ttk.Button(input_frame, text="Track", command=self.track_number)
+        # Track button, which turns into Cancel while a lookup is running
+        self.track_btn = ttk.Button(input_frame, text="Track", command=self.toggle_lookup)
         self.track_btn.grid(row=0, column=3, pady=5, padx=5)
+        self.root.bind('<Escape>', self.cancel_lookup)
+        
+        self.lookup_status_label = ttk.Label(input_frame, text="")
+        self.lookup_status_label.grid(row=0, column=4, sticky=tk.W, pady=5, padx=5)
         
         # History frame
         history_frame = ttk.LabelFrame(self.main_frame, text="Search History", padding="5")
         history_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
         
-        self.history_listbox = tk.Listbox(history_frame, height=5)
-        self.history_listbox.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
-        self.history_listbox.bind('<Double-Button-1>', self.load_from_history)
-        
-        history_scrollbar = ttk.Scrollbar(history_frame, orient="vertical", command=self.history_listbox.yview)
-        history_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.history_listbox.configure(yscrollcommand=history_scrollbar.set)
+        # Only the visible rows are ever loaded, however long the history is
+        self.history_view = VirtualHistoryList(
+            history_frame, self.search_history, self.dispatcher, self.load_from_history
+        )
+        self.history_view.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.history_listbox = self.history_view.listbox
+        self.export_status_label = ttk.Label(history_frame, text="")
+        self.export_status_label.grid(row=1, column=0, sticky=tk.W, padx=5)
         
         # Update history display
         self.update_history_display()
@@ -159,12 +272,7 @@ class PhoneNumberTracker:
         
         # Create labels for results
         self.result_labels = {}
-        self.fields = [
-            "Time Zone(s)", "General Location", "Service Provider", "Number Type",
-            "Network Code", "International Format", "National Format", "E.164 Format",
-            "Country Code", "Country Name", "Possible Lengths", "Is Possible Number",
-            "Is Valid Number"
-        ]
+        self.fields = list(FIELDS)
         
         for i, field in enumerate(self.fields):
             ttk.Label(self.results_frame, text=f"{field}:").grid(row=i, column=0, sticky=tk.W, pady=2)
@@ -235,39 +343,203 @@ class PhoneNumberTracker:
         style.configure("TButton", font=('Helvetica', 10, 'bold'))
         style.configure("TCombobox", font=('Helvetica', 10))
         
-        # Configure modern colors
-        self.apply_theme()
-        
     def update_template_list(self, event=None):
         category = self.category_var.get()
         if category in self.template_categories:
-            self.template_combo['values'] = list(self.template_categories[category].keys())
             self.template_combo.set('')
+            self.template_filter.refresh()
+            
+    def templates_loaded(self):
+        if self.template_store is None:
+            messagebox.showinfo("Templates", "Templates are still loading, please try again in a moment.")
+            return False
+        return True
             
     def add_category(self):
+        if not self.templates_loaded():
+            return
         category_name = simpledialog.askstring("Add Category", "Enter category name:")
         if category_name:
-            self.template_categories[category_name] = {}
+            self.template_categories.setdefault(category_name, {})
             self.category_combo['values'] = list(self.template_categories.keys())
-            self.save_templates()
+            try:
+                self.template_store.add_category(category_name)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save templates: {str(e)}")
             
     def load_templates(self):
+        # SQLite template book, shared with other instances; an existing
+        # templates.json is imported once, otherwise it starts with the
+        # default categories
+        return TemplateStore(data_path('templates.db'), legacy_json='templates.json',
+                             defaults=self.default_template_categories)
+    
+    def load_data(self):
+        # Index thread: opens the stores, then builds the completion indexes
+        start = time.perf_counter()
         try:
-            if os.path.exists('templates.json'):
-                with open('templates.json', 'r') as f:
-                    return json.load(f)
-            return self.template_categories
-        except Exception:
-            return self.template_categories
-            
-    def save_templates(self):
-        try:
-            with open('templates.json', 'w') as f:
-                json.dump(self.template_categories, f)
+            search_history = self.load_search_history()
+            self.timer.add_duration("history store", start)
+            self.dispatcher.post(self.set_search_history, search_history)
+            self.analytics_future.set_result(HistoryAnalytics(search_history.path, self.engine_future.result))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to save templates: {str(e)}")
+            # View > Analytics reports this instead of waiting for it; the
+            # templates are still loaded
+            self.analytics_future.set_exception(e)
+            self.dispatcher.post(messagebox.showerror, "Error", f"Failed to open search history: {str(e)}")
+        start = time.perf_counter()
+        template_store = self.load_templates()
+        # Changes logged after this are caught up on by apply_template_log
+        seq = template_store.last_change()
+        categories = template_store.load()
+        # The index is built from a copy, since the book is edited on the
+        # main thread from now on
+        book = {category: dict(templates) for category, templates in categories.items()}
+        self.timer.add_duration("template store", start)
+        self.dispatcher.post(self.set_template_store, template_store, categories, seq)
+        start = time.perf_counter()
+        self.build_completion_indexes(book)
+        self.timer.add_duration("completion indexes", start)
+    
+    def set_search_history(self, store):
+        # Searches finished before the store was open are added first
+        for number, e164, timestamp, facts in self.pending_history:
+            store.append(number, e164, timestamp, facts)
+        self.pending_history = []
+        self.search_history = store
+        self.history_view.set_store(store)
+        self.timer.mark("history shown")
+    
+    def set_template_store(self, store, categories, seq):
+        self.template_store = store
+        self.template_categories = categories
+        self.template_seq = seq
+        self.category_combo['values'] = list(categories.keys())
+        self.template_filter.refresh()
+        self.timer.mark("templates shown")
+    
+    def build_completion_indexes(self, book):
+        # Index thread; the country index needs the geocoder's data, so it
+        # comes second
+        template_index = TemplateIndex(book)
+        self.dispatcher.post(self.set_template_index, template_index)
+        country_index = CountryIndex(self.get_country_codes())
+        self.dispatcher.post(self.set_country_index, country_index)
+    
+    def set_country_index(self, index):
+        self.country_index = index
+        self.country_filter.refresh()
+        self.timer.mark("completions ready")
+    
+    def set_template_index(self, index):
+        for change in self.pending_template_changes:
+            change(index)
+        self.pending_template_changes = []
+        self.template_index = index
+        self.template_filter.refresh()
+    
+    def watch_shared_stores(self):
+        # Searches and template edits made by other instances of the app (or
+        # from the command line) show up here within half a second. Each
+        # check reads one counter per store, not the stores themselves.
+        if self.closing:
+            return
+        self.root.after(500, self.watch_shared_stores)
+        if self.search_history is not None and self.search_history.changed():
+            self.history_view.store_changed()
+            if self.analytics_panel is not None:
+                self.analytics_panel.refresh()
+        if self.template_store is not None and self.template_store.changed():
+            self.apply_template_log()
+
+    def apply_template_log(self):
+        # Replays template changes logged since template_seq onto the book
+        # and the index. This instance's own changes are already applied
+        # and are skipped.
+        changes = self.template_store.changes_since(self.template_seq)
+        if changes is None:
+            # Too far behind the log; reload the whole book
+            self.index_executor.submit(self.reload_templates, self.template_store)
+            return
+        for seq, category, name, number in changes:
+            self.template_seq = seq
+            templates = self.template_categories.setdefault(category, {})
+            old_number = templates.get(name) if name is not None else None
+            if name is None or old_number == number:
+                continue
+            if number is None:
+                del templates[name]
+            else:
+                templates[name] = number
+            if old_number is not None:
+                self.update_template_index(
+                    lambda index, category=category, name=name, number=old_number: index.remove(category, name, number))
+            if number is not None:
+                self.update_template_index(
+                    lambda index, category=category, name=name, number=number: index.add(category, name, number))
+        self.category_combo['values'] = list(self.template_categories.keys())
+        self.template_filter.refresh()
+
+    def reload_templates(self, store):
+        # Index thread
+        seq = store.last_change()
+        categories = store.load()
+        index = TemplateIndex({category: dict(templates) for category, templates in categories.items()})
+        self.dispatcher.post(self.templates_reloaded, store, categories, seq, index)
+
+    def templates_reloaded(self, store, categories, seq, index):
+        self.set_template_store(store, categories, seq)
+        self.pending_template_changes = []
+        self.set_template_index(index)
+        # Anything saved here while the book was reloading
+        self.apply_template_log()
+
+    def update_template_index(self, change):
+        # change(index) is applied now, or once the index has been built
+        if self.template_index is None:
+            self.pending_template_changes.append(change)
+        else:
+            change(self.template_index)
+    
+    def template_names(self, text, limit):
+        category = self.category_var.get()
+        if self.template_index is not None:
+            return self.template_index.names_in(category, text, limit)
+        text = text.casefold()
+        names = [name for name in self.template_categories.get(category, {}) if name.casefold().startswith(text)]
+        return names[:limit]
+    
+    def country_names(self, text, limit):
+        if self.country_index is None:
+            return []
+        return self.country_index.complete(text, limit)
+    
+    def complete_phone_entry(self, text):
+        # Templates by name or number, then countries by name
+        items = []
+        if self.template_index is not None:
+            for category, name in self.template_index.complete(text, self.phone_completion.limit):
+                number = self.template_categories.get(category, {}).get(name)
+                if number is not None:
+                    items.append((f"{name} ({category})  {number}", ("template", category, name)))
+        if self.country_index is not None and not text[:1].isdigit() and not text.startswith("+"):
+            for label in self.country_index.complete(text, self.phone_completion.limit - len(items)):
+                items.append((label, ("country", label)))
+        return items
+    
+    def choose_completion(self, payload):
+        if payload[0] == "template":
+            self.category_var.set(payload[1])
+            self.template_var.set(payload[2])
+            self.load_template()
+        else:
+            self.country_var.set(payload[1])
+            self.insert_country_code()
+        self.validate_number_live()
             
     def save_template(self):
+        if not self.templates_loaded():
+            return
         number = self.phone_entry.get().strip()
         if not number:
             messagebox.showerror("Error", "Please enter a phone number to save as template")
@@ -290,13 +562,18 @@ class PhoneNumberTracker:
             if not template_name:
                 return
                 
-            # Save the template
-            self.template_categories[category][template_name] = number
-            self.save_templates()
+            # Save the template; only its own row is written
+            self.template_store.put(category, template_name, number)
+            templates = self.template_categories.setdefault(category, {})
+            old_number = templates.get(template_name)
+            templates[template_name] = number
+            if old_number is not None:
+                self.update_template_index(lambda index: index.remove(category, template_name, old_number))
+            self.update_template_index(lambda index: index.add(category, template_name, number))
             
             # Update combobox
-            self.template_combo['values'] = list(self.template_categories[category].keys())
             self.template_combo.set(template_name)
+            self.template_filter.refresh()
             
             messagebox.showinfo("Success", "Template saved successfully!")
             
@@ -311,6 +588,8 @@ class PhoneNumberTracker:
             self.phone_entry.insert(0, self.template_categories[category][template_name])
             
     def delete_template(self):
+        if not self.templates_loaded():
+            return
         category = self.category_var.get()
         template_name = self.template_var.get()
         if not category or not template_name:
@@ -318,10 +597,12 @@ class PhoneNumberTracker:
             return
             
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete template '{template_name}' from category '{category}'?"):
-            del self.template_categories[category][template_name]
-            self.save_templates()
-            self.template_combo['values'] = list(self.template_categories[category].keys())
+            number = self.template_categories.get(category, {}).pop(template_name, None)
+            self.template_store.delete(category, template_name)
+            if number is not None:
+                self.update_template_index(lambda index: index.remove(category, template_name, number))
             self.template_var.set('')
+            self.template_filter.refresh()
             messagebox.showinfo("Success", "Template deleted successfully!")
     
     def create_menu_bar(self):
@@ -331,30 +612,27 @@ class PhoneNumberTracker:
         # File menu
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
-        file_menu.add_command(label="Export Results", command=self.export_results)
+        file_menu.add_command(label="Scan Text for Numbers...", command=self.show_scan_panel)
+        file_menu.add_command(label="Export History...", command=self.export_results)
         file_menu.add_command(label="Clear History", command=self.clear_history)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
         
         # View menu
         view_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="View", menu=view_menu)
         view_menu.add_command(label="Toggle Theme", command=self.toggle_theme)
+        view_menu.add_command(label="Validation Latency", command=self.show_validation_latency)
+        view_menu.add_command(label="Startup Timing", command=self.show_startup_timing)
+        view_menu.add_command(label="Diagnostics", command=self.show_diagnostics)
+        view_menu.add_command(label="Analytics", command=self.show_analytics)
     
     def get_country_codes(self):
-        # Dictionary of common country codes
-        return {
-            "United States": "1",
-            "United Kingdom": "44",
-            "India": "91",
-            "China": "86",
-            "Japan": "81",
-            "Germany": "49",
-            "France": "33",
-            "Australia": "61",
-            "Canada": "1",
-            "Brazil": "55"
-        }
+        # Every region phonenumbers knows, common countries first. Named from
+        # the engine's prefix snapshot when it has one, which saves loading
+        # the geocoder.
+        engine = self.engine_future.result()
+        return country_codes(engine.language, engine.snapshot)
     
     def insert_country_code(self, event=None):
         selected = self.country_var.get()
@@ -363,161 +641,341 @@ class PhoneNumberTracker:
             self.phone_entry.delete(0, tk.END)
             self.phone_entry.insert(0, f"+{code}")
     
+    def on_phone_key(self, event=None):
+        self.validate_number_live(event)
+        self.phone_completion.on_key(event)
+    
     def validate_number_live(self, event=None):
-        number = self.phone_entry.get().strip()
-        if number:
-            try:
-                phone_number = phonenumbers.parse(number)
-                is_valid = phonenumbers.is_valid_number(phone_number)
-                is_possible = phonenumbers.is_possible_number(phone_number)
-                
-                if is_valid:
-                    self.validation_label.config(text="✓ Valid", foreground="green")
-                elif is_possible:
-                    self.validation_label.config(text="⚠ Possible", foreground="orange")
-                else:
-                    self.validation_label.config(text="✗ Invalid", foreground="red")
-            except NumberParseException:
-                self.validation_label.config(text="✗ Invalid Format", foreground="red")
+        # Debounced; the parse itself runs on the validator's worker thread
+        self.live_validator.on_key(event)
+    
+    def show_validation_status(self, status):
+        if status:
+            text, color = VALIDATION_DISPLAY[status]
+            self.validation_label.config(text=text, foreground=color)
         else:
             self.validation_label.config(text="")
     
-    def load_search_history(self):
-        try:
-            if os.path.exists('search_history.json'):
-                with open('search_history.json', 'r') as f:
-                    return json.load(f)
-            return []
-        except Exception:
-            return []
+    def show_validation_latency(self):
+        report = self.live_validator.report()
+        latency = report["keystroke_to_label"]
+        handler = report["ui_handler"]
+        messagebox.showinfo(
+            "Validation Latency",
+            f"Keystroke to label ({latency['count']} updates, includes "
+            f"{self.live_validator.debounce_ms} ms debounce):\n"
+            f"  p50 {latency['p50_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms\n\n"
+            f"UI thread per handler ({handler['count']} calls):\n"
+            f"  p50 {handler['p50_ms']:.2f} ms, p99 {handler['p99_ms']:.2f} ms, max {handler['max_ms']:.2f} ms\n"
+            f"  frame budget {FRAME_BUDGET_MS:.1f} ms\n\n"
+            f"Stale results dropped: {report['stale_results']}\n"
+            f"Memoized inputs reused: {report['memo_hits']}"
+        )
     
-    def save_search_history(self):
-        try:
-            with open('search_history.json', 'w') as f:
-                json.dump(self.search_history, f)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save search history: {str(e)}")
+    def show_startup_timing(self):
+        messagebox.showinfo("Startup Timing", self.timer.report())
+    
+    def show_diagnostics(self):
+        if self.diagnostics is not None:
+            self.diagnostics.lift()
+            return
+        self.diagnostics = DiagnosticsPanel(self.root, self.metrics, self.request_profile,
+                                            on_close=self.diagnostics_closed)
+    
+    def diagnostics_closed(self):
+        self.diagnostics = None
+    
+    def show_scan_panel(self):
+        if self.scan_panel is not None:
+            self.scan_panel.lift()
+            return
+        self.scan_panel = ScanPanel(self.root, self.dispatcher, self.engine_future.result, self.get_country_codes,
+                                    self.track_scanned_number, on_close=self.scan_panel_closed)
+    
+    def scan_panel_closed(self):
+        self.scan_panel = None
+    
+    def show_analytics(self):
+        if self.analytics_panel is not None:
+            self.analytics_panel.lift()
+            return
+        self.analytics_panel = AnalyticsPanel(self.root, self.dispatcher, self.analytics_future.result,
+                                              on_close=self.analytics_panel_closed)
+    
+    def analytics_panel_closed(self):
+        self.analytics_panel = None
+    
+    def track_scanned_number(self, number):
+        self.phone_entry.delete(0, tk.END)
+        self.phone_entry.insert(0, number)
+        self.track_number()
+    
+    def request_profile(self):
+        self.profile_next_lookup = True
+    
+    def show_profile(self, report):
+        self.show_diagnostics()
+        self.diagnostics.show_profile(report)
+    
+    def load_engine(self, prewarm):
+        # Lookup thread. The result cache keeps full lookup results across
+        # restarts. With a prefix snapshot (`new.py snapshot build`), the
+        # phonenumbers geocoder, carrier and time zone data is never loaded.
+        start = time.perf_counter()
+        result_cache = ResultCache(maxsize=10000, ttl=7 * 24 * 3600, path=data_path('lookup_cache.pickle'))
+        result_cache.load()
+        self.timer.add_duration("result cache", start)
+        start = time.perf_counter()
+        engine = LookupEngine(cache=result_cache, snapshot=open_snapshot())
+        engine.metrics = self.metrics
+        self.timer.add_duration("lookup metadata", start)
+        self.result_cache, self.engine = result_cache, engine
+        self.timer.mark("lookups ready")
+        if prewarm:
+            self.lookup_executor.submit(engine.prewarm)
+        return engine
+    
+    def load_search_history(self):
+        # Appended rows in SQLite, shared with other instances, so each
+        # search is committed as it is made; an existing search_history.json
+        # is imported once
+        return HistoryStore(data_path('search_history.db'), legacy_json='search_history.json')
     
     def update_history_display(self):
-        self.history_listbox.delete(0, tk.END)
-        for item in reversed(self.search_history[-10:]):  # Show last 10 searches
-            self.history_listbox.insert(0, f"{item['number']} - {item['timestamp']}")
+        self.history_view.refresh()
     
     def load_from_history(self, event=None):
-        selection = self.history_listbox.curselection()
-        if selection:
-            selected_item = self.history_listbox.get(selection[0])
-            number = selected_item.split(" - ")[0]
+        record = self.history_view.selected_record()
+        if record:
             self.phone_entry.delete(0, tk.END)
-            self.phone_entry.insert(0, number)
+            self.phone_entry.insert(0, record.number)
             self.track_number()
     
     def clear_history(self):
+        if self.search_history is None:
+            return
         if messagebox.askyesno("Clear History", "Are you sure you want to clear the search history?"):
-            self.search_history = []
-            self.save_search_history()
-            self.update_history_display()
+            self.search_history.clear()
+            self.history_view.reset()
+            if self.analytics_panel is not None:
+                self.analytics_panel.refresh()
+    
+    def on_close(self):
+        # A running export stops at its next chunk and deletes its file
+        self.closing = True
+        self.cancel_lookup()
+        self.lookup_executor.shutdown(wait=False, cancel_futures=True)
+        self.index_executor.shutdown(wait=False, cancel_futures=True)
+        self.export_executor.shutdown(wait=False, cancel_futures=True)
+        self.live_validator.shutdown()
+        self.history_view.shutdown()
+        if self.diagnostics is not None:
+            self.diagnostics.close()
+        if self.scan_panel is not None:
+            self.scan_panel.close()
+        if self.analytics_panel is not None:
+            self.analytics_panel.close()
+        self.dispatcher.stop()
+        try:
+            if self.analytics_future.done() and self.analytics_future.exception() is None:
+                self.analytics_future.result().close()
+            for resource in (self.search_history, self.template_store):
+                if resource is not None:
+                    resource.close()
+            if self.result_cache is not None:
+                self.result_cache.save()
+        except Exception:
+            pass
+        self.root.quit()
     
     def export_results(self):
-        if not any(label.cget("text") for label in self.result_labels.values()):
-            messagebox.showwarning("Export", "No results to export!")
+        # Exports the searches the history list shows (all of them, or those
+        # matching its filter), each looked up again, in the background
+        if self.search_history is None:
+            messagebox.showwarning("Export", "The search history is still loading.")
+            return
+        if self.export_future is not None:
+            messagebox.showwarning("Export", "An export is already running.")
+            return
+        ids = self.history_view.filter_ids
+        total = len(ids) if ids is not None else self.search_history.count()
+        if not total:
+            messagebox.showwarning("Export", "No searches to export!")
             return
             
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"), ("Parquet", "*.parquet"),
+                       ("Compressed", "*.csv.gz *.jsonl.gz *.csv.zst *.jsonl.zst"), ("All files", "*.*")]
         )
+        if not file_path:
+            return
         
-        if file_path:
-            try:
-                with open(file_path, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["Field", "Value"])
-                    for field in self.fields:
-                        writer.writerow([field, self.result_labels[field].cget("text")])
-                messagebox.showinfo("Export", "Results exported successfully!")
-            except Exception as e:
-                messagebox.showerror("Export Error", f"Failed to export results: {str(e)}")
+        # The export reads committed searches, oldest first; the filter's
+        # ids are newest first and may grow while it runs, hence the copy
+        self.search_history.flush()
+        if ids is not None:
+            ids = ids[::-1]
+        self.export_status_label.config(text=f"Exporting {total:,} searches...")
+        self.export_future = self.export_executor.submit(self.export_worker, file_path, ids, total)
+    
+    def export_worker(self, file_path, ids, total):
+        # Runs on the export executor; must not touch any widgets
+        from history_export import export_history, ExportCancelled
+        
+        last_update = 0.0
+        
+        def progress(rows):
+            nonlocal last_update
+            now = time.perf_counter()
+            if now - last_update >= 0.25:
+                last_update = now
+                self.dispatcher.post(self.show_export_progress, rows, total)
+        
+        try:
+            rows = export_history(self.search_history, file_path, ids, progress=progress,
+                                  cancelled=lambda: self.closing)
+        except ExportCancelled:
+            return
+        except Exception as e:
+            self.dispatcher.post(self.export_finished, file_path, None, e)
+            return
+        self.dispatcher.post(self.export_finished, file_path, rows, None)
+    
+    def show_export_progress(self, rows, total):
+        if self.export_future is not None:
+            self.export_status_label.config(text=f"Exporting... {rows:,} of {total:,} searches")
+    
+    def export_finished(self, file_path, rows, error):
+        self.export_future = None
+        if error is not None:
+            self.export_status_label.config(text="")
+            messagebox.showerror("Export Error", f"Failed to export the history: {str(error)}")
+            return
+        self.export_status_label.config(text=f"Exported {rows:,} searches to {os.path.basename(file_path)}")
+    
+    def toggle_lookup(self):
+        if self.lookup_future is not None:
+            self.cancel_lookup()
+        else:
+            self.track_number()
     
     def track_number(self):
         number = self.phone_entry.get().strip()
         if not number:
             messagebox.showerror("Error", "Please enter a phone number")
             return
-            
+        
+        # Clear previous results
+        for label in self.result_labels.values():
+            label.config(text="")
+        
+        # A new lookup supersedes any that is still running
+        if self.lookup_future is not None:
+            self.lookup_future.cancel()
+        self.lookup_generation += 1
+        self.set_lookup_in_progress(True)
+        self.lookup_started = time.perf_counter()
+        profile, self.profile_next_lookup = self.profile_next_lookup, False
+        self.lookup_future = self.lookup_executor.submit(
+            self.lookup_worker, self.lookup_generation, number, profile
+        )
+    
+    def lookup_worker(self, generation, number, profile=False):
+        # Runs on the lookup executor; must not touch any widgets. Every
+        # error is posted back, so the Track button is always reset.
         try:
-            # Clear previous results
-            for label in self.result_labels.values():
-                label.config(text="")
-            
-            # Parse the phone number
-            phone_number = phonenumbers.parse(number)
-            
-            if not phonenumbers.is_valid_number(phone_number):
-                messagebox.showerror("Error", "Invalid phone number! Please enter a valid number.")
-                return
-            
-            # Add to search history
-            self.search_history.append({
-                "number": number,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-            self.save_search_history()
-            self.update_history_display()
-            
-            # Update results
-            self.result_labels["Time Zone(s)"].config(text=str(timezone.time_zones_for_number(phone_number)))
-            self.result_labels["General Location"].config(text=geocoder.description_for_number(phone_number, "en"))
-            self.result_labels["Service Provider"].config(text=carrier.name_for_number(phone_number, "en"))
-            
-            # Phone number type
-            phone_type = number_type(phone_number)
-            type_mapping = {
-                PhoneNumberType.MOBILE: "Mobile",
-                PhoneNumberType.FIXED_LINE: "Fixed-line",
-                PhoneNumberType.FIXED_LINE_OR_MOBILE: "Fixed-line or Mobile",
-                PhoneNumberType.TOLL_FREE: "Toll-Free",
-                PhoneNumberType.PREMIUM_RATE: "Premium Rate",
-                PhoneNumberType.VOIP: "VoIP",
-                PhoneNumberType.PAGER: "Pager",
-                PhoneNumberType.UAN: "UAN (Universal Access Number)",
-                PhoneNumberType.UNKNOWN: "Unknown",
-            }
-            self.result_labels["Number Type"].config(text=type_mapping.get(phone_type, "Unknown"))
-            
-            # Network code
-            self.result_labels["Network Code"].config(text=str(carrier._is_mobile(phone_number)))
-            
-            # Format numbers
-            self.result_labels["International Format"].config(
-                text=phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
-            )
-            self.result_labels["National Format"].config(
-                text=phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.NATIONAL)
-            )
-            self.result_labels["E.164 Format"].config(
-                text=phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164)
-            )
-            
-            # Country information
-            self.result_labels["Country Code"].config(text=f"+{phone_number.country_code}")
-            self.result_labels["Country Name"].config(text=geocoder.country_name_for_number(phone_number, "en"))
-            
-            # Other information and all
-            self.result_labels["Possible Lengths"].config(
-                text=str(phonenumbers.length_of_geographical_area_code(phone_number))
-            )
-            self.result_labels["Is Possible Number"].config(
-                text="Yes" if phonenumbers.is_possible_number(phone_number) else "No"
-            )
-            self.result_labels["Is Valid Number"].config(
-                text="Yes" if phonenumbers.is_valid_number(phone_number) else "No"
-            )
-            
-        except NumberParseException:
+            engine = self.engine_future.result()
+            if profile:
+                result, error, report = profile_call(engine.lookup, number)
+                self.dispatcher.post(self.show_profile, report)
+            else:
+                result, error = engine.lookup(number), None
+        except Exception as e:
+            result, error = None, e
+        self.dispatcher.post(self.show_lookup_result, generation, number, result, error)
+    
+    def cancel_lookup(self, event=None):
+        if self.lookup_future is None:
+            return
+        self.lookup_future.cancel()
+        self.lookup_generation += 1
+        self.set_lookup_in_progress(False)
+    
+    def set_lookup_in_progress(self, busy):
+        if not busy:
+            self.lookup_future = None
+        self.track_btn.config(text="Cancel" if busy else "Track")
+        self.lookup_status_label.config(text="Looking up..." if busy else "")
+    
+    def show_lookup_result(self, generation, number, result, error):
+        # Results of cancelled or superseded lookups are dropped
+        if generation != self.lookup_generation:
+            return
+        self.set_lookup_in_progress(False)
+        
+        if isinstance(error, NumberParseException):
             messagebox.showerror("Error", "Invalid phone number format. Please try again.")
+            return
+        if error is not None:
+            messagebox.showerror("Error", f"Lookup failed: {str(error)}")
+            return
+        
+        if not result.is_valid:
+            messagebox.showerror("Error", "Invalid phone number! Please enter a valid number.")
+            return
+        
+        # Add to search history
+        start = time.perf_counter()
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Counted in the analytics totals as it is appended
+        facts = search_facts(result)
+        if self.search_history is None:
+            self.pending_history.append((number, result.e164, timestamp, facts))
+        else:
+            record_id = self.search_history.append(number, result.e164, timestamp, facts)
+            self.history_view.record_added(record_id, number)
+            if self.analytics_panel is not None:
+                self.analytics_panel.refresh()
+        start = self.metrics.lap("history", start)
+        
+        # Update results
+        for field, text in zip(self.fields, display_values(result)):
+            self.result_labels[field].config(text=text)
+        self.metrics.lap("widgets", start)
+        self.metrics.lap("total", self.lookup_started)
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Phone Number Location Tracker")
+    parser.add_argument("--no-prewarm", action="store_true",
+                        help="don't load the lookup data in the background at startup")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long each part of startup took to stderr")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    # The top-level options take no values, so the first other argument
+    # is the command
+    argv = sys.argv[1:] if argv is None else argv
+    command = next((arg for arg in argv if not arg.startswith("-")), None)
+    module = None
+    for name, (module_name, help_text) in COMMANDS.items():
+        command_parser = subparsers.add_parser(name, help=help_text)
+        if name == command:
+            module = importlib.import_module(module_name)
+            module.add_arguments(command_parser)
+    
+    args = parser.parse_args(argv)
+    if module is not None:
+        return module.run(args)
+    
+    timer = StartupTimer(STARTED, STARTUP_MILESTONES)
+    timer.mark("imports")
+    if args.startup_report:
+        timer.when_complete(StartupTimer.print_report)
     root = tk.Tk()
-    app = PhoneNumberTracker(root)
+    app = PhoneNumberTracker(root, prewarm=not args.no_prewarm, timer=timer)
     root.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import heapq
+import re
+import unicodedata
+from itertools import count
+
+
+class _Node:
+    __slots__ = ("children", "entries", "top")
+
+    def __init__(self):
+        # None while the node is still a bucket
+        self.children = None
+        # (key, value) -> entry, for keys ending here or, in a bucket, for
+        # every key below it
+        self.entries = {}
+        # Best-ranked entries in this subtree, or None when it needs rebuilding
+        self.top = []
+
+
+class PrefixTrie:
+    # Ranked prefix completion. Every node caches the best `capacity`
+    # entries of its subtree, so a completion is a walk down the prefix
+    # followed by a slice, however many keys share that prefix. Lower ranks
+    # come first; equal ranks are ordered by key.
+    #
+    # Keys sit in a bucket node until it holds more than `bucket_size` of
+    # them, and only then does it grow children (a burst trie). This keeps
+    # the node count, and memory, proportional to the number of entries
+    # rather than to their total length.
+    def __init__(self, capacity=32, bucket_size=64):
+        self.capacity = capacity
+        self.bucket_size = bucket_size
+        self._root = _Node()
+        self._serial = count()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def normalize(key):
+        # Case and accent insensitive, so "cote" finds "Côte d'Ivoire"
+        key = key.casefold()
+        if key.isascii():
+            return key
+        return "".join(char for char in unicodedata.normalize("NFKD", key) if not unicodedata.combining(char))
+
+    def _path(self, key, create=False):
+        # Nodes from the root to the one that holds `key`
+        node = self._root
+        path = [node]
+        depth = 0
+        while depth < len(key) and node.children is not None:
+            child = node.children.get(key[depth])
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[key[depth]] = _Node()
+            node = child
+            path.append(node)
+            depth += 1
+        return path
+
+    def insert(self, key, value, rank=0):
+        self._insert(self.normalize(key), value, rank, keep_tops=True)
+
+    def insert_many(self, items):
+        # Bulk load of (key, value, rank); cached tops are rebuilt once at
+        # the end instead of being kept sorted after every insert
+        for key, value, rank in items:
+            self._insert(self.normalize(key), value, rank, keep_tops=False)
+        self._top(self._root)
+
+    def _insert(self, key, value, rank, keep_tops):
+        path = self._path(key, create=True)
+        node = path[-1]
+        if (key, value) in node.entries:
+            self.remove(key, value)
+            path = self._path(key, create=True)
+            node = path[-1]
+        entry = (rank, key, next(self._serial), value)
+        node.entries[(key, value)] = entry
+        self._size += 1
+        if node.children is None and len(node.entries) > self.bucket_size:
+            self._burst(node, len(path) - 1, keep_tops)
+        if not keep_tops:
+            for path_node in path:
+                path_node.top = None
+            return
+        capacity = self.capacity
+        for path_node in path:
+            top = path_node.top
+            if top is None:
+                continue
+            if len(top) < capacity or entry < top[-1]:
+                # Small sorted list; insertion keeps it ordered
+                index = len(top)
+                while index and entry < top[index - 1]:
+                    index -= 1
+                top.insert(index, entry)
+                if len(top) > capacity:
+                    top.pop()
+
+    def _burst(self, node, depth, keep_tops=True):
+        # Moves the keys longer than this node's depth down into children
+        node.children = {}
+        remaining = {}
+        for item, entry in node.entries.items():
+            key = item[0]
+            if len(key) == depth:
+                remaining[item] = entry
+                continue
+            child = node.children.get(key[depth])
+            if child is None:
+                child = node.children[key[depth]] = _Node()
+                child.top = None
+            child.entries[item] = entry
+        node.entries = remaining
+        for child in node.children.values():
+            if len(child.entries) > self.bucket_size:
+                self._burst(child, depth + 1, keep_tops)
+            if keep_tops:
+                self._top(child)
+
+    def remove(self, key, value):
+        key = self.normalize(key)
+        path = self._path(key)
+        if path is None or (key, value) not in path[-1].entries:
+            return False
+        del path[-1].entries[(key, value)]
+        self._size -= 1
+        # Cached tops along the path are rebuilt on the next completion
+        for path_node in path:
+            path_node.top = None
+        return True
+
+    def _top(self, node):
+        if node.top is None:
+            candidates = list(node.entries.values())
+            if node.children:
+                for child in node.children.values():
+                    candidates.extend(self._top(child))
+            node.top = heapq.nsmallest(self.capacity, candidates)
+        return node.top
+
+    def complete(self, prefix, limit=10):
+        # Values of the best-ranked keys starting with `prefix`; a value
+        # indexed under several matching keys is returned once
+        prefix = self.normalize(prefix)
+        path = self._path(prefix)
+        if path is None:
+            return []
+        node = path[-1]
+        if len(path) - 1 == len(prefix):
+            entries = self._top(node)
+        else:
+            # Stopped early in a bucket; it is small, so filter it directly
+            entries = sorted(entry for entry in node.entries.values() if entry[1].startswith(prefix))
+        results = []
+        seen = set()
+        for entry in entries:
+            value = entry[3]
+            if value not in seen:
+                seen.add(value)
+                results.append(value)
+                if len(results) == limit:
+                    break
+        return results
+
+
+def number_key(text):
+    # "+<digits>" for anything typed like a phone number, else None
+    text = text.strip()
+    if not text or not (text[0] == "+" or text[0].isdigit()):
+        return None
+    return "+" + "".join(char for char in text if char.isdigit())
+
+
+_WORD_BREAKS = re.compile(r"[\s()'.,&-]+")
+
+# Separates the category from the template name in category-scoped keys
+_SCOPE = "\x1f"
+
+
+class TemplateIndex:
+    # Every template is indexed under its name, under its name within its
+    # category and under its number, so completions work from the phone
+    # entry as well as from the template combobox. Values are
+    # (category, name) pairs.
+    def __init__(self, categories=None):
+        self._trie = PrefixTrie()
+        if categories:
+            self._trie.insert_many(
+                item for category, templates in categories.items()
+                for name, number in templates.items() for item in self._items(category, name, number)
+            )
+
+    def __len__(self):
+        return len(self._trie)
+
+    @staticmethod
+    def _items(category, name, number):
+        value = (category, name)
+        items = [(category + _SCOPE + name, value, 0), (name, value, 1)]
+        key = number_key(number)
+        if key:
+            items.append((key, value, 2))
+        return items
+
+    def add(self, category, name, number):
+        for key, value, rank in self._items(category, name, number):
+            self._trie.insert(key, value, rank)
+
+    def remove(self, category, name, number):
+        for key, value, rank in self._items(category, name, number):
+            self._trie.remove(key, value)
+
+    def complete(self, text, limit=10):
+        # Templates whose name or number starts with `text`
+        key = number_key(text)
+        return self._trie.complete(key if key else text, limit)
+
+    def names_in(self, category, text="", limit=50):
+        return [name for _, name in self._trie.complete(category + _SCOPE + text, limit)]
+
+
+class CountryIndex:
+    # Completion over "<name> (+<code>)" labels by country name, any word of
+    # it, region code or calling code. entries: (name, region, code, rank).
+    def __init__(self, entries):
+        self.labels = {}
+        items = []
+        for name, region, code, rank in entries:
+            label = f"{name} (+{code})"
+            self.labels[label] = code
+            items.append((name, label, rank))
+            for word in _WORD_BREAKS.split(name)[1:]:
+                if not word:
+                    continue
+                items.append((word, label, rank + 2))
+            if region:
+                items.append((region, label, rank + 2))
+            items.append(("+" + str(code), label, rank + 4))
+        self._trie = PrefixTrie()
+        self._trie.insert_many(items)
+
+    def complete(self, text, limit=10):
+        text = text.strip()
+        if text.isdigit():
+            text = "+" + text
+        return self._trie.complete(text, limit)
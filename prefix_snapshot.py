@@ -0,0 +1,393 @@
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_right
+
+import phonenumbers
+from phonenumbers import PhoneNumberType
+from phonenumbers.phonenumberutil import (
+    SUPPORTED_REGIONS, COUNTRY_CODES_FOR_NON_GEO_REGIONS, COUNTRY_CODE_TO_REGION_CODE, _MOBILE_TOKEN_MAPPINGS
+)
+
+from shared_storage import atomic_file, data_dir
+
+# A snapshot compiles phonenumbers' geocoder, carrier and time zone prefix
+# tables for one language into a single sorted index, so one binary search
+# answers all three. The library's modules cost ~100 MB and about half a
+# second to import; a snapshot is memory-mapped instead, so opening it is
+# instant and every process using it shares the same pages.
+#
+# Layout: SNAPSHOT_MAGIC, a "<Q" header length, a JSON header, then the
+# buffers it lists, each starting on an 8-byte boundary. Keys are the first
+# `width` digits of a number after the "+", read as a base 11 number with
+# digit d as d + 1 and 0 as padding, so every prefix covers one range of
+# keys and a number's longest matching prefix is the range its key is in.
+# `bounds` holds where each range starts; the other columns hold the
+# location, carrier and time zones string for it, or -1 for none. Time
+# zones are joined with "&", which no zone name contains.
+SNAPSHOT_MAGIC = b"LKPS\x01"
+SNAPSHOT_FORMAT = 1
+_HEADER_LENGTH = struct.Struct("<Q")
+
+_BUFFERS = (("bounds", "q"), ("locations", "i"), ("carriers", "i"), ("time_zones", "i"),
+            ("offsets", "I"), ("strings", "B"))
+
+_ENCODE = str.maketrans("0123456789", "123456789a")
+
+# What phonenumbers gives where no prefix has time zones
+UNKNOWN_TIME_ZONES = ("Etc/Unknown",)
+
+
+def snapshot_path(language="en", directory=None):
+    # Named for the phonenumbers release it was built from, so an upgrade
+    # never picks up data from the old one. Kept in the data directory
+    # unless `directory` is given.
+    return os.path.join(directory or data_dir(), f"prefix_snapshot-{phonenumbers.__version__}-{language}.bin")
+
+
+def _key(digits, width):
+    digits = digits[:width].translate(_ENCODE)
+    return int(digits + "0" * (width - len(digits)), 11)
+
+
+def _following(prefix):
+    # The first digit string after every number starting with prefix, or
+    # None when nothing follows
+    prefix = prefix.rstrip("9")
+    if not prefix:
+        return None
+    return prefix[:-1] + str(int(prefix[-1]) + 1)
+
+
+def _longest(table, digits):
+    for length in range(len(digits), 0, -1):
+        value = table.get(digits[:length])
+        if value is not None:
+            return value
+    return None
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def _resolve(data, language, region=None):
+    # Each prefix's name in `language`, as phonenumbers picks it. Prefixes
+    # with no name in it are dropped, so a shorter prefix answers instead.
+    from phonenumbers.prefix import _find_lang
+
+    resolved = {}
+    for prefix, names in data.items():
+        name = _find_lang(names, language, None, region)
+        if name is not None:
+            resolved[prefix] = name
+    return resolved
+
+
+def _check_mobile_token_names(data, language):
+    # Numbers dialled with a mobile token (Argentina's 9) are geocoded with
+    # their region passed along, which only matters for names kept per
+    # region; a snapshot assumes there are none
+    from phonenumbers.prefix import _find_lang
+
+    for country_code in _MOBILE_TOKEN_MAPPINGS:
+        region = phonenumbers.region_code_for_country_code(country_code)
+        for prefix, names in data.items():
+            if (prefix.startswith(str(country_code)) and
+                    _find_lang(names, language, None, region) != _find_lang(names, language, None, None)):
+                raise ValueError(f"{prefix} has a {language}_{region} name; a snapshot can't hold it")
+
+
+def compile_tables(language="en"):
+    # (header, buffers) for a snapshot of the installed phonenumbers
+    from phonenumbers import geocoder, timezone
+    from phonenumbers.geodata import GEOCODE_DATA, GEOCODE_LONGEST_PREFIX
+    from phonenumbers.geodata.locale import LOCALE_DATA
+    from phonenumbers.carrierdata import CARRIER_DATA, CARRIER_LONGEST_PREFIX
+    from phonenumbers.tzdata import TIMEZONE_DATA, TIMEZONE_LONGEST_PREFIX
+
+    width = max(GEOCODE_LONGEST_PREFIX, CARRIER_LONGEST_PREFIX, TIMEZONE_LONGEST_PREFIX)
+    if 11 ** width >= 1 << 63:
+        raise ValueError(f"prefixes of {width} digits don't fit a snapshot key")
+    _check_mobile_token_names(GEOCODE_DATA, language)
+    tables = (_resolve(GEOCODE_DATA, language), _resolve(CARRIER_DATA, language),
+              {prefix: "&".join(zones) for prefix, zones in TIMEZONE_DATA.items()})
+
+    # Every range starts where some prefix starts or where the numbers after
+    # one do; between two such points each prefix covers all keys or none,
+    # so the point's own digits give the range's longest matches
+    starts = {0: ""}
+    for table in tables:
+        for prefix in table:
+            starts[_key(prefix, width)] = prefix
+            following = _following(prefix)
+            if following is not None:
+                starts[_key(following, width)] = following
+
+    strings = {}
+    bounds = array("q")
+    columns = (array("i"), array("i"), array("i"))
+    previous = None
+    for key in sorted(starts):
+        values = tuple(_longest(table, starts[key]) for table in tables)
+        if values == previous:
+            continue
+        previous = values
+        bounds.append(key)
+        for column, value in zip(columns, values):
+            column.append(-1 if value is None else strings.setdefault(value, len(strings)))
+
+    offsets = array("I", [0])
+    data = bytearray()
+    for text in strings:
+        data += text.encode("utf-8")
+        offsets.append(len(data))
+
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "phonenumbers_version": phonenumbers.__version__,
+        "language": language,
+        "width": width,
+        # As geocoder.country_name_for_number and the time zone lookups for
+        # non-geographical numbers give them
+        "region_names": {region: geocoder._region_display_name(region, language) for region in LOCALE_DATA},
+        "country_time_zones": {
+            str(country_code): "&".join(timezone._country_level_time_zones_for_number(
+                phonenumbers.PhoneNumber(country_code=country_code)))
+            for country_code in COUNTRY_CODE_TO_REGION_CODE
+        },
+    }
+    return header, (bounds, columns[0], columns[1], columns[2], offsets, bytes(data))
+
+
+def write_snapshot(path, header, buffers):
+    # Written atomically, so a reader never maps a half-written snapshot
+    header = dict(header, sizes=[len(buffer) * getattr(buffer, "itemsize", 1) for buffer in buffers])
+    encoded = json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    with atomic_file(path) as f:
+        f.write(SNAPSHOT_MAGIC + _HEADER_LENGTH.pack(len(encoded)) + encoded)
+        for buffer in buffers:
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            f.write(buffer if isinstance(buffer, bytes) else buffer.tobytes())
+
+
+def build_snapshot(path=None, language="en"):
+    path = path or snapshot_path(language)
+    header, buffers = compile_tables(language)
+    write_snapshot(path, header, buffers)
+    return path
+
+
+class PrefixSnapshot:
+    # A memory-mapped snapshot. probe(digits) takes the digits of a number
+    # after the "+" and gives (location, carrier, time zones) as the
+    # library's prefix lookups would: "" where there is no name, and
+    # UNKNOWN_TIME_ZONES where no prefix has time zones. Raises ValueError
+    # for a file that isn't a snapshot of the installed phonenumbers.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._views = self._open()
+        except BaseException:
+            self._map.close()
+            raise
+        self._bounds, self._locations, self._carriers, self._time_zones, self._offsets, self._strings = self._views
+
+    def _open(self):
+        data = self._map
+        start = len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or len(data) < start:
+            raise ValueError(f"{self.path} is not a prefix snapshot")
+        (length,) = _HEADER_LENGTH.unpack_from(data, len(SNAPSHOT_MAGIC))
+        header = json.loads(data[start:start + length].decode("utf-8"))
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{self.path} has snapshot format {header.get('format')}, not {SNAPSHOT_FORMAT}")
+        if header["phonenumbers_version"] != phonenumbers.__version__:
+            raise ValueError(f"{self.path} was built from phonenumbers {header['phonenumbers_version']}, "
+                             f"not {phonenumbers.__version__}")
+        self.language = header["language"]
+        self.width = header["width"]
+        self.region_names = header["region_names"]
+        self._country_time_zones = {int(code): tuple(zones.split("&"))
+                                    for code, zones in header["country_time_zones"].items()}
+        views = []
+        offset = start + length
+        whole = memoryview(data)
+        for (_, typecode), size in zip(_BUFFERS, header["sizes"]):
+            offset = _align(offset)
+            if offset + size > len(data):
+                raise ValueError(f"{self.path} is truncated")
+            views.append(whole[offset:offset + size].cast(typecode))
+            offset += size
+        whole.release()
+        return views
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def _string(self, index):
+        if index < 0:
+            return None
+        return bytes(self._strings[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    def probe(self, digits):
+        index = bisect_right(self._bounds, _key(digits, self.width)) - 1
+        location = self._string(self._locations[index])
+        carrier = self._string(self._carriers[index])
+        time_zones = self._string(self._time_zones[index])
+        return (location or "", carrier or "",
+                UNKNOWN_TIME_ZONES if time_zones is None else tuple(time_zones.split("&")))
+
+    def region_name(self, region):
+        return self.region_names.get(region, "")
+
+    def country_time_zones(self, country_code):
+        return self._country_time_zones.get(country_code, UNKNOWN_TIME_ZONES)
+
+    def close(self):
+        # Views into the map have to go before it can be unmapped
+        for view in self._views:
+            view.release()
+        self._views = ()
+        self._map.close()
+
+
+def open_snapshot(language="en", directory=None):
+    # The snapshot for language and the installed phonenumbers, or None if
+    # there isn't a usable one (callers then use the library's own tables)
+    path = snapshot_path(language, directory)
+    if not os.path.exists(path):
+        return None
+    try:
+        return PrefixSnapshot(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _reference(data, longest, digits, language):
+    # phonenumbers' prefix lookup (prefix._prefix_description_for_number)
+    # on bare digits
+    from phonenumbers.prefix import _find_lang
+
+    for length in range(longest, 0, -1):
+        names = data.get(digits[:length])
+        if names is not None:
+            name = _find_lang(names, language, None, None)
+            if name is not None:
+                return name
+    return ""
+
+
+def check_tables(snapshot):
+    # Digit strings where probe() differs from the library's tables. Every
+    # prefix in them is tried, with and without a digit more, and so is
+    # every number starting just after one: those are all the places where
+    # the longest match can change.
+    from phonenumbers.geodata import GEOCODE_DATA, GEOCODE_LONGEST_PREFIX
+    from phonenumbers.carrierdata import CARRIER_DATA, CARRIER_LONGEST_PREFIX
+    from phonenumbers.tzdata import TIMEZONE_DATA, TIMEZONE_LONGEST_PREFIX
+
+    language = snapshot.language
+    prefixes = set(GEOCODE_DATA) | set(CARRIER_DATA) | set(TIMEZONE_DATA)
+    samples = set()
+    for prefix in prefixes:
+        samples.update((prefix, prefix + "0", prefix + "9", prefix + "5" * snapshot.width))
+        following = _following(prefix)
+        if following is not None:
+            samples.add(following)
+    mismatches = []
+    for digits in sorted(samples):
+        expected = (_reference(GEOCODE_DATA, GEOCODE_LONGEST_PREFIX, digits, language),
+                    _reference(CARRIER_DATA, CARRIER_LONGEST_PREFIX, digits, language),
+                    _longest(TIMEZONE_DATA, digits[:TIMEZONE_LONGEST_PREFIX]) or UNKNOWN_TIME_ZONES)
+        if snapshot.probe(digits) != expected:
+            mismatches.append(digits)
+    return mismatches
+
+
+def sample_numbers(variants=20, seed=1234):
+    # Every region's example number of every type, each with `variants`
+    # random endings as well
+    rng = random.Random(seed)
+    numbers = []
+    examples = [phonenumbers.example_number_for_type(region, ntype)
+                for region in sorted(SUPPORTED_REGIONS) for ntype in PhoneNumberType.values()]
+    examples += [phonenumbers.example_number_for_non_geo_entity(code)
+                 for code in sorted(COUNTRY_CODES_FOR_NON_GEO_REGIONS)]
+    for example in examples:
+        if example is None:
+            continue
+        e164 = phonenumbers.format_number(example, phonenumbers.PhoneNumberFormat.E164)
+        numbers.append(e164)
+        for _ in range(variants):
+            keep = rng.randint(max(2, len(e164) - 5), len(e164) - 1)
+            numbers.append(e164[:keep] + "".join(rng.choice("0123456789") for _ in range(len(e164) - keep)))
+    return numbers
+
+
+def check_engine(snapshot, numbers):
+    # Numbers whose full lookup differs with and without the snapshot
+    from lookup_engine import LookupEngine
+
+    plain = LookupEngine(snapshot.language).lookup_many(numbers)
+    fast = LookupEngine(snapshot.language, snapshot=snapshot).lookup_many(numbers)
+    return [number for number, expected, found in zip(numbers, plain, fast) if expected != found]
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=["build", "check"],
+                        help="build the snapshot for the installed phonenumbers, or check an existing one")
+    parser.add_argument("--language", default="en", help="language of location and carrier names (default: en)")
+    parser.add_argument("--path", help="snapshot file (default: prefix_snapshot-VERSION-LANGUAGE.bin in the data "
+                                       "directory)")
+    parser.add_argument("--variants", type=int, default=20,
+                        help="random numbers per example number in the lookup check (default: 20)")
+
+
+def run(args):
+    path = args.path or snapshot_path(args.language)
+    if args.action == "build":
+        # Built and checked under a temporary name; only a snapshot that
+        # matches the library replaces the one in place
+        start = time.perf_counter()
+        header, buffers = compile_tables(args.language)
+        temp_path = path + ".new"
+        write_snapshot(temp_path, header, buffers)
+        print(f"built {len(buffers[0]):,} ranges, {len(buffers[4]) - 1:,} names, {os.path.getsize(temp_path) / 1e6:.1f} MB "
+              f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    else:
+        temp_path = None
+    try:
+        snapshot = PrefixSnapshot(temp_path or path)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    try:
+        start = time.perf_counter()
+        mismatches = check_tables(snapshot)
+        numbers = sample_numbers(args.variants)
+        differing = check_engine(snapshot, numbers)
+        print(f"checked every prefix and {len(numbers):,} lookups in {time.perf_counter() - start:.1f}s: "
+              f"{len(mismatches):,} prefixes and {len(differing):,} lookups differ from phonenumbers",
+              file=sys.stderr)
+        for digits in mismatches[:10]:
+            print(f"  +{digits}: {snapshot.probe(digits)}", file=sys.stderr)
+        for number in differing[:10]:
+            print(f"  lookup {number}", file=sys.stderr)
+    finally:
+        snapshot.close()
+    if mismatches or differing:
+        if temp_path:
+            os.remove(temp_path)
+        return 1
+    if temp_path:
+        os.replace(temp_path, path)
+        print(f"wrote {path}", file=sys.stderr)
+    return 0
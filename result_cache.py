@@ -0,0 +1,132 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import phonenumbers
+
+from shared_storage import atomic_file
+
+# Punctuation dropped from a "+..." number to make its cache key. The key
+# is only a normalized form of the text, not E.164: "+44 (0)20..." keeps its
+# trunk 0. Entries are found under either that or the parsed number's E.164
+# form, so use it as an opaque key and nothing else.
+_PUNCTUATION = frozenset(" -.()/")
+_DIGITS = frozenset("0123456789")
+
+# Bumped whenever the pickled result layout changes
+CACHE_FORMAT = 2
+
+
+def cache_key(number):
+    # Cheap key for "+<digits>" inputs, without parsing them; None means the
+    # caller has to parse the number and use its E.164 format instead
+    number = number.strip()
+    if not number.startswith("+"):
+        return None
+    digits = []
+    for char in number[1:]:
+        if char in _DIGITS:
+            digits.append(char)
+        elif char not in _PUNCTUATION:
+            return None
+    return "+" + "".join(digits)
+
+
+class ResultCache:
+    def __init__(self, maxsize=10000, ttl=None, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        # Lookups from GUI worker threads share one cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.ttl is not None and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result, stored_at=None):
+        with self._lock:
+            entries = self._entries
+            if key in entries:
+                entries.move_to_end(key)
+            entries[key] = (result, time.time() if stored_at is None else stored_at)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        # Entries go out least recently used first, so loading them back in
+        # order restores the same recency. Written atomically, so a crash or
+        # another instance loading it never sees a half-written cache; when
+        # two instances save, the last one wins.
+        with self._lock:
+            entries = [(key, result, stored_at) for key, (result, stored_at) in self._entries.items()]
+        data = {"format": CACHE_FORMAT, "phonenumbers_version": phonenumbers.__version__, "entries": entries}
+        with atomic_file(path) as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path=None):
+        # Returns the number of entries restored. Caches written against a
+        # different phonenumbers release are ignored, since their carrier and
+        # location data may be out of date, as are older cache formats.
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            return 0
+        if data.get("format") != CACHE_FORMAT or data.get("phonenumbers_version") != phonenumbers.__version__:
+            return 0
+        now = time.time()
+        restored = 0
+        for key, result, stored_at in data.get("entries", []):
+            if self.ttl is not None and now - stored_at > self.ttl:
+                continue
+            self.put(key, result, stored_at)
+            restored += 1
+        return restored
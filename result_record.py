@@ -0,0 +1,309 @@
+import json
+import struct
+from array import array
+
+from phonenumbers import PhoneNumberType
+
+# Type names written to CSV and JSON, e.g. "FIXED_LINE"
+_TYPE_NAMES = {value: name for name, value in vars(PhoneNumberType).items() if name.isupper()}
+
+# Fixed part of a packed record: country code, number type, flags
+# (mobile, possible, valid) and area code length
+_FIXED = struct.Struct("<HbBB")
+_LENGTH = struct.Struct("<H")
+
+_MOBILE, _POSSIBLE, _VALID = 1, 2, 4
+
+
+def _flags(is_mobile, is_possible, is_valid):
+    return (_MOBILE if is_mobile else 0) | (_POSSIBLE if is_possible else 0) | (_VALID if is_valid else 0)
+
+
+class LookupResult:
+    # One lookup, with every field as its real value: time_zones is a tuple,
+    # number_type a PhoneNumberType value, the flags are bools and the
+    # country code and area code length are ints
+    __slots__ = (
+        "number", "time_zones", "location", "carrier", "number_type", "is_mobile",
+        "international", "national", "e164", "country_code", "country_name",
+        "area_code_length", "is_possible", "is_valid",
+    )
+    _fields = __slots__
+
+    def __init__(self, number, time_zones, location, carrier, number_type, is_mobile, international, national,
+                 e164, country_code, country_name, area_code_length, is_possible, is_valid):
+        self.number = number
+        self.time_zones = time_zones
+        self.location = location
+        self.carrier = carrier
+        self.number_type = number_type
+        self.is_mobile = is_mobile
+        self.international = international
+        self.national = national
+        self.e164 = e164
+        self.country_code = country_code
+        self.country_name = country_name
+        self.area_code_length = area_code_length
+        self.is_possible = is_possible
+        self.is_valid = is_valid
+
+    def __iter__(self):
+        for name in self._fields:
+            yield getattr(self, name)
+
+    def __eq__(self, other):
+        if not isinstance(other, LookupResult):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return "LookupResult(" + ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields) + ")"
+
+    def __reduce__(self):
+        return LookupResult, tuple(self)
+
+    def replace(self, **changes):
+        values = [changes.pop(name, getattr(self, name)) for name in self._fields]
+        if changes:
+            raise TypeError(f"unknown fields: {', '.join(changes)}")
+        return LookupResult(*values)
+
+    def csv_row(self):
+        # Values for CSV_HEADER; time zones are joined with "|"
+        return [
+            self.number, "|".join(self.time_zones), self.location, self.carrier,
+            _TYPE_NAMES.get(self.number_type, "UNKNOWN"), int(self.is_mobile), self.international,
+            self.national, self.e164, self.country_code, self.country_name, self.area_code_length,
+            int(self.is_possible), int(self.is_valid),
+        ]
+
+    def json(self):
+        # One JSON object, written field by field
+        dumps = json.dumps
+        return (
+            f'{{"number": {dumps(self.number)}, "time_zones": {dumps(list(self.time_zones))}, '
+            f'"location": {dumps(self.location)}, "carrier": {dumps(self.carrier)}, '
+            f'"number_type": "{_TYPE_NAMES.get(self.number_type, "UNKNOWN")}", '
+            f'"is_mobile": {"true" if self.is_mobile else "false"}, '
+            f'"international": {dumps(self.international)}, "national": {dumps(self.national)}, '
+            f'"e164": {dumps(self.e164)}, "country_code": {self.country_code}, '
+            f'"country_name": {dumps(self.country_name)}, "area_code_length": {self.area_code_length}, '
+            f'"is_possible": {"true" if self.is_possible else "false"}, '
+            f'"is_valid": {"true" if self.is_valid else "false"}}}'
+        )
+
+    def pack(self):
+        # Fixed fields, then each string (time zones joined with "|") as a
+        # length-prefixed UTF-8 run
+        parts = [_FIXED.pack(self.country_code, self.number_type,
+                             _flags(self.is_mobile, self.is_possible, self.is_valid), self.area_code_length)]
+        for text in (self.number, "|".join(self.time_zones), self.location, self.carrier, self.international,
+                     self.national, self.e164, self.country_name):
+            data = text.encode("utf-8")
+            parts.append(_LENGTH.pack(len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, buffer, offset=0):
+        # Returns (result, offset just past it)
+        country_code, number_type, flags, area_code_length = _FIXED.unpack_from(buffer, offset)
+        offset += _FIXED.size
+        texts = []
+        for _ in range(8):
+            (length,) = _LENGTH.unpack_from(buffer, offset)
+            offset += _LENGTH.size
+            texts.append(bytes(buffer[offset:offset + length]).decode("utf-8"))
+            offset += length
+        number, time_zones, location, carrier_name, international, national, e164, country_name = texts
+        result = cls(number, tuple(time_zones.split("|")) if time_zones else (), location, carrier_name,
+                     number_type, bool(flags & _MOBILE), international, national, e164, country_code,
+                     country_name, area_code_length, bool(flags & _POSSIBLE), bool(flags & _VALID))
+        return result, offset
+
+
+CSV_HEADER = list(LookupResult._fields)
+
+
+class _StringColumn:
+    # Strings as one UTF-8 buffer plus end offsets, as Arrow lays them out
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array("Q")
+
+    def append(self, text):
+        self.data += text.encode("utf-8")
+        self.ends.append(len(self.data))
+
+    def __getitem__(self, index):
+        start = self.ends[index - 1] if index else 0
+        return self.data[start:self.ends[index]].decode("utf-8")
+
+    def nbytes(self):
+        return len(self.data) + self.ends.itemsize * len(self.ends)
+
+
+class _DictionaryColumn:
+    # Repetitive values (location, carrier, ...) stored once, with a code per row
+    def __init__(self):
+        self.values = []
+        self.index = {}
+        self.codes = array("I")
+
+    def append(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, index):
+        return self.values[self.codes[index]]
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes)
+
+
+_TABLE_MAGIC = b"LKRT\x01"
+_HEADER_LENGTH = struct.Struct("<Q")
+
+
+class ResultTable:
+    # Many results held column by column in arrays, for keeping millions of
+    # lookups in memory. Rows are only turned back into LookupResult objects
+    # when read. E.164 numbers are kept as integers.
+    _ARRAYS = ("e164", "country_code", "number_type", "flags", "area_code_length")
+    _STRINGS = ("number", "international", "national")
+    _DICTIONARIES = ("time_zones", "location", "carrier", "country_name")
+
+    def __init__(self, results=()):
+        self.e164 = array("q")
+        self.country_code = array("H")
+        self.number_type = array("b")
+        self.flags = array("B")
+        self.area_code_length = array("B")
+        self.number = _StringColumn()
+        self.international = _StringColumn()
+        self.national = _StringColumn()
+        self.time_zones = _DictionaryColumn()
+        self.location = _DictionaryColumn()
+        self.carrier = _DictionaryColumn()
+        self.country_name = _DictionaryColumn()
+        # E.164 numbers too long for an int64, by row
+        self.long_e164 = {}
+        self.extend(results)
+
+    def __len__(self):
+        return len(self.e164)
+
+    def append(self, result):
+        digits = result.e164[1:]
+        if len(digits) < 19 and digits.isdigit():
+            self.e164.append(int(digits))
+        else:
+            self.long_e164[len(self.e164)] = result.e164
+            self.e164.append(-1)
+        self.country_code.append(result.country_code)
+        self.number_type.append(result.number_type)
+        self.flags.append(_flags(result.is_mobile, result.is_possible, result.is_valid))
+        self.area_code_length.append(result.area_code_length)
+        self.number.append(result.number)
+        self.international.append(result.international)
+        self.national.append(result.national)
+        self.time_zones.append(result.time_zones)
+        self.location.append(result.location)
+        self.carrier.append(result.carrier)
+        self.country_name.append(result.country_name)
+
+    def extend(self, results):
+        for result in results:
+            if result is not None:
+                self.append(result)
+
+    def e164_at(self, index):
+        value = self.e164[index]
+        return self.long_e164[index] if value < 0 else f"+{value}"
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("result index out of range")
+        flags = self.flags[index]
+        return LookupResult(
+            self.number[index], self.time_zones[index], self.location[index], self.carrier[index],
+            self.number_type[index], bool(flags & _MOBILE), self.international[index], self.national[index],
+            self.e164_at(index), self.country_code[index], self.country_name[index],
+            self.area_code_length[index], bool(flags & _POSSIBLE), bool(flags & _VALID),
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def nbytes(self):
+        # Bytes held by the columns, excluding the dictionaries' distinct values
+        return (sum(getattr(self, name).itemsize * len(getattr(self, name)) for name in self._ARRAYS)
+                + sum(getattr(self, name).nbytes() for name in self._STRINGS + self._DICTIONARIES))
+
+    def write_csv(self, writer):
+        # writer: a csv.writer
+        writer.writerow(CSV_HEADER)
+        for result in self:
+            writer.writerow(result.csv_row())
+
+    def write_jsonl(self, f):
+        for result in self:
+            f.write(result.json())
+            f.write("\n")
+
+    def save(self, path):
+        # Binary file: a JSON header with the dictionaries and buffer sizes,
+        # then every column buffer as is
+        buffers = [getattr(self, name) for name in self._ARRAYS]
+        for name in self._STRINGS:
+            column = getattr(self, name)
+            buffers += [column.ends, column.data]
+        for name in self._DICTIONARIES:
+            buffers.append(getattr(self, name).codes)
+        header = json.dumps({
+            "rows": len(self),
+            "sizes": [memoryview(buffer).nbytes for buffer in buffers],
+            "dictionaries": {name: getattr(self, name).values for name in self._DICTIONARIES},
+            "long_e164": self.long_e164,
+        }).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(_TABLE_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            for buffer in buffers:
+                f.write(buffer)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            if f.read(len(_TABLE_MAGIC)) != _TABLE_MAGIC:
+                raise ValueError(f"{path} is not a result table")
+            (length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+            header = json.loads(f.read(length))
+            sizes = iter(header["sizes"])
+            table = cls()
+            for name in cls._ARRAYS:
+                getattr(table, name).frombytes(f.read(next(sizes)))
+            for name in cls._STRINGS:
+                column = getattr(table, name)
+                column.ends.frombytes(f.read(next(sizes)))
+                column.data = bytearray(f.read(next(sizes)))
+            for name in cls._DICTIONARIES:
+                column = getattr(table, name)
+                column.codes.frombytes(f.read(next(sizes)))
+                values = header["dictionaries"][name]
+                if name == "time_zones":
+                    values = [tuple(value) for value in values]
+                column.values = values
+                column.index = {value: code for code, value in enumerate(values)}
+        table.long_e164 = {int(index): e164 for index, e164 in header["long_e164"].items()}
+        return table
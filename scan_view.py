@@ -0,0 +1,166 @@
+import os
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from concurrent.futures import ThreadPoolExecutor
+
+from lookup_engine import TYPE_MAPPING
+from text_scan import NumberTally, scan_file, scan_text
+
+ANY_REGION = "Any (+ numbers only)"
+
+COLUMNS = (("e164", "Number", 140), ("count", "Count", 60), ("location", "Location", 160),
+           ("carrier", "Carrier", 120), ("type", "Type", 100), ("text", "First Seen As", 160))
+
+
+class ScanPanel:
+    # File > Scan Text for Numbers: finds the phone numbers in pasted text
+    # or a file, each distinct number once with how often it occurs, looked
+    # up as Track would. Scanning runs on its own thread (and, for files, a
+    # pool of processes); results come back through `dispatcher`.
+    # get_engine() blocks until the app's engine is loaded; on_choose(e164)
+    # is called when a number is double-clicked.
+    def __init__(self, root, dispatcher, get_engine, get_country_codes, on_choose, on_close=None):
+        self.dispatcher = dispatcher
+        self.get_engine = get_engine
+        self.on_choose = on_choose
+        self.on_close = on_close
+        self.regions = {}
+        self.generation = 0
+        self.cancelled = False
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan")
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Scan Text for Numbers")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        controls = ttk.Frame(self.window, padding="5")
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Label(controls, text="Written as in:").grid(row=0, column=0, padx=5)
+        self.region_var = tk.StringVar(value=ANY_REGION)
+        self.region_combo = ttk.Combobox(controls, textvariable=self.region_var, width=30, state="readonly",
+                                         values=[ANY_REGION])
+        self.region_combo.grid(row=0, column=1, padx=5)
+        ttk.Button(controls, text="Scan", command=self.scan_pasted).grid(row=0, column=2, padx=5)
+        ttk.Button(controls, text="Open File...", command=self.scan_file).grid(row=0, column=3, padx=5)
+        self.status_label = ttk.Label(controls, text="")
+        self.status_label.grid(row=0, column=4, sticky=tk.W, padx=5)
+
+        self.text = tk.Text(self.window, width=100, height=10)
+        self.text.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+
+        self.tree = ttk.Treeview(self.window, columns=[name for name, _, _ in COLUMNS], show="headings", height=14)
+        for name, heading, width in COLUMNS:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width)
+        self.tree.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        self.tree.bind("<Double-1>", self.choose)
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(2, weight=1)
+
+        self.executor.submit(self.load_regions, get_country_codes)
+
+    def load_regions(self, get_country_codes):
+        # Scan thread; the country names need the geocoder's data
+        entries = sorted((rank, name, region) for name, region, _, rank in get_country_codes() if region)
+        self.dispatcher.post(self.set_regions, [(f"{name} ({region})", region) for _, name, region in entries])
+
+    def set_regions(self, regions):
+        self.regions = dict(regions)
+        self.region_combo["values"] = [ANY_REGION] + [label for label, _ in regions]
+
+    def region(self):
+        return self.regions.get(self.region_var.get())
+
+    def scan_pasted(self):
+        text = self.text.get("1.0", tk.END)
+        if not text.strip():
+            messagebox.showwarning("Scan", "Paste some text or open a file to scan.", parent=self.window)
+            return
+        self.start(self.pasted_worker, text, f"{len(text):,} characters")
+
+    def scan_file(self):
+        path = filedialog.askopenfilename(
+            parent=self.window, filetypes=[("Text files", "*.txt *.log *.csv *.eml"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        self.start(self.file_worker, path, os.path.basename(path))
+
+    def start(self, worker, source, description):
+        # A new scan supersedes one still running, which stops at its next
+        # chunk
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.status_label.config(text=f"Scanning {description}...")
+        self.executor.submit(worker, self.generation, source, self.region())
+
+    def pasted_worker(self, generation, text, region):
+        # Scan thread; must not touch any widgets
+        tally = NumberTally()
+        tally.add(scan_text(text, region))
+        self.finish(generation, tally)
+
+    def file_worker(self, generation, path, region):
+        # Scan thread; the chunks are scanned by one process per core
+        tally = NumberTally()
+        scanned = 0
+        last_update = 0.0
+        total = os.path.getsize(path)
+        try:
+            for size, matches in scan_file(path, region, workers=os.cpu_count() or 1):
+                if self.cancelled or generation != self.generation:
+                    return
+                tally.add(matches)
+                scanned += size
+                now = time.perf_counter()
+                if now - last_update >= 0.25:
+                    last_update = now
+                    self.dispatcher.post(self.show_progress, generation, scanned, total, len(tally))
+        except Exception as e:
+            self.dispatcher.post(self.show_error, generation, e)
+            return
+        self.finish(generation, tally)
+
+    def finish(self, generation, tally):
+        if self.cancelled or generation != self.generation:
+            return
+        rows = tally.enrich(self.get_engine())
+        self.dispatcher.post(self.show_results, generation, rows)
+
+    def show_progress(self, generation, scanned, total, found):
+        if generation == self.generation:
+            self.status_label.config(text=f"Scanning... {scanned / 1e6:,.0f} of {total / 1e6:,.0f} MB, "
+                                          f"{found:,} numbers")
+
+    def show_error(self, generation, error):
+        if generation == self.generation:
+            self.status_label.config(text="")
+            messagebox.showerror("Scan Error", f"Failed to scan the file: {str(error)}", parent=self.window)
+
+    def show_results(self, generation, rows):
+        if generation != self.generation:
+            return
+        for e164, count, _, raw, result in rows:
+            if result is not None:
+                self.tree.insert("", tk.END, iid=e164, values=(
+                    e164, count, result.location, result.carrier,
+                    TYPE_MAPPING.get(result.number_type, "Unknown"), raw))
+        total = sum(row[1] for row in rows)
+        self.status_label.config(text=f"{len(rows):,} distinct numbers, {total:,} in all")
+
+    def choose(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            self.on_choose(selection[0])
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def close(self):
+        self.cancelled = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.window.destroy()
+        if self.on_close is not None:
+            self.on_close()
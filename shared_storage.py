@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# Where the history, templates and other stores live, shared by every
+# instance of the app and its worker processes whatever directory they
+# were started in. Overridden by this environment variable.
+DATA_DIR_ENV = "LOCATION_TRACKER_DATA"
+APP_NAME = "location-tracker"
+
+# How long a writer waits for another process's write to finish before
+# giving up with "database is locked"
+BUSY_TIMEOUT = 30.0
+
+
+def data_dir():
+    directory = os.environ.get(DATA_DIR_ENV)
+    if not directory:
+        if sys.platform == "win32":
+            base = os.environ.get("APPDATA") or os.path.expanduser("~")
+        elif sys.platform == "darwin":
+            base = os.path.expanduser("~/Library/Application Support")
+        else:
+            base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        directory = os.path.join(base, APP_NAME)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def data_path(name):
+    # Path of `name` in the data directory. A database of that name in the
+    # working directory, where earlier versions kept it, is copied across
+    # the first time.
+    path = os.path.join(data_dir(), name)
+    if (name.endswith(".db") and not os.path.exists(path) and os.path.exists(name) and
+            os.path.abspath(name) != os.path.abspath(path)):
+        _copy_database(name, path)
+    return path
+
+
+def _copy_database(source, path):
+    # SQLite's backup API copies a consistent snapshot even while another
+    # process writes to the source. The copy only appears under its name
+    # once complete, and not at all if another instance got there first.
+    fd, temp_path = tempfile.mkstemp(prefix=".copy-", suffix=".db", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        source_conn = sqlite3.connect(source, timeout=BUSY_TIMEOUT)
+        copy_conn = sqlite3.connect(temp_path)
+        try:
+            source_conn.backup(copy_conn)
+        finally:
+            copy_conn.close()
+            source_conn.close()
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(temp_path)
+
+
+def connect(path, synchronous="NORMAL"):
+    # A connection to a database several processes share. In WAL mode
+    # readers never wait for the writer and commits are appends to the
+    # log; writers queue for each other for up to BUSY_TIMEOUT. With
+    # synchronous=NORMAL a commit survives the process crashing and is only
+    # synced to disk at checkpoints, so a power cut can lose the last few.
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
+
+
+@contextmanager
+def write_transaction(conn):
+    # BEGIN IMMEDIATE takes the write lock up front (waiting for it as
+    # connect() set up), so a transaction that reads before it writes can't
+    # fail half way because another process wrote in between
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class ChangeMonitor:
+    # changed() is true when another connection, in this process or any
+    # other, has committed to the database since the last call. It reads
+    # SQLite's data_version counter, which in WAL mode lives in shared
+    # memory, so polling it often costs next to nothing and re-reads no
+    # data. `lock` guards `conn` if other threads use it.
+    def __init__(self, conn, lock=None):
+        self.conn = conn
+        self.lock = lock
+        self.version = self._read()
+
+    def _read(self):
+        if self.lock is None:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed(self):
+        version = self._read()
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+
+@contextmanager
+def atomic_file(path, mode="wb"):
+    # A file that appears at `path` complete or not at all: written under a
+    # temporary name in the same directory, synced, then renamed over path,
+    # so a reader (or another instance) never sees it half written
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
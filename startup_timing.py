@@ -0,0 +1,58 @@
+import sys
+import threading
+import time
+
+
+class StartupTimer:
+    # Milliseconds from `started` (a time.perf_counter() value taken as early
+    # as possible) to each startup milestone, plus how long each background
+    # load took. Milestones may be marked from any thread.
+    def __init__(self, started=None, expected=()):
+        self.started = time.perf_counter() if started is None else started
+        self.marks = {}
+        self.durations = {}
+        # Milestones still to come before the startup counts as complete
+        self.expected = set(expected)
+        self.on_complete = []
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            if name in self.marks:
+                return self.marks[name]
+            ms = self.marks[name] = (time.perf_counter() - self.started) * 1000
+            self.expected.discard(name)
+            callbacks = self.on_complete if not self.expected else []
+            if callbacks:
+                self.on_complete = []
+        for callback in callbacks:
+            callback(self)
+        return ms
+
+    def add_duration(self, name, start):
+        # `start` is the perf_counter() value the step began at
+        self.durations[name] = (time.perf_counter() - start) * 1000
+
+    def when_complete(self, callback):
+        # callback(timer) once every expected milestone has been marked, on
+        # the thread that marks the last one
+        with self._lock:
+            if self.expected:
+                self.on_complete.append(callback)
+                return
+        callback(self)
+
+    def report(self):
+        lines = ["Since start:"]
+        for name, ms in sorted(self.marks.items(), key=lambda item: item[1]):
+            lines.append(f"  {name:<20} {ms:8.1f} ms")
+        if self.expected:
+            lines.append(f"  still waiting for: {', '.join(sorted(self.expected))}")
+        if self.durations:
+            lines.append("Steps:")
+            for name, ms in self.durations.items():
+                lines.append(f"  {name:<20} {ms:8.1f} ms")
+        return "\n".join(lines)
+
+    def print_report(self, file=None):
+        print(self.report(), file=file or sys.stderr, flush=True)
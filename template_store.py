@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+
+from shared_storage import ChangeMonitor, connect, write_transaction
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (name TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS templates (
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    number TEXT NOT NULL,
+    PRIMARY KEY (category, name)
+) WITHOUT ROWID;
+-- Every change, in order, for other instances to catch up from: a new
+-- category has no name, a deleted template no number, and a bulk import
+-- is one row with no category, after which the book has to be reloaded
+CREATE TABLE IF NOT EXISTS template_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT,
+    name TEXT,
+    number TEXT
+);
+-- Holds a row while import_categories() runs, which turns the triggers off
+CREATE TABLE IF NOT EXISTS bulk_import (id INTEGER PRIMARY KEY CHECK (id = 0));
+CREATE TRIGGER IF NOT EXISTS log_category AFTER INSERT ON categories
+WHEN NOT EXISTS (SELECT 1 FROM bulk_import) BEGIN
+    INSERT INTO template_log (category) VALUES (new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS log_insert AFTER INSERT ON templates
+WHEN NOT EXISTS (SELECT 1 FROM bulk_import) BEGIN
+    INSERT INTO template_log (category, name, number) VALUES (new.category, new.name, new.number);
+END;
+CREATE TRIGGER IF NOT EXISTS log_update AFTER UPDATE ON templates
+WHEN NOT EXISTS (SELECT 1 FROM bulk_import) BEGIN
+    INSERT INTO template_log (category, name, number) VALUES (new.category, new.name, new.number);
+END;
+CREATE TRIGGER IF NOT EXISTS log_delete AFTER DELETE ON templates
+WHEN NOT EXISTS (SELECT 1 FROM bulk_import) BEGIN
+    INSERT INTO template_log (category, name, number) VALUES (old.category, old.name, NULL);
+END;
+"""
+
+# Changes kept in template_log; an instance further behind reloads the book
+LOG_SIZE = 10000
+
+
+class TemplateStore:
+    # Template book in SQLite. Saving or deleting a template writes that one
+    # row, so the cost doesn't grow with the size of the book. A new store is
+    # filled from the old templates.json if there is one, else `defaults`.
+    # Other instances' changes are read back from template_log; see
+    # changes_since().
+    def __init__(self, path, legacy_json=None, defaults=None):
+        self.path = path
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(path)
+        self._conn = connect(path)
+        self._conn.executescript(_SCHEMA)
+        if is_new:
+            categories = self._read_legacy(legacy_json) if legacy_json else None
+            if categories is None:
+                categories = defaults or {}
+            else:
+                try:
+                    os.replace(legacy_json, legacy_json + ".migrated")
+                except FileNotFoundError:
+                    # Another instance starting at the same time imported it
+                    pass
+            self.import_categories(categories)
+        with write_transaction(self._conn):
+            self._conn.execute("DELETE FROM template_log WHERE seq <= (SELECT MAX(seq) FROM template_log) - ?",
+                               (LOG_SIZE,))
+        self._monitor = ChangeMonitor(self._conn, self._lock)
+
+    @staticmethod
+    def _read_legacy(legacy_json):
+        if not os.path.exists(legacy_json):
+            return None
+        try:
+            with open(legacy_json, "r") as f:
+                categories = json.load(f)
+        except Exception:
+            return None
+        return categories if isinstance(categories, dict) else None
+
+    def import_categories(self, categories):
+        # categories: {category: {name: number}}, as templates.json held them.
+        # Logged as a single reload rather than a row per template.
+        if not categories:
+            return
+        with self._lock, write_transaction(self._conn):
+            self._conn.execute("INSERT INTO bulk_import VALUES (0)")
+            self._conn.executemany("INSERT OR IGNORE INTO categories VALUES (?)",
+                                   ((category,) for category in categories))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO templates VALUES (?, ?, ?)",
+                ((category, name, number) for category, templates in categories.items()
+                 if isinstance(templates, dict) for name, number in templates.items())
+            )
+            self._conn.execute("DELETE FROM bulk_import")
+            self._conn.execute("INSERT INTO template_log (category) VALUES (NULL)")
+
+    def load(self):
+        # The whole book as {category: {name: number}}
+        with self._lock:
+            categories = {row[0]: {} for row in self._conn.execute("SELECT name FROM categories ORDER BY name")}
+            for category, name, number in self._conn.execute(
+                    "SELECT category, name, number FROM templates ORDER BY category, name"):
+                categories.setdefault(category, {})[name] = number
+        return categories
+
+    def add_category(self, category):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO categories VALUES (?)", (category,))
+
+    def put(self, category, name, number):
+        with self._lock, write_transaction(self._conn):
+            self._conn.execute("INSERT OR IGNORE INTO categories VALUES (?)", (category,))
+            self._conn.execute("INSERT OR REPLACE INTO templates VALUES (?, ?, ?)", (category, name, number))
+
+    def delete(self, category, name):
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM templates WHERE category = ? AND name = ?", (category, name)
+            ).rowcount > 0
+
+    def changed(self):
+        # True if another connection (another instance of the app, say) has
+        # committed since the last call
+        return self._monitor.changed()
+
+    def last_change(self):
+        # Sequence number of the latest change, for changes_since()
+        with self._lock:
+            return self._conn.execute("SELECT IFNULL(MAX(seq), 0) FROM template_log").fetchone()[0]
+
+    def changes_since(self, seq):
+        # (seq, category, name, number) for each change after `seq`, oldest
+        # first: a name of None is a new category, a number of None a
+        # deleted template. None if the log no longer reaches back that
+        # far, or there has been a bulk import since, in which case the
+        # whole book has to be reloaded.
+        with self._lock:
+            oldest = self._conn.execute("SELECT MIN(seq) FROM template_log").fetchone()[0]
+            if oldest is not None and oldest > seq + 1:
+                return None
+            changes = self._conn.execute(
+                "SELECT seq, category, name, number FROM template_log WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        if any(category is None for _, category, _, _ in changes):
+            return None
+        return changes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
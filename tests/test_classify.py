@@ -0,0 +1,30 @@
+import phonenumbers
+
+from classify import classify_column, classify_slow
+
+SAMPLE = [
+    # NANP: one calling code, regions told apart by area code
+    "+12125550000", "+14165550123", "+18092345678", "+16502530000",
+    # Trunk prefix written after the country code (the slow path)
+    "+4402079460018", "+44020794600", "+390612345678",
+    # Several regions behind one calling code, by leading digits
+    "+447781123456", "+447624123456", "+442079460018", "+77012345678", "+74951234567",
+    "+590690001234", "+262269612345",
+    # Non-geographic calling codes
+    "+80012345678", "+8818123456789", "+979123456789",
+    # Unparseable, malformed or not strict E.164
+    "", "+", "+1", "hello", "+0123456", "+999123456", "+1 212 555 0000", "212-555-0000",
+    "+123456789012345678901",
+]
+
+
+def test_classify_column_matches_slow_path():
+    numbers = SAMPLE + [
+        phonenumbers.format_number(example, phonenumbers.PhoneNumberFormat.E164)
+        for example in map(phonenumbers.example_number, sorted(phonenumbers.SUPPORTED_REGIONS))
+        if example is not None
+    ]
+    columns = classify_column(numbers)
+    for number, *row in zip(numbers, *columns):
+        country_code, region, ntype, is_valid = classify_slow(number)
+        assert tuple(row) == (country_code, region, ntype, is_valid), number
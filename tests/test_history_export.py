@@ -0,0 +1,23 @@
+import csv
+import os
+
+from history_export import export_history
+from history_store import HistoryStore
+
+
+def test_export_when_cache_fills_mid_chunk(tmp_path):
+    # The second chunk repeats a number cached by the first and overflows
+    # the cache with new ones; every row must still be written
+    numbers = [f"+1212555000{index}" for index in range(7)]
+    searches = numbers[:5] + [numbers[0], numbers[5], numbers[6]]
+    store = HistoryStore(str(tmp_path / "history.db"))
+    try:
+        store.append_many([(number, number, "2026-01-01 00:00:00") for number in searches])
+        path = str(tmp_path / "history.csv")
+        assert export_history(store, path, chunk_size=5, cache_size=6) == len(searches)
+    finally:
+        store.close()
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["e164"] for row in rows] == searches
+    assert not os.path.exists(path + ".part")
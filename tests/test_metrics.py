@@ -0,0 +1,45 @@
+from benchmarks.bench_metrics import uninstrumented_engine_class
+from benchmarks.datasets import synthetic_numbers
+from lookup_engine import LookupEngine
+from metrics import Metrics
+
+NUMBERS = synthetic_numbers(300)
+
+
+def stage_counts(metrics):
+    return {stage: summary["count"] for stage, summary in metrics.snapshot()["stages"].items()}
+
+
+def test_disabled_metrics_match_uninstrumented_engine():
+    engine = LookupEngine()
+    uninstrumented = uninstrumented_engine_class()()
+    assert engine.lookup_many(NUMBERS) == uninstrumented.lookup_many(NUMBERS)
+    assert engine.lookup(NUMBERS[0]) == uninstrumented.lookup(NUMBERS[0])
+
+
+def test_enabled_metrics_match_disabled():
+    engine = LookupEngine()
+    expected = engine.lookup_many(NUMBERS)
+    engine.metrics = Metrics()
+    assert engine.lookup_many(NUMBERS) == expected
+
+
+def test_metrics_record_only_while_enabled():
+    engine = LookupEngine()
+    metrics = Metrics()
+    engine.metrics = metrics
+    engine.lookup_many(NUMBERS)
+    counts = stage_counts(metrics)
+    parsed = len(set(NUMBERS)) - metrics.snapshot()["counters"].get("parse_errors", 0)
+    assert counts["parse"] == parsed
+    for stage in ("validity", "format", "geocoder", "timezone", "carrier"):
+        assert counts[stage] == parsed
+
+    engine.metrics = None
+    engine.lookup_many(NUMBERS)
+    engine.lookup(NUMBERS[0])
+    assert stage_counts(metrics) == counts
+
+    engine.metrics = metrics
+    engine.lookup(NUMBERS[0])
+    assert stage_counts(metrics)["parse"] == counts["parse"] + 1
@@ -0,0 +1,289 @@
+import csv
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import phonenumbers
+from phonenumbers import Leniency, PhoneMetadata, PhoneNumberFormat, PhoneNumberMatcher
+from phonenumbers.phonenumbermatcher import _LEAD_CLASS_CHARS
+from phonenumbers.phonenumberutil import (
+    SUPPORTED_REGIONS, COUNTRY_CODES_FOR_NON_GEO_REGIONS, _EXTN_PATTERNS_FOR_MATCHING, _PLUS_CHARS, _VALID_PUNCTUATION
+)
+
+from lookup_engine import _widen_regex_cache
+from result_record import CSV_HEADER
+
+LENIENCIES = {
+    "possible": Leniency.POSSIBLE,
+    "valid": Leniency.VALID,
+    "strict": Leniency.STRICT_GROUPING,
+    "exact": Leniency.EXACT_GROUPING,
+}
+
+# Files are scanned in chunks of about this size, one per task. Each chunk
+# is read with OVERLAP_BYTES of context either side, so a number crossing a
+# boundary is still seen whole; it belongs to the chunk it starts in.
+CHUNK_BYTES = 8 << 20
+OVERLAP_BYTES = 4096
+
+HEADER = ["count", "first_offset", "first_text"] + CSV_HEADER
+
+# Built as phonenumbers' matcher builds its candidate pattern
+_PUNCTUATION = "[" + _VALID_PUNCTUATION + "]{0,4}"
+# Characters no candidate, nor the extension after one, can contain: a
+# newline, and symbols such as ! ? " $ %. The matcher run between two of
+# these sees the same candidates, and the same characters either side of
+# them, as it would in the whole text.
+_INERT = "[^" + _VALID_PUNCTUATION + _LEAD_CLASS_CHARS + "\\w\\s;=,:．#＃~～\u0301]|\n"
+_next_inert = re.compile(_INERT).search
+_last_inert = re.compile("(?s:.*)(" + _INERT + ")").match
+_is_number_char = re.compile("[" + _VALID_PUNCTUATION + _LEAD_CLASS_CHARS + r"\d]").match
+
+
+def _digits(count):
+    # `count` digits with up to four punctuation characters between each, as
+    # the matcher allows
+    return r"\d(?:" + _PUNCTUATION + r"\d){" + str(count - 1) + "}"
+
+
+def _shortest(metadata, leniency):
+    description = metadata.general_desc
+    lengths = list(description.possible_length)
+    if leniency == Leniency.POSSIBLE:
+        lengths += list(description.possible_length_local_only)
+    return min((length for length in lengths if length > 0), default=None)
+
+
+@lru_cache(maxsize=None)
+def triggers(region=None, leniency=Leniency.VALID):
+    # (pattern, shortest) for the text the matcher could find a number in:
+    # a "+" followed by as many digits as the shortest international number,
+    # or, with a region, as many as that region's shortest national number.
+    # Anything shorter is never a match, so the pure-Python matcher only
+    # runs around these, and a C regex skips over the rest of the text.
+    _widen_regex_cache()
+    every_region = ([PhoneMetadata.metadata_for_region(code) for code in SUPPORTED_REGIONS]
+                    + [PhoneMetadata.metadata_for_nongeo_region(code) for code in COUNTRY_CODES_FOR_NON_GEO_REGIONS])
+    international = min(len(str(metadata.country_code)) + _shortest(metadata, leniency)
+                        for metadata in every_region if _shortest(metadata, leniency))
+    pattern = "[" + _PLUS_CHARS + "]" + _PUNCTUATION + _digits(international)
+    shortest = international
+    metadata = PhoneMetadata.metadata_for_region(region) if region else None
+    if metadata is not None:
+        # Dialled with the region's international prefix, a foreign number
+        # has at least two digits more
+        shortest = min(_shortest(metadata, leniency) or international, international + 2)
+        pattern += "|" + _digits(shortest)
+    return re.compile(pattern), shortest
+
+
+def windows(text, pattern, plus_only=False):
+    # (start, end) around each trigger in text, in order: from the inert
+    # character before it to the one after. With plus_only, nothing but a
+    # "+" can start a match, so the window starts at the digits, brackets
+    # and punctuation running up to it.
+    search = pattern.search
+    position = 0
+    while True:
+        match = search(text, position)
+        if match is None:
+            return
+        if plus_only:
+            start = _run_start(text, match.start(), position)
+        else:
+            before = _last_inert(text, position, match.start())
+            start = before.start(1) if before else position
+        after = _next_inert(text, match.end())
+        if after is None:
+            yield start, len(text)
+            return
+        yield start, after.end()
+        # The next window starts at this inert character at the earliest
+        position = after.start()
+
+
+def _run_start(text, index, limit):
+    # Start of the digits, punctuation and brackets running up to index
+    while index > limit and _is_number_char(text, index - 1):
+        index -= 1
+    return index
+
+
+def scan_text(text, region=None, leniency=Leniency.VALID):
+    # (offset, raw text, E.164) for each number phonenumbers' matcher finds
+    # in text, in order. Same matches as running the matcher over all of it,
+    # for a fraction of the time on text that is mostly not numbers.
+    pattern, shortest = triggers(region, leniency)
+    e164 = PhoneNumberFormat.E164
+    for start, end in windows(text, pattern, region is None):
+        for match in PhoneNumberMatcher(text[start:end], region, leniency, min_candidate_length=shortest):
+            yield start + match.start, match.raw_string, phonenumbers.format_number(match.number, e164)
+
+
+def file_chunks(path, chunk_bytes=CHUNK_BYTES):
+    # (start, end) byte ranges covering the file, ending after a newline
+    # where there is one close by, else on a UTF-8 character boundary
+    size = os.path.getsize(path)
+    if not size:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                newline = data.find(b"\n", end, end + OVERLAP_BYTES)
+                if newline >= 0:
+                    end = newline + 1
+                else:
+                    while end > start + 1 and data[end] & 0xC0 == 0x80:
+                        end -= 1
+            yield start, end
+            start = end
+
+
+def scan_chunk(path, start, end, region=None, leniency=Leniency.VALID):
+    # (byte offset, raw text, E.164) for the numbers starting in bytes
+    # start:end of the file. Bytes that aren't UTF-8 are carried through as
+    # surrogates, so offsets stay exact.
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        lead = data[max(0, start - OVERLAP_BYTES):start].decode("utf-8", "surrogateescape")
+        body = data[start:end].decode("utf-8", "surrogateescape")
+        tail = data[end:end + OVERLAP_BYTES].decode("utf-8", "surrogateescape")
+    text = lead + body + tail
+    body_start, body_end = len(lead), len(lead) + len(body)
+    found = []
+    char, byte = body_start, start
+    for offset, raw, e164 in scan_text(text, region, leniency):
+        if offset < body_start:
+            continue
+        if offset >= body_end:
+            break
+        byte += len(text[char:offset].encode("utf-8", "surrogateescape"))
+        char = offset
+        found.append((byte, raw, e164))
+    return found
+
+
+def scan_file(path, region=None, leniency=Leniency.VALID, workers=1, chunk_bytes=CHUNK_BYTES):
+    # Yields (bytes scanned, matches) per chunk, in file order. Chunks are
+    # memory-mapped by the workers themselves, and only a few per worker are
+    # in flight, so memory stays bounded however large the file. Closing
+    # the generator early drops the chunks not yet started.
+    chunks = file_chunks(path, chunk_bytes)
+    if workers <= 1:
+        for start, end in chunks:
+            yield end - start, scan_chunk(path, start, end, region, leniency)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for start, end in chunks:
+                pending.append((end - start, executor.submit(scan_chunk, path, start, end, region, leniency)))
+                if len(pending) >= workers * 4:
+                    size, future = pending.popleft()
+                    yield size, future.result()
+            while pending:
+                size, future = pending.popleft()
+                yield size, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+class NumberTally:
+    # Distinct numbers found, by E.164, with how often each occurred and
+    # where it first did
+    def __init__(self):
+        self.found = {}
+
+    def __len__(self):
+        return len(self.found)
+
+    def add(self, matches):
+        found = self.found
+        for offset, raw, e164 in matches:
+            entry = found.get(e164)
+            if entry is None:
+                found[e164] = [1, offset, raw]
+            else:
+                entry[0] += 1
+
+    def total(self):
+        return sum(entry[0] for entry in self.found.values())
+
+    def enrich(self, engine):
+        # (e164, count, first offset, first raw text, LookupResult or None)
+        # in order of first appearance, each looked up as Track does
+        ordered = sorted(self.found.items(), key=lambda item: item[1][1])
+        results = engine.lookup_many([e164 for e164, _ in ordered])
+        return [(e164, count, offset, raw, result)
+                for (e164, (count, offset, raw)), result in zip(ordered, results)]
+
+
+def add_arguments(parser):
+    parser.add_argument("input", help="text file to scan, or - for standard input")
+    parser.add_argument("-o", "--output", help="output file, CSV or .jsonl (default: CSV to stdout)")
+    parser.add_argument("--region", help="also find numbers written the way this region does, e.g. US "
+                                         "(default: only numbers starting with +)")
+    parser.add_argument("--leniency", choices=list(LENIENCIES), default="valid",
+                        help="what counts as a number (default: valid)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1 << 20), help="megabytes per task")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress")
+
+
+def run(args):
+    from lookup_engine import LookupEngine
+    from prefix_snapshot import open_snapshot
+
+    region = args.region.upper() if args.region else None
+    leniency = LENIENCIES[args.leniency]
+    tally = NumberTally()
+    start = last_report = time.perf_counter()
+    scanned = 0
+    try:
+        if args.input == "-":
+            text = sys.stdin.read()
+            tally.add(scan_text(text, region, leniency))
+            scanned = len(text)
+        else:
+            for size, matches in scan_file(args.input, region, leniency, args.workers,
+                                           int(args.chunk_mb * (1 << 20))):
+                tally.add(matches)
+                scanned += size
+                now = time.perf_counter()
+                if not args.quiet and now - last_report >= 1.0:
+                    last_report = now
+                    print(f"scanned {scanned / 1e6:,.0f} MB ({scanned / 1e6 / (now - start):,.1f} MB/s), "
+                          f"{len(tally):,} distinct numbers", file=sys.stderr)
+
+        rows = tally.enrich(LookupEngine(snapshot=open_snapshot()))
+        out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    try:
+        if args.output and args.output.lower().endswith(".jsonl"):
+            for e164, count, offset, raw, result in rows:
+                out.write(f'{{"count": {count}, "first_offset": {offset}, "first_text": {json.dumps(raw)}, '
+                          f'{result.json()[1:]}\n')
+        else:
+            writer = csv.writer(out)
+            writer.writerow(HEADER)
+            for e164, count, offset, raw, result in rows:
+                writer.writerow([count, offset, raw] + result.csv_row())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f"done: {tally.total():,} numbers, {len(tally):,} distinct, in {scanned / 1e6:,.1f} MB "
+              f"({elapsed:.1f}s, {scanned / 1e6 / elapsed if elapsed else 0:,.1f} MB/s)", file=sys.stderr)
+    return 0
@@ -0,0 +1,70 @@
+import queue
+import sys
+import time
+from collections import deque
+
+# One frame at 60 Hz; main-thread handlers should finish well within this
+FRAME_BUDGET_MS = 1000 / 60
+
+
+class MainThreadQueue:
+    # Tk widgets may only be touched from the main loop. Worker threads post
+    # callbacks here and the main loop runs them from an after() poll.
+    def __init__(self, root, interval_ms=10):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._queue = queue.SimpleQueue()
+        self._after_id = self.root.after(self.interval_ms, self._poll)
+
+    def post(self, callback, *args):
+        # Safe to call from any thread
+        self._queue.put((callback, args))
+
+    def _poll(self):
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            # One failing callback mustn't stop the poll, and with it every
+            # later result; Tk reports the error as it would a widget's
+            try:
+                callback(*args)
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+        self._after_id = self.root.after(self.interval_ms, self._poll)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+
+class LatencyRecorder:
+    # Keeps the most recent samples (in milliseconds) for percentile reports
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, milliseconds):
+        self.samples.append(milliseconds)
+        self.count += 1
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": max(self.samples) if self.samples else 0.0,
+        }
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
@@ -0,0 +1,112 @@
+import time
+import tkinter as tk
+
+from tk_async import LatencyRecorder, elapsed_ms
+
+# Keys that move through or close the popup rather than change the text
+_NAVIGATION_KEYS = frozenset(("Up", "Down", "Return", "KP_Enter", "Escape", "Tab"))
+
+
+class CompletionPopup:
+    # Drop-down list of completions under an entry. `complete(text)` returns
+    # (label, payload) pairs and `on_choose(payload)` is called when one is
+    # picked with Return or a click. Completion runs on every keystroke, so it
+    # has to be cheap: a prefix index lookup, not a scan.
+    def __init__(self, entry, complete, on_choose, limit=8):
+        self.entry = entry
+        self.complete = complete
+        self.on_choose = on_choose
+        self.limit = limit
+        self.payloads = []
+        self.window = None
+        self.listbox = None
+        self.latency = LatencyRecorder()
+        entry.bind('<Down>', lambda event: self.move(1))
+        entry.bind('<Up>', lambda event: self.move(-1))
+        entry.bind('<Return>', self.choose_selected, add="+")
+        entry.bind('<Escape>', lambda event: self.hide(), add="+")
+        entry.bind('<FocusOut>', lambda event: entry.after(150, self.hide), add="+")
+
+    def _create(self):
+        self.window = tk.Toplevel(self.entry)
+        self.window.overrideredirect(True)
+        self.window.withdraw()
+        self.listbox = tk.Listbox(self.window, height=self.limit, activestyle="none")
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        self.listbox.bind('<ButtonRelease-1>', self.choose_selected)
+
+    def on_key(self, event=None):
+        if event is not None and getattr(event, "keysym", None) in _NAVIGATION_KEYS:
+            return
+        start = time.perf_counter()
+        text = self.entry.get().strip()
+        items = self.complete(text)[:self.limit] if text else []
+        self.latency.add(elapsed_ms(start))
+        self.show(items)
+
+    def show(self, items):
+        if not items:
+            self.hide()
+            return
+        if self.window is None:
+            self._create()
+        self.payloads = [payload for _, payload in items]
+        self.listbox.delete(0, tk.END)
+        for label, _ in items:
+            self.listbox.insert(tk.END, label)
+        self.listbox.config(height=len(items))
+        x = self.entry.winfo_rootx()
+        y = self.entry.winfo_rooty() + self.entry.winfo_height()
+        self.window.geometry(f"+{x}+{y}")
+        self.window.deiconify()
+        self.window.lift()
+
+    def visible(self):
+        return bool(self.payloads)
+
+    def hide(self):
+        self.payloads = []
+        if self.window is not None:
+            self.window.withdraw()
+
+    def move(self, step):
+        if not self.visible():
+            return None
+        selection = self.listbox.curselection()
+        index = (selection[0] + step) if selection else (0 if step > 0 else len(self.payloads) - 1)
+        index = max(0, min(index, len(self.payloads) - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return "break"
+
+    def choose_selected(self, event=None):
+        if not self.visible():
+            return None
+        selection = self.listbox.curselection()
+        if not selection:
+            return None
+        payload = self.payloads[selection[0]]
+        self.hide()
+        self.on_choose(payload)
+        return "break"
+
+
+class ComboboxFilter:
+    # Keeps a combobox's drop-down down to the best `limit` completions of
+    # what has been typed, instead of handing Tk the whole list.
+    # `complete(text, limit)` returns the values.
+    def __init__(self, combobox, complete, limit=50):
+        self.combobox = combobox
+        self.complete = complete
+        self.limit = limit
+        combobox.bind('<KeyRelease>', self.on_key, add="+")
+        combobox.configure(postcommand=self.refresh)
+
+    def on_key(self, event=None):
+        if event is not None and getattr(event, "keysym", None) in _NAVIGATION_KEYS:
+            return
+        self.refresh()
+
+    def refresh(self):
+        self.combobox['values'] = self.complete(self.combobox.get().strip(), self.limit)